@@ -1,4 +1,80 @@
+import framebuf
+
+# Packed MONO_VLSB copies of the sprites and digits, built on first use so each glyph is drawn with one blit.
+_sprite_cache = {}
+_digit_cache = {}
+_half_digit_cache = {}
+
+
 def show_sprite(screen, sprite, x_offset, y_offset):
+    glyph = _sprite_cache.get(id(sprite))
+    if glyph is None:
+        glyph = compile_sprite(sprite)
+    screen.blit(glyph, x_offset, y_offset)
+
+
+def show_digit(screen, digit, x_offset, y_offset, half=False):
+    glyph = (_half_digit_cache if half else _digit_cache).get(digit)
+    if glyph is None:
+        glyph = compile_digit(digit, half)
+    # digits only ever set pixels, so unset pixels of the glyph are transparent
+    screen.blit(glyph, x_offset, y_offset, 0)
+
+
+def compile_sprite(sprite):
+    pixels, mirror_x, mirror_y = sprite
+    width = len(pixels[0])
+    height = len(pixels)
+    if mirror_x:
+        width = 2 * width - (1 if mirror_x > 1 else 0)
+    if mirror_y:
+        height = 2 * height - (1 if mirror_y > 1 else 0)
+    glyph = _new_glyph(width, height)
+    draw_sprite_pixels(glyph, sprite, 0, 0)
+    _sprite_cache[id(sprite)] = glyph
+    return glyph
+
+
+def compile_digit(digit, half=False):
+    """Build the glyph of a digit, or a half-size one (10x15) where a pixel is lit when 2 of the 4 it covers are."""
+    sprite = globals()["DIGIT_" + str(digit)]
+    width = max(segment_x + len(pixels[0]) for pixels, segment_x, _ in sprite)
+    height = max(segment_y + len(pixels) for pixels, _, segment_y in sprite)
+    if half:
+        # one spare row and column so that every 2x2 block is inside
+        full = _new_glyph(width + 1, height + 1)
+        draw_digit_pixels(full, digit, 0, 0)
+        glyph = _new_glyph((width + 1) // 2, (height + 1) // 2)
+        for y in range(0, height, 2):
+            for x in range(0, width, 2):
+                lit = full.pixel(x, y) + full.pixel(x + 1, y) + full.pixel(x, y + 1) + full.pixel(x + 1, y + 1)
+                if lit >= 2:
+                    glyph.pixel(x // 2, y // 2, 1)
+        _half_digit_cache[digit] = glyph
+        return glyph
+    glyph = _new_glyph(width, height)
+    draw_digit_pixels(glyph, digit, 0, 0)
+    _digit_cache[digit] = glyph
+    return glyph
+
+
+def precompile():
+    """Build every glyph up front so the first frames don't pay for it."""
+    for sprite in (LOGO, GRAM, BATTERY, DOT, SMALL_DOT, CUP_MARK, BREWING_MARK, DRIPPING_MARK, FINISHED_MARK):
+        compile_sprite(sprite)
+    for digit in "0123456789":
+        compile_digit(digit)
+        compile_digit(digit, half=True)
+    compile_digit("MINUS")
+
+
+def _new_glyph(width, height):
+    buffer = bytearray(((height + 7) // 8) * width)
+    return framebuf.FrameBuffer(buffer, width, height, framebuf.MONO_VLSB)
+
+
+def draw_sprite_pixels(screen, sprite, x_offset, y_offset):
+    """Draw a sprite pixel by pixel, this is the reference path used to build the glyph cache."""
     pixels, mirror_x, mirror_y = sprite
     for y, row in enumerate(pixels):
         for x, c in enumerate(row):
@@ -23,7 +99,8 @@ def show_sprite(screen, sprite, x_offset, y_offset):
                 screen.pixel(x + x_offset + m_offset_x, y + y_offset + m_offset_y, c)
 
 
-def show_digit(screen, digit, x_offset, y_offset):
+def draw_digit_pixels(screen, digit, x_offset, y_offset):
+    """Draw a digit segment by segment, pixel by pixel, only setting lit pixels."""
     sprite = globals()["DIGIT_" + str(digit)]
     for segment in sprite:
         pixels, segment_x, segment_y = segment
@@ -93,6 +170,13 @@ BATTERY = (
 )
 
 DOT = ([[1, 1], [1, 1]], 1, 1)
+SMALL_DOT = ([[1]], 1, 1)  # goes with the half-size digits
+
+# shot timer states (see shot_timer), 5 pixels high between the battery and the gram sign
+CUP_MARK = ([[0, 1, 1], [1, 0, 0], [1, 0, 0]], 2, 2)  # ring, waiting for the shot
+BREWING_MARK = ([[1, 0, 0], [1, 1, 0], [1, 1, 1]], 0, 2)  # play
+DRIPPING_MARK = ([[0, 0, 1], [0, 1, 1], [1, 1, 1], [1, 1, 1], [0, 1, 1]], 2, 0)  # drop
+FINISHED_MARK = ([[1, 1, 1], [1, 1, 1], [1, 1, 1]], 2, 2)  # stop
 
 SEGMENT_1 = (
     [[1, 1, 1, 1, 1, 1, 1, 1], [0, 1, 1, 1, 1, 1, 1, 1], [0, 0, 1, 1, 1, 1, 1, 1], [0, 0, 0, 1, 1, 1, 1, 1]],
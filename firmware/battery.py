@@ -0,0 +1,106 @@
+"""Battery level helpers."""
+import time
+
+from filtering import KalmanFilter
+from micropython import const
+
+# discharge curve of the cell behind the divider: raw ADC reading (11dB attenuation), percent
+# 3.3V = 0%, then every 0.1V up to 4.2V = 100%
+_CURVE = (
+    (1931, 0),
+    (1990, 6),
+    (2048, 15),
+    (2107, 33),
+    (2165, 50),
+    (2224, 59),
+    (2282, 72),
+    (2341, 83),
+    (2399, 94),
+    (2458, 100),
+)
+_LUT_START = const(1931)
+_LUT_END = const(2458)
+
+
+def _build_lut():
+    lut = bytearray(_LUT_END - _LUT_START + 1)
+    for (x0, y0), (x1, y1) in zip(_CURVE, _CURVE[1:]):
+        for v in range(x0, x1 + 1):
+            lut[v - _LUT_START] = int(y0 + (y1 - y0) * (v - x0) / (x1 - x0))
+    return lut
+
+
+# percent for each raw reading of the curve, built once so a conversion is a single index
+_LUT = _build_lut()
+
+
+def adc_to_percent(v_adc):
+    i = int(v_adc) - _LUT_START
+    if i < 0:
+        return 0
+    if i >= len(_LUT):
+        return 100
+    return _LUT[i]
+
+
+class BatteryMonitor:
+    """Samples the battery voltage every few seconds and keeps a smoothed state of charge."""
+
+    def __init__(self, adc, scales=None, period_ms=10000, reads=4, measurement_uncertainty=20.0, q=0.2, hysteresis=2):
+        """Initialize the monitor, the first `update` takes a sample straight away.
+
+        Args:
+            adc (machine.ADC): pin sensing the battery through the divider
+            scales (BLEScales, optional): the battery characteristic is written and notified when the percentage
+                changes. Defaults to None.
+            period_ms (int, optional): time between two samples. Defaults to 10000.
+            reads (int, optional): ADC reads averaged in a sample. Defaults to 4.
+            measurement_uncertainty (float, optional): see `filtering.KalmanFilter`, in raw ADC counts. Defaults to
+                20.0.
+            q (float, optional): see `filtering.KalmanFilter`. Defaults to 0.2.
+            hysteresis (int, optional): the percentage only changes once the filtered reading is this many raw
+                counts past the edge of the current one, so it doesn't flicker between two values. Defaults to 2.
+        """
+        self.adc = adc
+        self.scales = scales
+        self.period_ms = period_ms
+        self.reads = reads
+        self.kf = KalmanFilter(measurement_uncertainty, q=q)
+        self.hysteresis = hysteresis
+        self.percent = -1
+        self.samples = 0
+        self._last_sample = 0
+
+    def update(self, now=None):
+        """Take a sample if `period_ms` has elapsed since the last one.
+
+        Returns:
+            bool: True when the percentage changed
+        """
+        if now is None:
+            now = time.ticks_ms()
+        if self.samples and time.ticks_diff(now, self._last_sample) < self.period_ms:
+            return False
+        self._last_sample = now
+        return self.sample()
+
+    def sample(self):
+        """Read and filter the battery voltage now, see `update`."""
+        total = 0
+        for i in range(self.reads):
+            total += self.adc.read()
+        if self.samples:
+            estimate = self.kf.update_estimate(total / self.reads)
+        else:
+            # start from the first reading rather than from 0%
+            estimate = self.kf.last_estimate = total / self.reads
+        self.samples += 1
+        if adc_to_percent(estimate - self.hysteresis) <= self.percent <= adc_to_percent(estimate + self.hysteresis):
+            return False
+        percent = adc_to_percent(estimate)
+        if percent == self.percent:
+            return False
+        self.percent = percent
+        if self.scales is not None:
+            self.scales.set_battery_level(percent, notify=True)
+        return True
@@ -0,0 +1,77 @@
+"""Host benchmark comparing pixel-by-pixel sprite drawing with cached glyph blits.
+
+Run from the `firmware` folder with `python3 bench/art_bench.py`. Both paths must draw the same frames, then the
+framebuf calls each one makes per frame are counted. The count is the metric: on the device every call goes through
+the interpreter while the pixels of a `blit` are written in C. The stand-in framebuf of the simulator writes them in
+Python, so timing it would only measure the stand-in.
+"""
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "sim"))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+import art  # noqa: E402
+import framebuf  # noqa: E402
+
+WIDTH = 128
+HEIGHT = 32
+FRAMES = 200
+WEIGHTS = ("0.00", "18.05", "-3.40", "36.75", "1234.5")
+
+
+def new_screen():
+    return framebuf.FrameBuffer(bytearray(WIDTH * HEIGHT // 8), WIDTH, HEIGHT, framebuf.MONO_VLSB)
+
+
+def draw_frame(screen, string, show_sprite, show_digit):
+    # same layout as main.display_weight
+    screen.fill(0)
+    position = 118
+    for char in reversed(string):
+        if char == "-":
+            char = "MINUS"
+        if char == ".":
+            position -= 7
+            if position < 0:
+                break
+            show_sprite(screen, art.DOT, position, 27)
+        else:
+            position -= 22
+            if position < 0:
+                break
+            show_digit(screen, char, position, 1)
+    show_sprite(screen, art.GRAM, 117, 16)
+    show_sprite(screen, art.BATTERY, 117, 1)
+
+
+def run(name, show_sprite, show_digit):
+    screen = new_screen()
+    for i in range(FRAMES):
+        draw_frame(screen, WEIGHTS[i % len(WEIGHTS)], show_sprite, show_digit)
+    calls = screen.calls / FRAMES
+    print("{:<8} {:>10.1f} calls/frame {:>10.1f} px/frame".format(name, calls, screen.pixels_written / FRAMES))
+    return calls
+
+
+def check_identical():
+    for string in WEIGHTS:
+        reference = new_screen()
+        cached = new_screen()
+        draw_frame(reference, string, art.draw_sprite_pixels, art.draw_digit_pixels)
+        draw_frame(cached, string, art.show_sprite, art.show_digit)
+        assert reference._buf == cached._buf, "glyph cache output differs for " + string
+
+
+def main():
+    art.precompile()
+    check_identical()
+    print("same frames drawn by both paths, framebuf calls per frame over {} frames".format(FRAMES))
+    pixel_calls = run("pixel", art.draw_sprite_pixels, art.draw_digit_pixels)
+    blit_calls = run("blit", art.show_sprite, art.show_digit)
+    print("blit makes {:.0f}x fewer calls".format(pixel_calls / blit_calls))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""State of charge from a noisy battery reading, and the cost of `battery.BatteryMonitor`.
+
+Run from the `firmware` folder with `python3 bench/battery_sim.py`.
+
+- lookup: the table behind `adc_to_percent` against the previous if-chain, largest difference and time per conversion
+- discharge: the cell goes from 4.1V to 3.5V over 4 hours, the ADC reads it with gaussian noise and the odd dip while
+  the radio transmits. The previous behaviour (mean of 10 reads through the if-chain every 30s) is compared with the
+  monitor sampling every 10s: error against the true percentage, how many times the value changed (each change is a
+  notification) and how many of those went the wrong way
+- cost: time of `BatteryMonitor.update` when no sample is due (the call made for every batch of weight samples) and
+  when one is, next to filtering a batch of 8 weight samples
+- firmware: the uasyncio firmware with a central connected and a steady noisy battery, battery notifications sent
+"""
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "sim"))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+import clock  # noqa: E402
+import machine  # noqa: E402
+import signals  # noqa: E402
+from battery import BatteryMonitor, adc_to_percent  # noqa: E402
+from filtering import AdaptiveKalmanFilter  # noqa: E402
+from run_main import run_async, setup  # noqa: E402
+
+HOURS = 4
+ADC_FULL = 2399  # 4.1V
+ADC_EMPTY = 2048  # 3.5V
+NOISE = 15.0
+DIP = 60
+DIPS = 0.02
+CALLS = 20000
+FIRMWARE_S = 120
+
+
+def chain_to_percent(v_adc):
+    """`adc_to_percent` before the lookup table."""
+    if v_adc > 2399:  # 4.1-4.2 = 94-100%
+        val = int(0.10169492 * v_adc - 149.966)
+        return val if val <= 100 else 100
+    if v_adc > 2341:  # 4.0-4.1 = 83-94%
+        return int(0.18965517 * v_adc - 360.983)
+    if v_adc > 2282:  # 3.9-4.0 = 72-83%
+        return int(0.18644068 * v_adc - 353.458)
+    if v_adc > 2224:  # 3.8-3.9 = 59-72%
+        return int(0.22413793 * v_adc - 439.483)
+    if v_adc > 2165:  # 3.7-3.8 = 50-59%
+        return int(0.15254237 * v_adc - 280.254)
+    if v_adc > 2107:  # 3.6-3.7 = 33-50%
+        return int(0.29310345 * v_adc - 584.569)
+    if v_adc > 2048:  # 3.5-3.6 = 15-33%
+        return int(0.30508475 * v_adc - 609.814)
+    if v_adc > 1990:  # 3.4-3.5 = 6-15%
+        return int(0.15517241 * v_adc - 302.793)
+    if v_adc >= 1931:  # 3.3-3.4 = 0-6%
+        return int(0.10169492 * v_adc - 196.373)
+    return 0
+
+
+class NoisyADC:
+    """Battery reading at the virtual time `t` (seconds) with noise and radio dips."""
+
+    def __init__(self, seed=1):
+        self.random = random.Random(seed)
+        self.t = 0.0
+
+    def true_value(self):
+        return ADC_FULL - (ADC_FULL - ADC_EMPTY) * self.t / (HOURS * 3600)
+
+    def read(self):
+        value = self.true_value() + self.random.gauss(0.0, NOISE)
+        if self.random.random() < DIPS:
+            value -= DIP
+        return int(value)
+
+
+def timed(func, args_list):
+    start = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - start) / len(args_list) * 1000000
+
+
+def lookup():
+    values = list(range(1900, 2500))
+    worst = max(abs(adc_to_percent(v) - chain_to_percent(v)) for v in values)
+    reads = [(values[i % len(values)] + 0.5,) for i in range(CALLS)]
+    print("lookup: largest difference with the if-chain {}%".format(worst))
+    print("  if-chain {:>6.2f} us/conversion".format(timed(chain_to_percent, reads)))
+    print("  table    {:>6.2f} us/conversion".format(timed(adc_to_percent, reads)))
+
+
+def previous(adc):
+    total = 0
+    for i in range(10):
+        total += adc.read()
+    return chain_to_percent(total / 10)
+
+
+def discharge(name, period_s, step):
+    adc = NoisyADC()
+    errors = []
+    changes = 0
+    wrong_way = 0
+    percent = None
+    for i in range(int(HOURS * 3600 / period_s)):
+        adc.t = i * period_s
+        new = step(adc)
+        if percent is not None and new != percent:
+            changes += 1
+            if new > percent:
+                wrong_way += 1
+        percent = new
+        errors.append(abs(percent - adc_to_percent(adc.true_value())))
+    print(
+        "  {:<10} {:>10.2f} {:>10} {:>10} {:>10}".format(
+            name, sum(errors) / len(errors), max(errors), changes, wrong_way
+        )
+    )
+
+
+def smoothing():
+    print("discharge {:.0f}% to {:.0f}% over {} h".format(adc_to_percent(ADC_FULL), adc_to_percent(ADC_EMPTY), HOURS))
+    print("  {:<10} {:>10} {:>10} {:>10} {:>10}".format("", "mean err %", "worst %", "changes", "wrong way"))
+    discharge("previous", 30, previous)
+    monitors = {}
+
+    def monitored(adc):
+        monitor = monitors.setdefault("monitor", BatteryMonitor(adc))
+        monitor.update(int(adc.t * 1000))
+        return monitor.percent
+
+    discharge("monitor", 10, monitored)
+
+
+def cost():
+    monitor = BatteryMonitor(NoisyADC())
+    monitor.update(0)
+    idle = timed(monitor.update, [(i,) for i in range(1, CALLS)])
+    due = timed(monitor.update, [(20000 + i * 10000,) for i in range(CALLS)])
+    kf = AdaptiveKalmanFilter(0.03, q=0.1)
+    batch = [0.0] * 8
+    weight = timed(lambda: kf.update_many(batch), [()] * CALLS)
+    print("cost")
+    print("  update, nothing due  {:>6.2f} us".format(idle))
+    print("  update, sample due   {:>6.2f} us".format(due))
+    print("  filter 8 weights     {:>6.2f} us".format(weight))
+
+
+def firmware():
+    clock.use_virtual()
+    setup(signals.constant(0.0))
+    noise = random.Random(2)
+    machine.ADC.values[34] = lambda: int(2300 + noise.gauss(0.0, NOISE))
+    scales = run_async(FIRMWARE_S)
+    handle = scales.scales._battery_handle
+    sent = [data[0] for conn, value_handle, data in scales.ble.notifications if value_handle == handle]
+    print("firmware: {} battery notifications in {} s, {}".format(len(sent), FIRMWARE_S, sent))
+    clock.use_real()
+
+
+def main():
+    lookup()
+    smoothing()
+    cost()
+    firmware()
+
+
+if __name__ == "__main__":
+    main()
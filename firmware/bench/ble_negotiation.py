@@ -0,0 +1,81 @@
+"""Drive `BLEScales` through the recording fake `bluetooth.BLE` and check the MTU / connection interval sequence.
+
+Run from the `firmware` folder with `python3 bench/ble_negotiation.py`, it exits with an assertion error on failure.
+"""
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "sim"))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+import bluetooth  # noqa: E402
+from ble_scales import BLEScales  # noqa: E402
+
+
+def names(calls):
+    return [call[0] for call in calls]
+
+
+def main():
+    ble = bluetooth.BLE(remote_mtu=100)
+    scales = BLEScales(ble, mtu=185, interval_ms=(7.5, 15))
+    assert names(ble.calls) == [
+        "active", "config", "irq", "gatts_register_services", "gatts_set_buffer", "gap_advertise"
+    ]
+    assert ble.calls[1][1] == {"mtu": 185}
+    assert scales.payload_size == 20
+
+    ble.calls.clear()
+    ble.connect(1)
+    # advertising goes on for a second central
+    assert names(ble.calls) == ["gattc_exchange_mtu", "gap_advertise"]
+    assert scales.connection_params(1) == (100, 0)
+    assert scales.payload_size == 97
+
+    ble.update_connection(1, 12)
+    assert scales.connection_params(1) == (100, 15.0)
+    ble.update_connection(1, 6, status=1)  # rejected update keeps the previous interval
+    assert scales.connection_params(1) == (100, 15.0)
+
+    # a second central with a smaller MTU shrinks the shared payload, which grows back when it leaves
+    ble.remote_mtu = 50
+    ble.calls.clear()
+    ble.connect(2)
+    assert names(ble.calls) == ["gattc_exchange_mtu"]  # max_connections reached
+    assert scales.payload_size == 47
+    ble.disconnect(2)
+    assert scales.payload_size == 97
+    assert ble.calls[-1][0] == "gap_advertise"
+
+    # streamed notifications use the negotiated payload size
+    for i in range(100):
+        scales.add_sample(i * 12, i * 0.1)
+    scales.flush_stream()
+    sizes = [len(payload) for _, handle, payload in ble.notifications if handle == scales._stream_handle]
+    assert max(sizes) <= 97 and max(sizes) > 20, sizes
+
+    # a central joining while samples are queued: the IRQ handler leaves the stream buffers alone, the resize and its
+    # flush happen on the next sample
+    for i in range(15):
+        scales.add_sample(1200 + i * 4, 10.0)
+    sent = len(ble.notifications)
+    ble.connect(2)
+    assert len(ble.notifications) == sent
+    for i in range(15, 100):
+        scales.add_sample(1200 + i * 4, 10.0)
+    scales.flush_stream()
+    later = [len(payload) for _, handle, payload in ble.notifications[sent:] if handle == scales._stream_handle]
+    # the first one holds the samples queued at the old size
+    assert later[0] > 47 and max(later[1:]) <= 47, later
+    ble.disconnect(2)
+
+    ble.disconnect(1)
+    assert scales.payload_size == 20
+    # an unknown handle must not raise
+    ble.disconnect(7)
+    print("negotiation sequence ok, notification sizes:", sizes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Calibrate the simulated scales over BLE, then compare the boot time with and without a saved calibration.
+
+Run from the `firmware` folder with `python3 bench/calibration_sim.py`. The simulated load cell has a different
+sensitivity than the default scale. A central writes the zero command to the calibration characteristic while the
+scales are empty, puts a 100g mass on them and writes the span command. The weight must then read 100g, and the
+record saved in flash must give the same calibration.
+
+The boot time is the virtual time spent constructing `main_async.Scales`, that is waiting for the HX711, from power
+on to the first filtered value. It is measured for both HX711 output rates.
+"""
+import os
+import struct
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "sim"))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+import calibration  # noqa: E402
+import clock  # noqa: E402
+import machine  # noqa: E402
+import signals  # noqa: E402
+from run_main import setup  # noqa: E402
+
+TRUE_SCALE = 1702.5
+MASS = 100.0
+ZERO_AT = 1
+MASS_AT = 3
+SPAN_AT = 5
+SECONDS = 8
+
+
+def calibrate_over_ble():
+    import main_async
+
+    clock.use_virtual()
+    hx, _ = setup(signals.step(MASS_AT, MASS), scale=TRUE_SCALE)
+    firmware = main_async.Scales()
+    ble = firmware.ble
+    ble.connect(1)
+    handle = firmware.scales._calibration_handle
+    before = []
+    machine.at(MASS_AT * 1000000 - 100000, lambda: before.append(firmware.weight))
+    machine.at(ZERO_AT * 1000000, lambda: ble.write(1, handle, bytes([calibration.CMD_ZERO])))
+    machine.at(SPAN_AT * 1000000, lambda: ble.write(1, handle, struct.pack("<Bf", calibration.CMD_SPAN, MASS)))
+    uncalibrated = []
+    machine.at(SPAN_AT * 1000000 - 100000, lambda: uncalibrated.append(firmware.weight))
+    machine.stop_at(SECONDS * 1000000)
+    try:
+        main_async.asyncio.run(firmware.run())
+    except machine.SimulationEnd:
+        pass
+    saved = calibration.load()
+    print("calibration over BLE (true scale {})".format(TRUE_SCALE))
+    print("  empty after zero     {:.2f} g".format(before[0]))
+    print("  {:.0f} g before span   {:.2f} g".format(MASS, uncalibrated[0]))
+    print("  {:.0f} g after span    {:.2f} g (true {:.2f} g)".format(MASS, firmware.weight, hx.last_weight))
+    print("  saved scale          {:.3f}, offset {} ({})".format(saved.scale, saved.offset, hex(saved.flags)))
+    print("  characteristic       {}".format("matches" if ble.values[handle] == saved.pack() else "differs"))
+    assert abs(firmware.weight - MASS) < 0.2
+    assert abs(saved.scale - TRUE_SCALE) / TRUE_SCALE < 0.002
+
+
+def boot_time(rate_hz):
+    import main_async
+
+    clock.use_virtual()
+    setup(signals.constant(0.0), rate_hz=rate_hz)
+    start = clock.now_us()
+    main_async.Scales()
+    return (clock.now_us() - start) / 1000
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), "calibration.bin")
+    calibration.PATH = path
+    calibrate_over_ble()
+    print("boot time until the first value")
+    for rate_hz in (10, 80):
+        os.rename(path, path + ".saved")
+        defaults = boot_time(rate_hz)
+        os.rename(path + ".saved", path)
+        saved = boot_time(rate_hz)
+        print("  {:>2} Hz  defaults {:>6.0f} ms, saved calibration {:>5.0f} ms".format(rate_hz, defaults, saved))
+    clock.use_real()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Accuracy and cost of the calibration table and the zero tracking of `HX711`, against the single scale.
+
+Synthetic raw readings stand for a load cell with a bow-shaped non-linearity of 1.5g at mid-range (2kg full scale):
+
+- accuracy: worst error over 0-2000g of the single scale calibrated with 100g or 2000g, and of tables through 3
+  and 6 points
+- cost: time (and on the device, heap) per conversion for `to_units` and `to_fixed`, with and without a table
+- drift: the zero drifts by 2g over 10 minutes while the scales are mostly empty, with 18g on them for a minute.
+  The filtered weight goes through `AdaptiveKalmanFilter` and, optionally, `ZeroTracker`.
+
+On the host, run from the `firmware` folder with `python3 bench/calibration_table.py`. On the device, stop `main.py`,
+upload this file and `import calibration_table`.
+"""
+import gc
+import sys
+import time
+
+ON_DEVICE = sys.implementation.name == 'micropython'
+
+if not ON_DEVICE:
+    import os
+
+    HERE = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.join(HERE, '..', 'sim'))
+    sys.path.insert(0, os.path.join(HERE, '..'))
+
+from filtering import AdaptiveKalmanFilter  # noqa: E402
+from hx711 import HX711, ZeroTracker  # noqa: E402
+
+SCALE = 1544.667
+ZERO = 84000
+FULL_SCALE = 2000.0
+BOW = 1.5
+CALLS = 2000
+RATE_HZ = 80
+DRIFT = 2.0
+DRIFT_S = 600
+LOAD = 18.0
+LOAD_FROM_S = 300
+LOAD_TO_S = 360
+
+
+def raw_reading(weight, drift=0.0):
+    bow = BOW * 4 * (weight / FULL_SCALE) * (1 - weight / FULL_SCALE)
+    return int(ZERO + SCALE * (weight + bow + drift))
+
+
+class Noise:
+    """Roughly gaussian noise from a xorshift generator, the same on CPython and MicroPython."""
+
+    def __init__(self, sigma, seed=12345):
+        self.sigma = sigma
+        self.state = seed
+
+    def next_uniform(self):
+        x = self.state
+        x ^= (x << 13) & 0xFFFFFFFF
+        x ^= x >> 17
+        x ^= (x << 5) & 0xFFFFFFFF
+        self.state = x
+        return x / 0xFFFFFFFF
+
+    def __call__(self):
+        return self.sigma * (sum(self.next_uniform() for i in range(4)) - 2.0) * 1.732
+
+
+def make_hx711():
+    if not ON_DEVICE:
+        import machine
+        import signals
+        from devices import HX711Device
+
+        machine.reset_devices()
+        HX711Device(dout=14, pd_sck=13, profile=signals.constant(0.0))
+    hx = HX711(dout=14, pd_sck=13, gain=64)
+    hx.set_offset(ZERO)
+    return hx
+
+
+def calibrate(hx, masses):
+    """Single scale through the largest mass, table through 0 and each mass."""
+    points = [(0, 0.0)] + [(raw_reading(m) - ZERO, m) for m in masses]
+    hx.set_scale(points[-1][0] / masses[-1])
+    hx.set_offset(ZERO)
+    hx.set_table(points if len(masses) > 1 else None, zero=ZERO)
+
+
+def accuracy(hx):
+    print('worst error over 0-{:.0f}g'.format(FULL_SCALE))
+    for name, masses in (
+        ('scale, 100g', (100.0,)),
+        ('scale, 2000g', (2000.0,)),
+        ('table, 3 pts', (1000.0, 2000.0)),
+        ('table, 6 pts', (100.0, 500.0, 1000.0, 1500.0, 2000.0)),
+    ):
+        calibrate(hx, masses)
+        worst = 0.0
+        worst_fixed = 0.0
+        for w in range(0, int(FULL_SCALE) + 1):
+            raw = raw_reading(w)
+            worst = max(worst, abs(hx.to_units(raw) - w))
+            worst_fixed = max(worst_fixed, abs(hx.to_fixed(raw) / 100 - w))
+        print('  {:<14} to_units {:>6.2f} g   to_fixed {:>6.2f} g'.format(name, worst, worst_fixed))
+
+
+def measure(name, func, raws):
+    func(raws[0])
+    gc.collect()
+    if ON_DEVICE:
+        gc.disable()
+        before = gc.mem_alloc()
+    start = time.ticks_us()
+    for raw in raws:
+        func(raw)
+    elapsed = time.ticks_diff(time.ticks_us(), start)
+    allocated = 0
+    if ON_DEVICE:
+        allocated = (gc.mem_alloc() - before) // len(raws)
+        gc.enable()
+    print('  {:<16} {:>8.2f} us/sample {:>4} bytes/sample'.format(name, elapsed / len(raws), allocated))
+
+
+def cost(hx):
+    raws = [raw_reading(FULL_SCALE * i / CALLS) for i in range(CALLS)]
+    print('cost per conversion')
+    for name, masses in (('single', (2000.0,)), ('table', (100.0, 500.0, 1000.0, 1500.0, 2000.0))):
+        calibrate(hx, masses)
+        measure(name + ' to_units', hx.to_units, raws)
+        measure(name + ' to_fixed', hx.to_fixed, raws)
+
+
+def drift(hx, tracking):
+    calibrate(hx, (2000.0,))
+    kf = AdaptiveKalmanFilter(0.03, q=0.1)
+    tracker = ZeroTracker(hx)
+    noise = Noise(0.04)
+    worst_loaded = 0.0
+    weight = 0.0
+    for i in range(DRIFT_S * RATE_HZ):
+        t = i / RATE_HZ
+        true_weight = LOAD if LOAD_FROM_S <= t < LOAD_TO_S else 0.0
+        raw = raw_reading(true_weight, DRIFT * t / DRIFT_S + noise())
+        weight = kf.update_estimate(hx.to_units(raw))
+        if tracking:
+            tracker.update(weight, kf.stable, int(t * 1000))
+        if LOAD_FROM_S + 5 <= t < LOAD_TO_S:
+            worst_loaded = max(worst_loaded, abs(weight - LOAD))
+    return weight, worst_loaded, tracker.tracked
+
+
+def main():
+    hx = make_hx711()
+    accuracy(hx)
+    cost(hx)
+    print(
+        'zero drift of {:.1f}g over {} s, {:.0f}g on the scales from {} to {} s'.format(
+            DRIFT, DRIFT_S, LOAD, LOAD_FROM_S, LOAD_TO_S
+        )
+    )
+    for tracking in (False, True):
+        weight, worst_loaded, tracked = drift(hx, tracking)
+        print(
+            '  tracking {:<3}  final zero {:>6.2f} g   worst error with load {:>5.2f} g   tracked {:>5.2f} g'.format(
+                'on' if tracking else 'off', weight, worst_loaded, tracked
+            )
+        )
+
+
+main()
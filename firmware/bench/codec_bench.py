@@ -0,0 +1,93 @@
+"""Size of the weight stream with and without the `codec` encoding, and the cost of encoding.
+
+Run from the `firmware` folder with `python3 bench/codec_bench.py`. Every trace is filtered like on the device
+(weight and flow rate) and fed to `BLEScales.add_sample` on a virtual clock, with a central connected at the default
+ATT MTU of 23 and at 185. For the weight stream characteristic and the packed one, reports the bytes sent per sample
+and the samples held by a full notification (the 100 ms latency cap lifted), and checks that the packed stream
+decodes to the same samples.
+"""
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "sim"))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+import bluetooth  # noqa: E402
+import clock  # noqa: E402
+from ble_scales import BLEScales  # noqa: E402
+from codec import FrameEncoder, decode_frame  # noqa: E402
+from filtering import AdaptiveKalmanFilter, FlowRateEstimator  # noqa: E402
+from traces import TRACES  # noqa: E402
+
+CALLS = 20000
+
+
+def stream(trace, mtu, max_latency_ms):
+    clock.use_virtual()
+    ble = bluetooth.BLE(remote_mtu=mtu)
+    scales = BLEScales(ble)
+    scales.stream_max_latency_ms = max_latency_ms
+    ble.connect(1)
+    kf = AdaptiveKalmanFilter(0.03, q=0.1)
+    flow = FlowRateEstimator(0.03)
+    sent = []
+    last_t = trace[0][0]
+    for t, _, measured in trace:
+        clock.use_virtual(t * 1000)
+        dt = t - last_t
+        last_t = t
+        rate = flow.update(measured, dt / 1000 if dt > 0 else 0.0125)
+        weight = kf.update_estimate(measured)
+        scales.add_sample(t, weight, rate)
+        sent.append((t, int(round(weight * 100)), int(round(rate * 100))))
+    scales.flush_stream()
+    raw = [payload for _, handle, payload in ble.notifications if handle == scales._stream_handle]
+    packed = [payload for _, handle, payload in ble.notifications if handle == scales._packed_handle]
+    decoded = []
+    for payload in packed:
+        decoded.extend(decode_frame(payload)[0])
+    assert decoded == sent, "packed stream differs"
+    clock.use_real()
+    return raw, packed, len(sent)
+
+
+def encode_cost(trace):
+    encoder = FrameEncoder(182)
+    samples = [(t, int(measured * 100), int(measured * 10)) for t, _, measured in trace]
+    samples = (samples * (CALLS // len(samples) + 1))[:CALLS]
+    start = time.perf_counter()
+    for t, a, b in samples:
+        if not encoder.add(t, a, b):
+            encoder.finish()
+            encoder.add(t, a, b)
+    return (time.perf_counter() - start) / CALLS * 1000000
+
+
+def main():
+    print(
+        "{:<10} {:>4} {:>12} {:>12} {:>12} {:>12}".format(
+            "trace", "mtu", "raw B/smp", "packed B/smp", "raw smp/n", "packed smp/n"
+        )
+    )
+    for name, make_trace in TRACES.items():
+        trace = make_trace()
+        for mtu in (23, 185):
+            raw, packed, count = stream(trace, mtu, 100)
+            full_raw, full_packed, _ = stream(trace, mtu, 10 ** 9)
+            print(
+                "{:<10} {:>4} {:>12.2f} {:>12.2f} {:>12.1f} {:>12.1f}".format(
+                    name,
+                    mtu,
+                    sum(len(p) for p in raw) / count,
+                    sum(len(p) for p in packed) / count,
+                    count / len(full_raw),
+                    count / len(full_packed),
+                )
+            )
+    print("encoding cost {:.2f} us/sample (host)".format(encode_cost(TRACES["espresso"]())))
+
+
+if __name__ == "__main__":
+    main()
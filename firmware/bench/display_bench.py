@@ -0,0 +1,84 @@
+"""Host benchmark of the I2C traffic sent to the OLED for a brew-like weight trace.
+
+Compares the former full-frame flush with the incremental `display.WeightDisplay` renderer.
+Run from the `firmware` folder with `python3 bench/display_bench.py`.
+"""
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "sim"))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from art import BATTERY, DOT, GRAM, show_digit, show_sprite  # noqa: E402
+from display import WeightDisplay, format_weight, layout  # noqa: E402
+from ssd1306 import SSD1306_I2C  # noqa: E402
+
+
+class CountingI2C:
+    def __init__(self):
+        self.transactions = 0
+        self.bytes = 0
+
+    def writeto(self, addr, buf):
+        self.transactions += 1
+        self.bytes += len(buf)
+
+    def writevto(self, addr, bufs):
+        self.transactions += 1
+        self.bytes += sum(len(b) for b in bufs)
+
+    def reset(self):
+        self.transactions = 0
+        self.bytes = 0
+
+
+def trace():
+    # 3 s idle, 25 s pour up to 36 g, 5 s of drips, 5 s idle, sampled at 10 Hz
+    weights = [0.0] * 30
+    for i in range(250):
+        weights.append(36.0 * i / 250)
+    for i in range(50):
+        weights.append(36.0 + 0.5 * i / 50)
+    weights += [36.5] * 50
+    return weights
+
+
+def full_frame(screen, weight, battery_low):
+    screen.fill(0)
+    for position, _, char in layout(format_weight(weight)):
+        if char == '.':
+            show_sprite(screen, DOT, position, 27)
+        else:
+            show_digit(screen, char, position, 1)
+    show_sprite(screen, GRAM, 117, 16)
+    if battery_low:
+        show_sprite(screen, BATTERY, 117, 1)
+    screen.show()
+
+
+def main():
+    weights = trace()
+    results = []
+    for name in ("full", "dirty"):
+        i2c = CountingI2C()
+        screen = SSD1306_I2C(128, 32, i2c)
+        renderer = WeightDisplay(screen)
+        i2c.reset()
+        for weight in weights:
+            if name == "full":
+                full_frame(screen, weight, False)
+            else:
+                renderer.draw(weight, False)
+        results.append((name, i2c.bytes, i2c.transactions, bytes(screen.buffer)))
+        print(
+            "{:<6} {:>8} bytes {:>6} transactions {:>8.1f} bytes/frame".format(
+                name, i2c.bytes, i2c.transactions, i2c.bytes / len(weights)
+            )
+        )
+    assert results[0][3] == results[1][3], "incremental renderer diverged from a full redraw"
+    print("bus traffic reduction: {:.0%}".format(1 - results[1][1] / results[0][1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Two centrals on the scales, a fast display and a slow phone, sharing the transmit buffers of the radio.
+
+Run from the `firmware` folder with `python3 bench/fanout_sim.py`. `BLEScales` is fed an 80 Hz pour on a virtual
+clock while two centrals are connected through the radio model of the simulated `bluetooth`: a display with a 7.5ms
+connection interval subscribed to the weight and the packed stream, and a phone with a 45ms interval subscribed to
+the weight, flow rate and raw stream. Both share a pool of `TX_BUFFERS` buffers.
+
+Reports, for each central, how late the weight notifications arrive after the firmware sets the weight (mean and
+worst), the notifications it was sent, those dropped by its queue and the `gatts_notify` calls refused for lack of
+buffers, next to the same run without the rate cap of `Subscriber`, where the phone fills the pool and the display
+waits behind it. The phone is asked for more than its link carries either way, so its queue drops the oldest.
+"""
+import bisect
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "sim"))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+import bluetooth  # noqa: E402
+import clock  # noqa: E402
+import signals  # noqa: E402
+from ble_scales import BLEScales  # noqa: E402
+
+TX_BUFFERS = 12
+SECONDS = 30
+SAMPLE_MS = 12.5
+BLE_MS = 20
+DISPLAY, PHONE = 1, 2
+# conn_handle: name, ATT MTU, interval in units of 1.25ms, notifications per connection event
+CENTRALS = {
+    DISPLAY: ("display", 185, 6, 4),
+    PHONE: ("phone", 23, 36, 2),
+}
+
+
+def simulate(rate_cap=True):
+    clock.use_virtual()
+    ble = bluetooth.BLE(tx_buffers=TX_BUFFERS)
+    scales = BLEScales(ble)
+    written = {}
+    gatts_write = ble.gatts_write
+
+    def timed_write(value_handle, data, send_update=False):
+        # when the firmware set each weight
+        if value_handle == scales._weight_handle:
+            written.setdefault(bytes(data), []).append(clock.now_us())
+        gatts_write(value_handle, data, send_update)
+
+    ble.gatts_write = timed_write
+    for conn_handle, (_, mtu, interval, per_event) in CENTRALS.items():
+        ble.remote_mtu = mtu
+        ble.connect(conn_handle)
+        ble.update_connection(conn_handle, interval)
+        ble.set_link(conn_handle, interval * 1.25, per_event)
+        subscriber = scales.subscriber(conn_handle)
+        if not rate_cap:
+            subscriber.rate = subscriber.burst = subscriber._tokens = 1000000
+    for handle in (scales._weight_handle, scales._packed_handle):
+        ble.subscribe(DISPLAY, handle)
+    for handle in (scales._weight_handle, scales._flow_handle, scales._stream_handle):
+        ble.subscribe(PHONE, handle)
+
+    profile = signals.espresso()
+    next_ble = 0
+    for i in range(int(SECONDS * 1000 / SAMPLE_MS)):
+        t_ms = i * SAMPLE_MS
+        clock.use_virtual(int(t_ms * 1000))
+        weight = profile(t_ms / 1000)
+        flow_rate = (weight - profile(t_ms / 1000 - 1)) if t_ms >= 1000 else 0.0
+        scales.add_sample(int(t_ms), weight, flow_rate)
+        if t_ms >= next_ble:
+            next_ble += BLE_MS
+            scales.update_weight(weight, flow_rate)
+            scales.pump()
+    ble.deliver()
+    clock.use_real()
+
+    results = {}
+    for conn_handle in CENTRALS:
+        delays = []
+        for conn, handle, payload, queued, delivered in ble.deliveries:
+            if conn == conn_handle and handle == scales._weight_handle:
+                # the last time this weight was set before it reached the radio
+                times = written[payload]
+                delays.append((delivered - times[bisect.bisect_right(times, queued) - 1]) / 1000)
+        subscriber = scales.subscriber(conn_handle)
+        enomem = sum(1 for call in ble.calls if call[0] == "gatts_notify_enomem" and call[1] == conn_handle)
+        results[conn_handle] = (
+            sum(delays) / len(delays), max(delays), len(delays), subscriber.sent, subscriber.dropped, enomem
+        )
+    return results
+
+
+def main():
+    runs = [(rate_cap, simulate(rate_cap)) for rate_cap in (True, False)]
+    print("{} shared transmit buffers, {} s pour at {:.0f} Hz".format(TX_BUFFERS, SECONDS, 1000 / SAMPLE_MS))
+    print("{:<10} {:<8} {:>14} {:>13} {:>8} {:>6} {:>8} {:>7}".format(
+        "rate cap", "central", "weight mean ms", "weight max ms", "weights", "sent", "dropped", "ENOMEM"))
+    for rate_cap, results in runs:
+        for conn_handle, result in results.items():
+            print("{:<10} {:<8} {:>14.1f} {:>13.1f} {:>8} {:>6} {:>8} {:>7}".format(
+                "on" if rate_cap else "off", CENTRALS[conn_handle][0], *result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Check that `update_many` matches `update_estimate` on random data for both filters and compare their throughput.
+
+Run from the `firmware` folder with `python3 bench/filter_bench.py`. Both paths do the job of the main loop: filter
+the drained batches of samples in place, `update_estimate` called on each sample of the buffer against one
+`update_many` call per buffer. The timings are those of CPython on the host, the device was not measured.
+
+The NumPy path of `host.shots.refilter`, which reprocesses a whole recorded session at once, is checked against
+`KalmanFilter` and timed on the whole trace. It is skipped if NumPy is missing.
+"""
+import os
+import random
+import sys
+import time
+from array import array
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "sim"))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from filtering import AdaptiveKalmanFilter, KalmanFilter  # noqa: E402
+
+try:
+    from host.shots import refilter
+except ImportError:
+    refilter = None
+
+SAMPLES = 20000
+BATCH = 8
+TRIALS = 20
+REPEATS = 7
+
+
+def random_trace(rng, count):
+    # noisy plateaus with the odd step, like cups being put down and coffee poured
+    level = 0.0
+    trace = []
+    for i in range(count):
+        if rng.random() < 0.005:
+            level += rng.uniform(-300.0, 300.0)
+        level += rng.uniform(0.0, 0.1)
+        trace.append(level + rng.gauss(0.0, 0.2))
+    return trace
+
+
+def check(rng, cls):
+    for trial in range(TRIALS):
+        # round to single precision up front, like the samples stored in an array('f')
+        trace = list(array('f', random_trace(rng, rng.randint(1, 2000))))
+        uncertainty = rng.uniform(0.001, 1.0)
+        q = rng.uniform(0.001, 1.0)
+        single = cls(uncertainty, q=q)
+        expected = array('f')
+        expected_flags = bytearray()
+        for value in trace:
+            expected.append(single.update_estimate(value))
+            expected_flags.append(getattr(single, "stable", False))
+
+        batched = cls(uncertainty, q=q)
+        buffer = array('f', trace)
+        view = memoryview(buffer)
+        flags = bytearray(len(buffer))
+        for start in range(0, len(buffer), BATCH):
+            count = min(BATCH, len(buffer) - start)
+            if cls is AdaptiveKalmanFilter:
+                batched.update_many(view[start:], count, memoryview(flags)[start:])
+            else:
+                batched.update_many(view[start:], count)
+        assert buffer == expected, "{}.update_many differs from update_estimate".format(cls.__name__)
+        if cls is AdaptiveKalmanFilter:
+            assert flags == expected_flags, "stable_flags differ from stable after each update_estimate"
+        assert batched.last_estimate == single.last_estimate and batched.err_est == single.err_est
+        assert getattr(batched, "stable", None) == getattr(single, "stable", None)
+
+        if refilter is not None and cls is KalmanFilter:
+            result = array('f', refilter(trace, uncertainty, q=q).tolist())
+            assert result == expected, "refilter differs from update_estimate"
+
+
+def bench(name, func, trace):
+    best = None
+    for _ in range(REPEATS):
+        # fresh buffers for every run, they are filtered in place
+        batches = [array('f', trace[start:start + BATCH]) for start in range(0, SAMPLES, BATCH)]
+        start = time.perf_counter()
+        func(batches)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    print("{:<16} {:>12.0f} samples/s".format(name, SAMPLES / best))
+    return best
+
+
+def main():
+    rng = random.Random(1234)
+    for cls in (KalmanFilter, AdaptiveKalmanFilter):
+        check(rng, cls)
+    print("update_many agrees with update_estimate on {} random traces for both filters".format(TRIALS))
+    if refilter is not None:
+        print("refilter agrees with KalmanFilter.update_estimate")
+    else:
+        print("numpy not installed, refilter skipped")
+    trace = random_trace(rng, SAMPLES)
+    print("batches of {} samples, best of {} runs".format(BATCH, REPEATS))
+    for cls in (KalmanFilter, AdaptiveKalmanFilter):
+
+        def single(batches):
+            kf = cls(0.03, q=0.1)
+            update_estimate = kf.update_estimate
+            for buffer in batches:
+                for i in range(len(buffer)):
+                    buffer[i] = update_estimate(buffer[i])
+
+        def batched(batches):
+            kf = cls(0.03, q=0.1)
+            for buffer in batches:
+                kf.update_many(buffer, len(buffer))
+
+        print(cls.__name__)
+        single_s = bench("update_estimate", single, trace)
+        batched_s = bench("update_many", batched, trace)
+        print("update_many      {:>12.2f}x".format(single_s / batched_s))
+    if refilter is not None:
+        print("whole trace")
+        bench("refilter", lambda batches: refilter(trace, 0.03, q=0.1), trace)
+
+
+if __name__ == "__main__":
+    main()
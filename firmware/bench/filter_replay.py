@@ -0,0 +1,114 @@
+"""Replay load cell traces through the Kalman filters and report settle time, noise and lag.
+
+Run from the `firmware` folder with `python3 bench/filter_replay.py`.
+
+- settle: time from the last change of the true weight until the estimate stays within 0.1 g of it
+- noise: standard deviation of the estimate while the true weight is constant and the filter has settled
+- lag: mean absolute error while the true weight is changing
+
+The flow rate estimated on the device at the full sample rate is also compared with the rate a client can compute
+by differentiating the 10 Hz notifications rounded to 0.05 g, on beans poured in (the flow starts and stops within
+half a second), an espresso shot (the flow changes slowly) and the empty scale.
+"""
+import os
+import sys
+from math import sqrt
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "sim"))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from filtering import AdaptiveKalmanFilter, FlowRateEstimator, KalmanFilter  # noqa: E402
+from traces import TRACES  # noqa: E402
+
+TOLERANCE = 0.1
+
+FILTERS = {
+    "kalman": lambda: KalmanFilter(0.03, q=0.1),
+    "adaptive": lambda: AdaptiveKalmanFilter(0.03, q=0.1),
+}
+
+
+def replay(make_filter, trace):
+    kf = make_filter()
+    estimates = [kf.update_estimate(measured) for _, _, measured in trace]
+
+    last_change = 0
+    for i in range(1, len(trace)):
+        if trace[i][1] != trace[i - 1][1]:
+            last_change = i
+    settled_at = None
+    for i in range(len(trace) - 1, last_change - 1, -1):
+        if abs(estimates[i] - trace[i][1]) > TOLERANCE:
+            break
+        settled_at = i
+    settle_ms = None if settled_at is None else trace[settled_at][0] - trace[last_change][0]
+
+    steady = []
+    moving = []
+    for i in range(1, len(trace)):
+        if trace[i][1] != trace[i - 1][1]:
+            moving.append(abs(estimates[i] - trace[i][1]))
+        elif settled_at is not None and i >= settled_at or last_change == 0:
+            steady.append(estimates[i] - trace[i][1])
+    noise = None
+    if steady:
+        mean = sum(steady) / len(steady)
+        noise = sqrt(sum((e - mean) ** 2 for e in steady) / len(steady))
+    lag = sum(moving) / len(moving) if moving else None
+    return settle_ms, noise, lag
+
+
+def true_rate(trace, i):
+    if i == 0:
+        return 0.0
+    return (trace[i][1] - trace[i - 1][1]) * 1000 / (trace[i][0] - trace[i - 1][0])
+
+
+def flow_errors(trace):
+    estimator = FlowRateEstimator(0.03)
+    kf = KalmanFilter(0.03, q=0.1)
+    device = []
+    client = []
+    last_t = 0
+    last_notified = None
+    client_rate = 0.0
+    for i, (t, _, measured) in enumerate(trace):
+        rate = estimator.update(measured, (t - last_t) / 1000 if t > last_t else 0.0125)
+        last_t = t
+        estimate = kf.update_estimate(measured)
+        if t % 100 < 1000 // 80:
+            notified = round(estimate / 0.05) * 0.05
+            if last_notified is not None:
+                client_rate = (notified - last_notified) * 10
+            last_notified = notified
+        expected = true_rate(trace, i)
+        device.append(abs(rate - expected))
+        client.append(abs(client_rate - expected))
+    return sum(device) / len(device), sum(client) / len(client)
+
+
+def fmt(value, pattern):
+    return "-" if value is None else pattern.format(value)
+
+
+def main():
+    print("{:<10} {:<9} {:>10} {:>10} {:>10}".format("trace", "filter", "settle ms", "noise g", "lag g"))
+    for trace_name, make_trace in TRACES.items():
+        trace = make_trace()
+        for filter_name, make_filter in FILTERS.items():
+            settle_ms, noise, lag = replay(make_filter, trace)
+            print(
+                "{:<10} {:<9} {:>10} {:>10} {:>10}".format(
+                    trace_name, filter_name, fmt(settle_ms, "{}"), fmt(noise, "{:.4f}"), fmt(lag, "{:.3f}")
+                )
+            )
+    print()
+    print("{:<10} {:>14} {:>14}".format("trace", "device g/s err", "client g/s err"))
+    for trace_name in ("beans", "espresso", "idle"):
+        device, client = flow_errors(TRACES[trace_name]())
+        print("{:<10} {:>14.3f} {:>14.3f}".format(trace_name, device, client))
+
+
+if __name__ == "__main__":
+    main()
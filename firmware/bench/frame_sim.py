@@ -0,0 +1,103 @@
+"""Frame pacing of the OLED by `display.FrameScheduler`, with and without a task keeping the CPU busy.
+
+Run from the `firmware` folder with `python3 bench/frame_sim.py`. The uasyncio firmware runs on the simulated hardware
+through an espresso shot, tared with the button so the timer layout shows. The simulated I2C bus takes the time a
+400 kHz transfer would, which is what a frame costs on the virtual clock. In the busy runs, a task works for
+`HOG_MS` every `HOG_EVERY_MS` from `HOG_FROM` to `HOG_UNTIL` (interrupts still come in, the samples pile up in the
+ring buffer), and the adaptive scheduler is compared with one held at the target rate.
+
+Reports the frames drawn per second, the share of the time spent drawing, the frame time (mean and worst), the frames
+over budget and dropped, the rate at the end of the run, and how far behind the sampler got: the most samples waiting
+in the ring buffer and the samples lost to a full buffer.
+"""
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "sim"))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+import clock  # noqa: E402
+import machine  # noqa: E402
+import signals  # noqa: E402
+from display import FrameScheduler  # noqa: E402
+from run_main import setup  # noqa: E402
+
+SECONDS = 40
+TARE_AT = 1.5
+HOG_MS = 120
+HOG_EVERY_MS = 150
+HOG_FROM = 10
+HOG_UNTIL = 25
+POLL_US = 2000
+
+
+def run(adaptive, busy):
+    import main_async
+
+    asyncio = main_async.asyncio
+    clock.use_virtual()
+    setup(signals.PROFILES["shot"]())
+    firmware = main_async.Scales()
+    if not adaptive:
+        firmware.frames = FrameScheduler(fps=main_async.FPS, min_fps=main_async.FPS)
+    firmware.ble.connect(1)
+    machine.at(int(TARE_AT * 1000000), lambda: machine.press(0))
+    machine.at(int(TARE_AT * 1000000) + 100000, lambda: machine.release(0))
+    backlog = [0]
+
+    def watch():
+        backlog[0] = max(backlog[0], firmware.hx.available())
+        machine.at(clock.now_us() + POLL_US, watch)
+
+    machine.at(POLL_US, watch)
+
+    async def hog():
+        await asyncio.sleep_ms(HOG_FROM * 1000)
+        while clock.now_us() < HOG_UNTIL * 1000000:
+            await asyncio.sleep_ms(HOG_EVERY_MS)
+            for _ in range(HOG_MS):
+                clock.pause_us(1000)
+                machine.poll()
+
+    async def main():
+        if busy:
+            asyncio.create_task(hog())
+        await firmware.run()
+
+    machine.stop_at(SECONDS * 1000000)
+    try:
+        asyncio.run(main())
+    except machine.SimulationEnd:
+        pass
+    clock.use_real()
+    frames = firmware.frames
+    print(
+        "{:<20} {:>8.1f} {:>6.1f} {:>8.2f} {:>8.2f} {:>8} {:>8} {:>7.0f} {:>8} {:>5}".format(
+            "{}{}".format("adaptive" if adaptive else "fixed", ", busy" if busy else ""),
+            frames.frames / SECONDS,
+            frames.frame_us_total / SECONDS / 10000,
+            frames.frame_us_total / max(frames.frames, 1) / 1000,
+            frames.frame_us_max / 1000,
+            frames.over_budget,
+            frames.dropped,
+            1000 / frames.period_ms,
+            backlog[0],
+            firmware.hx.overruns,
+        )
+    )
+
+
+def main():
+    print(
+        "{:<20} {:>8} {:>6} {:>8} {:>8} {:>8} {:>8} {:>7} {:>8} {:>5}".format(
+            "", "frames/s", "draw %", "mean ms", "worst ms", "> budget", "dropped", "end fps", "backlog", "lost"
+        )
+    )
+    run(adaptive=True, busy=False)
+    run(adaptive=False, busy=True)
+    run(adaptive=True, busy=True)
+
+
+if __name__ == "__main__":
+    main()
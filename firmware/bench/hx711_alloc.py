@@ -0,0 +1,47 @@
+"""On-device benchmark of the HX711 hot path: heap allocations and time per sample.
+
+Upload next to the firmware and run from the REPL with `import bench.hx711_alloc` (or copy it to the root of the
+filesystem and `import hx711_alloc`). Compares the float `get_units` path with a read converted by the fixed-point
+`to_fixed`, each with the viper reader and the pure-Python fallback. The firmware loop converts with `to_units`,
+which returns a float either way.
+"""
+import gc
+import time
+
+import micropython
+from hx711 import HX711
+
+SAMPLES = 80
+
+
+def measure(name, hx, func):
+    func()  # warm up, the first call may allocate caches
+    gc.collect()
+    gc.disable()
+    before = gc.mem_alloc()
+    start = time.ticks_us()
+    for i in range(SAMPLES):
+        func()
+    elapsed = time.ticks_diff(time.ticks_us(), start)
+    allocated = gc.mem_alloc() - before
+    gc.enable()
+    print('{:<16} {:>6} bytes/sample {:>8} us/sample'.format(name, allocated // SAMPLES, elapsed // SAMPLES))
+
+
+def main():
+    hx = HX711(dout=14, pd_sck=13, gain=64)
+    hx.set_scale(1544.667)
+    hx.tare()
+    native = hx._native
+    for mode in (True, False):
+        if mode and not native:
+            continue
+        hx._native = mode
+        label = 'viper' if mode else 'python'
+        measure(label + ' float', hx, lambda: hx.get_units(times=1))
+        measure(label + ' fixed', hx, lambda: hx.to_fixed(hx.read()))
+    hx._native = native
+    micropython.mem_info()
+
+
+main()
@@ -0,0 +1,208 @@
+"""End-to-end latency from a weight step at the load cell to the BLE notification and the OLED.
+
+The firmware of `main.py` runs as it is, with its own objects and display thread. A synthetic step (in raw ADC
+counts) is added to what the HX711 shifts in, then each stage is timestamped with `time.ticks_us` the first time it
+reflects at least `THRESHOLD` of the step:
+
+- raw: `HX711.drain` handed the stepped value to the main loop (the interrupt-driven sampling)
+- filter: `AdaptiveKalmanFilter.update_many` output, with the filter settings of the calibration
+- notify: `BLEScales.update_weight` sent a notification
+- display: the `WeightDisplay.draw` frame of the display thread, flushed to the OLED, that put the value on screen
+
+The step alternates up and down, the next one comes once every stage saw the previous one and the filter got
+`SETTLE_SAMPLES` samples. For each stage, the p50/p95/p99 latency from the step and the throughput (calls per second
+of the stage's own processing time) are reported.
+
+On the host, run from the `firmware` folder with `python3 bench/latency.py` (simulated hardware with a central
+connected, real clock). On the device, stop `main.py`, upload this file, then `import latency` and
+`latency.main()`. Without a central, the notify stage is when the notification policy would have sent one.
+"""
+import sys
+import time
+
+import _thread
+
+ON_DEVICE = sys.implementation.name == 'micropython'
+
+if not ON_DEVICE:
+    import os
+
+    HERE = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.join(HERE, '..', 'sim'))
+    sys.path.insert(0, os.path.join(HERE, '..'))
+
+from display import format_weight  # noqa: E402
+
+STEP_GRAMS = 100.0
+THRESHOLD = 0.9
+TRIALS = 40
+SETTLE_SAMPLES = 40
+STAGES = ('raw', 'filter', 'notify', 'display')
+
+
+class Done(Exception):
+    pass
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    index = int(round(p / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def load_firmware():
+    """Import `main`, which builds the firmware objects, on the simulated hardware when on the host."""
+    if not ON_DEVICE:
+        import clock
+        import signals
+        from run_main import setup
+
+        clock.use_real()
+        setup(signals.constant(0.0))
+    import main
+
+    if not ON_DEVICE:
+        main.ble.connect(1)
+    return main
+
+
+class Probe:
+    """Wraps the stages of the firmware objects to inject the step and timestamp what each stage outputs."""
+
+    def __init__(self, firmware):
+        self.firmware = firmware
+        self.latencies = {stage: [] for stage in STAGES}
+        self.busy_us = {stage: 0 for stage in STAGES}
+        self.calls = {stage: 0 for stage in STAGES}
+        self.trial = -1
+        self.step = 0
+        self.step_time = 0
+        self.start_value = 0.0
+        self.seen = {}
+        self.samples = 0
+        self.done = False
+        hx = firmware.hx
+        self.step_counts = int(STEP_GRAMS * hx.SCALE)
+        self._shift_in = hx._shift_in
+        self._drain = hx.drain
+        self._update_many = firmware.kf.update_many
+        self._update_weight = firmware.scales.update_weight
+        self._draw = firmware.weight_display.draw
+        hx._shift_in = self.shift_in
+        hx.drain = self.drain
+        firmware.kf.update_many = self.update_many
+        firmware.scales.update_weight = self.update_weight
+        firmware.weight_display.draw = self.draw
+
+    def reached(self, value):
+        return abs(value - self.start_value) >= THRESHOLD * STEP_GRAMS
+
+    def see(self, stage, t):
+        if self.trial >= 0 and stage not in self.seen:
+            self.seen[stage] = t
+
+    def next_step(self):
+        if self.trial >= 0:
+            for stage in STAGES:
+                self.latencies[stage].append(time.ticks_diff(self.seen[stage], self.step_time))
+        self.trial += 1
+        if self.trial == TRIALS:
+            self.done = True
+            raise Done
+        up = self.trial % 2 == 0
+        self.start_value = 0.0 if up else STEP_GRAMS
+        self.seen = {}
+        self.samples = 0
+        self.step_time = time.ticks_us()
+        self.step = self.step_counts if up else 0
+
+    def shift_in(self):
+        start = time.ticks_us()
+        value = self._shift_in() + self.step
+        self.busy_us['raw'] += time.ticks_diff(time.ticks_us(), start)
+        self.calls['raw'] += 1
+        return value
+
+    def drain(self, values, times=None):
+        start = time.ticks_us()
+        count = self._drain(values, times)
+        t = time.ticks_us()
+        self.busy_us['raw'] += time.ticks_diff(t, start)
+        to_units = self.firmware.hx.to_units
+        for i in range(count):
+            if self.reached(to_units(values[i])):
+                self.see('raw', t)
+                break
+        return count
+
+    def update_many(self, samples, count=None, stable_flags=None):
+        start = time.ticks_us()
+        estimate = self._update_many(samples, count, stable_flags)
+        t = time.ticks_us()
+        self.busy_us['filter'] += time.ticks_diff(t, start)
+        self.calls['filter'] += len(samples) if count is None else count
+        self.samples += len(samples) if count is None else count
+        if self.reached(estimate):
+            self.see('filter', t)
+        return estimate
+
+    def update_weight(self, weight, flow_rate=None, now=None):
+        start = time.ticks_us()
+        scales = self.firmware.scales
+        if scales.connected:
+            notified = self._update_weight(weight, flow_rate, now)
+        else:
+            # no central connected to the device: same policy and local write, without the radio
+            rounded_weight = round(weight / 0.05) * 0.05
+            notified = scales.policy.should_notify(rounded_weight, time.ticks_ms())
+            if notified:
+                scales.set_weight(rounded_weight)
+        t = time.ticks_us()
+        self.busy_us['notify'] += time.ticks_diff(t, start)
+        self.calls['notify'] += 1
+        if notified and self.reached(round(weight / 0.05) * 0.05):
+            self.see('notify', t)
+        # once a sample batch went all the way through the loop
+        if self.trial < 0 or (len(self.seen) == len(STAGES) and self.samples >= SETTLE_SAMPLES):
+            self.next_step()
+        return notified
+
+    def draw(self, weight, *args):
+        if self.done:
+            _thread.exit()
+        start = time.ticks_us()
+        self._draw(weight, *args)
+        t = time.ticks_us()
+        self.busy_us['display'] += time.ticks_diff(t, start)
+        self.calls['display'] += 1
+        if self.reached(float(format_weight(weight))):
+            self.see('display', t)
+
+
+def main():
+    firmware = load_firmware()
+    probe = Probe(firmware)
+    try:
+        firmware.main()
+    except Done:
+        pass
+
+    print('{} trials, {} g steps, stage reached at {:.0%} of the step'.format(TRIALS, STEP_GRAMS, THRESHOLD))
+    print('{:<8} {:>10} {:>10} {:>10} {:>12}'.format('stage', 'p50 ms', 'p95 ms', 'p99 ms', 'calls/s'))
+    for stage in STAGES:
+        values = probe.latencies[stage]
+        busy_us = probe.busy_us[stage]
+        throughput = probe.calls[stage] * 1000000 / busy_us if busy_us else 0
+        print(
+            '{:<8} {:>10.2f} {:>10.2f} {:>10.2f} {:>12.0f}'.format(
+                stage,
+                percentile(values, 50) / 1000,
+                percentile(values, 95) / 1000,
+                percentile(values, 99) / 1000,
+                throughput,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Simulate the weight notifications sent under different notification policies.
+
+Run from the `firmware` folder with `python3 bench/notify_sim.py`. Every trace is filtered like on the device and
+fed to `BLEScales.update_weight` on a virtual clock. For each policy, reports the notifications per minute and how
+far the client's last received value is from the filtered weight (mean and worst case).
+"""
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "sim"))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+import bluetooth  # noqa: E402
+import clock  # noqa: E402
+from ble_scales import BLEScales, NotifyPolicy  # noqa: E402
+from filtering import AdaptiveKalmanFilter  # noqa: E402
+from traces import TRACES  # noqa: E402
+
+POLICIES = {
+    "fixed 100ms": lambda: NotifyPolicy(deadband=0, min_interval_ms=100, max_interval_ms=100),
+    "0.05g / 1s": lambda: NotifyPolicy(deadband=0.05, min_interval_ms=50, max_interval_ms=1000),
+    "0.1g / 2s": lambda: NotifyPolicy(deadband=0.1, min_interval_ms=50, max_interval_ms=2000),
+}
+
+
+def simulate(trace, policy):
+    clock.use_virtual()
+    ble = bluetooth.BLE()
+    scales = BLEScales(ble, policy=policy)
+    ble.connect(1)
+    ble.notifications.clear()
+    kf = AdaptiveKalmanFilter(0.03, q=0.1)
+    client = 0.0
+    errors = []
+    start = trace[0][0]
+    for t, _, measured in trace:
+        clock.use_virtual((t - start) * 1000)
+        estimate = kf.update_estimate(measured)
+        if scales.update_weight(estimate):
+            client = round(estimate / 0.05) * 0.05
+        errors.append(abs(client - estimate))
+    weight_notifications = sum(1 for _, handle, _ in ble.notifications if handle == scales._weight_handle)
+    minutes = (trace[-1][0] - start) / 60000
+    return weight_notifications / minutes, sum(errors) / len(errors), max(errors)
+
+
+def main():
+    print("{:<10} {:<12} {:>10} {:>12} {:>12}".format("trace", "policy", "notif/min", "mean err g", "max err g"))
+    for trace_name, make_trace in TRACES.items():
+        trace = make_trace()
+        for policy_name, make_policy in POLICIES.items():
+            rate, mean_error, max_error = simulate(trace, make_policy())
+            print(
+                "{:<10} {:<12} {:>10.0f} {:>12.3f} {:>12.3f}".format(
+                    trace_name, policy_name, rate, mean_error, max_error
+                )
+            )
+    clock.use_real()
+
+
+if __name__ == "__main__":
+    main()
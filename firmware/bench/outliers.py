@@ -0,0 +1,112 @@
+"""Tare accuracy and filtered weight error with glitching HX711 readings, with and without outlier rejection.
+
+Run from the `firmware` folder with `python3 bench/outliers.py`. The simulated HX711 returns a rail value or a reading
+with a flipped bit for a share of its conversions. The previous behaviour (plain mean of 15 readings, every reading
+kept) is compared with the trimmed mean of 8 readings behind `HX711._accept`:
+
+- tare: error of the offset over many tares of the empty scales, and how long a tare takes
+- stream: error of the `AdaptiveKalmanFilter` output once settled on a 250g cup, and how long it takes to reach 90%
+  of the step after the cup is put down
+"""
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "sim"))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+import clock  # noqa: E402
+import machine  # noqa: E402
+import signals  # noqa: E402
+from devices import HX711Device  # noqa: E402
+from filtering import AdaptiveKalmanFilter  # noqa: E402
+from hx711 import HX711  # noqa: E402
+
+SCALE = 1544.667
+OFFSET = 84000
+GLITCHES = 0.03
+TARES = 300
+STEP_AT = 2.0
+CUP = 250.0
+SECONDS = 20.0
+
+
+class PlainHX711(HX711):
+    """The readings before outlier rejection: every conversion is kept and the tare is a plain mean."""
+
+    def _accept(self, value):
+        return True
+
+    def tare(self, times=15):
+        self.flush()
+        self.set_offset(self.read_average(times))
+
+
+def make(cls, profile, seed):
+    machine.reset_devices()
+    device = HX711Device(dout=14, pd_sck=13, profile=profile, glitches=GLITCHES, seed=seed)
+    hx = cls(dout=14, pd_sck=13, gain=64)
+    hx.set_scale(SCALE)
+    return device, hx
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[int(round(p / 100 * (len(ordered) - 1)))]
+
+
+def tare_errors(cls):
+    device, hx = make(cls, signals.constant(0.0), seed=1)
+    errors = []
+    start = clock.now_us()
+    for i in range(TARES):
+        hx.tare()
+        errors.append(abs(hx.OFFSET - OFFSET) / SCALE)
+    return errors, (clock.now_us() - start) / TARES / 1000
+
+
+def stream_errors(cls):
+    device, hx = make(cls, signals.step(STEP_AT, CUP), seed=2)
+    hx.set_offset(OFFSET)
+    kf = AdaptiveKalmanFilter(0.03, q=0.1)
+    start = clock.now_us()
+    errors = []
+    reached = None
+    while clock.now_us() - start < SECONDS * 1000000:
+        weight = kf.update_estimate(hx.to_units(hx.read()))
+        t = (clock.now_us() - start) / 1000000
+        if reached is None and t >= STEP_AT and weight >= 0.9 * CUP:
+            reached = t - STEP_AT
+        if t >= STEP_AT + 1.0:
+            errors.append(abs(weight - CUP))
+    return errors, reached, hx.rejected, device.glitched
+
+
+def main():
+    clock.use_virtual()
+    print("{:.0%} of the conversions glitch".format(GLITCHES))
+    print("{:<10} {:>14} {:>14} {:>14} {:>10}".format("tare", "mean err g", "p99 err g", "worst err g", "ms/tare"))
+    for name, cls in (("plain", PlainHX711), ("rejection", HX711)):
+        errors, duration = tare_errors(cls)
+        print(
+            "{:<10} {:>14.3f} {:>14.3f} {:>14.3f} {:>10.1f}".format(
+                name, sum(errors) / len(errors), percentile(errors, 99), max(errors), duration
+            )
+        )
+    print("{:<10} {:>14} {:>14} {:>14} {:>10}".format("stream", "p99 err g", "worst err g", "90% step ms", "dropped"))
+    for name, cls in (("plain", PlainHX711), ("rejection", HX711)):
+        errors, reached, rejected, glitched = stream_errors(cls)
+        print(
+            "{:<10} {:>14.3f} {:>14.3f} {:>14.1f} {:>10}".format(
+                name,
+                percentile(errors, 99),
+                max(errors),
+                reached * 1000,
+                "{}/{}".format(rejected, glitched),
+            )
+        )
+    clock.use_real()
+
+
+if __name__ == "__main__":
+    main()
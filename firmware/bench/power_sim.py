@@ -0,0 +1,120 @@
+"""Simulate the idle power stages of `power.PowerManager` on the uasyncio firmware.
+
+Run from the `firmware` folder with `python3 bench/power_sim.py`. The scales sit empty with no central connected, a
+cup is put on them at 100s and the button is pressed at 170s. The delays are shortened (dim after 10s, blank after
+20s, light sleep after 40s) so a run covers every stage. The same scenario runs without power management as a
+reference. Reports the time spent in each stage, how long the scales took to wake up after each event, and the
+activity of the HX711, the CPU, the OLED and the advertising. The OLED bytes are also given until the cup is put
+down: once awake, both runs redraw whenever the last digit flickers between two values, which depends on where the
+weight falls against the display rounding rather than on power management. The longest gap between two polls of the
+button while idle shows that the single readings don't hold up the other tasks.
+
+Currents can't be measured here, the counts only show what is switched off and for how long.
+"""
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "sim"))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+import clock  # noqa: E402
+import machine  # noqa: E402
+import power  # noqa: E402
+import signals  # noqa: E402
+from run_main import setup  # noqa: E402
+
+SECONDS = 200
+CUP_AT = 100
+BUTTON_AT = 170
+CUP_WEIGHT = 250.0
+POLL_MS = 50
+
+
+def simulate(managed):
+    import main_async
+
+    clock.use_virtual()
+    hx, oled = setup(signals.step(CUP_AT, CUP_WEIGHT))
+    firmware = main_async.Scales()
+    manager = firmware.power
+    if managed:
+        manager.dim_ms, manager.idle_ms, manager.sleep_ms = 10000, 20000, 40000
+    else:
+        manager.dim_ms = manager.idle_ms = manager.sleep_ms = 10 * SECONDS * 1000
+    stages = []
+
+    def watch():
+        stages.append((clock.now_us() / 1000000, manager.stage))
+        machine.at(clock.now_us() + POLL_MS * 1000, watch)
+
+    watch()
+    oled_before_cup = []
+    machine.at(CUP_AT * 1000000, lambda: oled_before_cup.append(oled.bytes))
+    # how often the button task gets to run while idle, the single readings must not hold it up
+    button_pin = firmware.button_pin
+    polls = []
+
+    def polled():
+        polls.append((clock.now_us(), manager.stage))
+        return button_pin()
+
+    firmware.button_pin = polled
+    machine.at(BUTTON_AT * 1000000, lambda: machine.press(0))
+    machine.at(BUTTON_AT * 1000000 + 100000, lambda: machine.release(0))
+    machine.stop_at(SECONDS * 1000000)
+    try:
+        main_async.asyncio.run(firmware.run())
+    except machine.SimulationEnd:
+        pass
+
+    durations = [0.0] * len(power.NAMES)
+    for (t, stage), (t_next, _) in zip(stages, stages[1:]):
+        durations[stage] += t_next - t
+    wake_up = []
+    for event in (CUP_AT, BUTTON_AT):
+        awake = [t for t, stage in stages if t >= event and stage == power.ACTIVE]
+        asleep = any(t < event and stage != power.ACTIVE for t, stage in stages if t >= event - 1)
+        wake_up.append(awake[0] - event if awake and asleep else None)
+    idle_gaps = [
+        (t_next - t) / 1000 for (t, stage), (t_next, stage_next) in zip(polls, polls[1:])
+        if stage == stage_next == power.IDLE
+    ]
+    advertising = sum(1 for call in firmware.ble.calls if call[0] == "gap_advertise")
+    return {
+        "durations": durations,
+        "wake_up": wake_up,
+        "conversions": hx.reads,
+        "wakeups": machine.wakeups,
+        "oled_bytes": oled.bytes,
+        "oled_bytes_empty": oled_before_cup[0],
+        "idle_poll_ms": max(idle_gaps) if idle_gaps else None,
+        "display_on": oled.display_on,
+        "advertising": advertising,
+        "weight": firmware.weight,
+    }
+
+
+def main():
+    for managed in (False, True):
+        result = simulate(managed)
+        print("power management {}".format("on" if managed else "off"))
+        print(
+            "  time per stage       "
+            + ", ".join("{} {:.0f}s".format(name, d) for name, d in zip(power.NAMES, result["durations"]))
+        )
+        for name, latency in zip(("cup", "button"), result["wake_up"]):
+            if latency is not None:
+                print("  wake up on {:<9} {:.2f} s".format(name, latency))
+        print("  HX711 conversions    {}".format(result["conversions"]))
+        print("  CPU wake-ups         {}".format(result["wakeups"]))
+        print("  OLED bytes           {}, {} until the cup".format(result["oled_bytes"], result["oled_bytes_empty"]))
+        if result["idle_poll_ms"] is not None:
+            print("  button poll while idle, longest gap {:.0f} ms".format(result["idle_poll_ms"]))
+        print("  advertising changes  {}".format(result["advertising"]))
+        print("  final weight         {:.2f} g".format(result["weight"]))
+    clock.use_real()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""The shot timer (`shot_timer.ShotTimer`) following a cup, an espresso shot and the cup taken away.
+
+Run from the `firmware` folder with `python3 bench/shot_sim.py`. The uasyncio firmware runs on the simulated
+hardware with a central connected: the scales are empty, a cup is put down, a shot is poured into it with slow drips
+at the end, then the cup is taken away and the next one put down.
+
+With `calibration.AUTO_TARE` set, prints the state timeline next to the true events of the profile, how late the
+timer started and stopped, the time shown against the length of the pour, the auto-tares and the shot timer
+notifications. Then the same shot without auto-tare, the cup tared with the button, and a light dosing cup tared
+with the button before the beans go in, which must not start a shot.
+"""
+import os
+import struct
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "sim"))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+import calibration  # noqa: E402
+import clock  # noqa: E402
+import machine  # noqa: E402
+import signals  # noqa: E402
+from run_main import setup  # noqa: E402
+from shot_timer import NAMES  # noqa: E402
+
+CUP = 250.0
+CUP_AT = 2.0
+POUR_AFTER = 5.0
+POUR = 25.0
+DRIPS = 5.0
+REMOVED_AT = 47.0
+NEXT_CUP_AT = 51.0
+SECONDS = 56
+TARE_AT = 4.0
+DOSING_CUP = 15.0
+BEANS = 18.0
+BEANS_AT = 6.0
+POLL_US = 10000
+
+
+class Watcher:
+    """Polls the firmware on the virtual clock, keeps the state changes and counts the tares."""
+
+    def __init__(self, firmware):
+        self.firmware = firmware
+        self.changes = []
+        self.tares = []
+        self.state = firmware.shot.state
+        tare = firmware.tare
+
+        def counted():
+            self.tares.append(clock.now_us() / 1000000)
+            tare()
+
+        firmware.tare = counted
+
+    def poll(self):
+        state = self.firmware.shot.state
+        if state != self.state:
+            self.state = state
+            self.changes.append((clock.now_us() / 1000000, state))
+        machine.at(clock.now_us() + POLL_US, self.poll)
+
+
+def simulate(profile, seconds, auto_tare, press_at=None):
+    """Run the uasyncio firmware on `profile`, pressing the tare button at `press_at` seconds if given."""
+    import main_async
+
+    clock.use_virtual()
+    setup(profile)
+    firmware = main_async.Scales()
+    if auto_tare:
+        firmware.cal.flags |= calibration.AUTO_TARE
+        firmware.shot.on_tare = firmware._auto_tare(firmware.cal)
+    firmware.ble.connect(1)
+    watcher = Watcher(firmware)
+    machine.at(POLL_US, watcher.poll)
+    if press_at is not None:
+        machine.at(int(press_at * 1000000), lambda: machine.press(0))
+        machine.at(int(press_at * 1000000) + 100000, lambda: machine.release(0))
+    machine.stop_at(seconds * 1000000)
+    try:
+        main_async.asyncio.run(firmware.run())
+    except machine.SimulationEnd:
+        pass
+    clock.use_real()
+    return firmware, watcher
+
+
+def timeline(watcher):
+    return ", ".join("{} {:.2f} s".format(NAMES[state], t) for t, state in watcher.changes) or "idle throughout"
+
+
+def main():
+    pour = signals.espresso(start=POUR_AFTER, pour=POUR, drips=DRIPS)
+    profile = signals.sequence(
+        (CUP_AT, signals.constant(0.0)),
+        (REMOVED_AT - CUP_AT, lambda t: CUP + pour(t)),
+        (NEXT_CUP_AT - REMOVED_AT, signals.constant(0.0)),
+        (1e9, signals.constant(CUP)),
+    )
+    firmware, watcher = simulate(profile, SECONDS, auto_tare=True)
+    manual, manual_watcher = simulate(profile, SECONDS, auto_tare=False, press_at=TARE_AT)
+    dosing = signals.sequence(
+        (CUP_AT, signals.constant(0.0)),
+        (BEANS_AT - CUP_AT, signals.constant(DOSING_CUP)),
+        (1e9, signals.constant(DOSING_CUP + BEANS)),
+    )
+    _, dosing_watcher = simulate(dosing, 15, auto_tare=False, press_at=TARE_AT)
+
+    pour_start = CUP_AT + POUR_AFTER
+    # first time the poured weight is above the start threshold
+    first_drop = next(
+        t / 1000 for t in range(int(pour_start * 1000), SECONDS * 1000)
+        if pour(t / 1000 - CUP_AT) > firmware.shot.start_threshold
+    )
+    print("auto-tare")
+    print("{:>8}  {}".format("time s", "state"))
+    for t, state in watcher.changes:
+        print("{:>8.2f}  {}".format(t, NAMES[state]))
+    print("true events: cup at {:.1f} s, pour {:.1f}-{:.1f} s ({:.2f} s above {} g), drips until {:.1f} s, "
+          "cup taken away at {:.1f} s, next cup at {:.1f} s".format(
+              CUP_AT, pour_start, pour_start + POUR, first_drop, firmware.shot.start_threshold,
+              pour_start + POUR + DRIPS, REMOVED_AT, NEXT_CUP_AT))
+    print("auto-tares at {}".format(", ".join("{:.2f} s".format(t) for t in watcher.tares)))
+    started = next(t for t, state in watcher.changes if NAMES[state] == "brewing")
+    print("timer started    {:+.2f} s after the first drop".format(started - first_drop))
+    handle = firmware.scales._shot_handle
+    notifications = firmware.ble.notifications
+    sent = [struct.unpack("<BI", data) for _, value_handle, data in notifications if value_handle == handle]
+    timer_ms = max(ms for state, ms in sent)
+    poured = pour_start + POUR - first_drop
+    print("time shown       {:.2f} s for {:.2f} s from the first drop to the end of the pour ({:+.2f} s)".format(
+        timer_ms / 1000, poured, timer_ms / 1000 - poured))
+    print("notifications    {}".format(", ".join("{} {:.1f}s".format(NAMES[state], ms / 1000) for state, ms in sent)))
+    print("button tare with the cup at {:.1f} s, no auto-tare".format(TARE_AT))
+    print("  {}".format(timeline(manual_watcher)))
+    assert manual.shot.state == 0, "the finished shot must be cleared once the cup is taken away"
+    print("button tare with a {:.0f} g dosing cup at {:.1f} s, {:.0f} g of beans at {:.1f} s".format(
+        DOSING_CUP, TARE_AT, BEANS, BEANS_AT))
+    print("  {}".format(timeline(dosing_watcher)))
+    assert not dosing_watcher.changes, "the beans must not start a shot"
+
+
+if __name__ == "__main__":
+    main()
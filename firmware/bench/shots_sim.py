@@ -0,0 +1,131 @@
+"""Record an espresso shot with no central connected, then download it over BLE with a dropped connection.
+
+Run from the `firmware` folder with `python3 bench/shots_sim.py`. The uasyncio firmware runs on the simulated
+hardware while a shot is poured. A central connects once the shot is over, lists the sessions and reads the new one
+through the shots characteristic. It gets disconnected halfway and resumes from the last offset it received.
+
+Reports the size of the session, the error of the recorded weight against the poured weight, and the transfer: the
+notifications it took and how long the firmware spent sending them, next to replaying the shot with the 10 Hz weight
+notifications. The simulated radio takes every notification straight away, so the transfer time is set by the pace of
+`ShotTransfer.pump` and the rate cap of the central (`Subscriber`), shared with its other notifications.
+"""
+import os
+import struct
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "sim"))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+import clock  # noqa: E402
+import machine  # noqa: E402
+import recorder  # noqa: E402
+import signals  # noqa: E402
+from run_main import setup  # noqa: E402
+
+CONNECT_AT = 50.0
+RECONNECT_AFTER = 0.5
+SECONDS = 60
+POLL_US = 5000
+
+
+class Central:
+    """Lists the sessions, then reads the last one, dropping the connection once half of it arrived."""
+
+    def __init__(self, firmware):
+        self.firmware = firmware
+        self.ble = firmware.ble
+        self.handle = firmware.scales._shots_handle
+        self.data = bytearray()
+        self.size = None
+        self.session = None
+        self.seen = 0
+        self.notifications = 0
+        self.dropped = False
+        self.started = None
+        self.paused = 0.0
+        self.finished = None
+
+    def connect(self):
+        self.ble.connect(1)
+        self.ble.write(1, self.handle, bytes([recorder.CMD_LIST]))
+        machine.at(clock.now_us() + POLL_US, self.request)
+
+    def request(self):
+        if self.session is None:
+            listing = self.ble.values[self.handle]
+            if listing == bytes([recorder.CMD_LIST]):
+                # the firmware has not answered yet
+                machine.at(clock.now_us() + POLL_US, self.request)
+                return
+            self.session, self.size = struct.unpack_from("<II", listing, 1 + 8 * (listing[0] - 1))
+            self.started = clock.now_us()
+        self.seen = len(self.ble.notifications)
+        self.ble.write(1, self.handle, struct.pack("<BII", recorder.CMD_READ, self.session, len(self.data)))
+        machine.at(clock.now_us() + POLL_US, self.poll)
+
+    def poll(self):
+        for conn_handle, value_handle, payload in self.ble.notifications[self.seen :]:
+            if value_handle != self.handle:
+                continue
+            self.notifications += 1
+            offset = struct.unpack_from("<I", payload)[0]
+            assert offset == len(self.data), "gap in the transfer"
+            if len(payload) == 4:
+                self.finished = clock.now_us()
+                return
+            self.data += payload[4:]
+        self.seen = len(self.ble.notifications)
+        if not self.dropped and len(self.data) >= self.size // 2:
+            self.dropped = True
+            self.ble.disconnect(1)
+            self.paused = clock.now_us()
+            machine.at(clock.now_us() + int(RECONNECT_AFTER * 1000000), self.reconnect)
+            return
+        machine.at(clock.now_us() + POLL_US, self.poll)
+
+    def reconnect(self):
+        self.ble.connect(1)
+        self.paused = clock.now_us() - self.paused
+        self.request()
+
+
+def main():
+    import main_async
+
+    clock.use_virtual()
+    profile = signals.espresso()
+    setup(profile)
+    firmware = main_async.Scales()
+    central = Central(firmware)
+    machine.at(int(CONNECT_AT * 1000000), central.connect)
+    machine.stop_at(SECONDS * 1000000)
+    try:
+        main_async.asyncio.run(firmware.run())
+    except machine.SimulationEnd:
+        pass
+    clock.use_real()
+
+    with open(os.path.join(recorder.DIRECTORY, "{}.bin".format(central.session)), "rb") as f:
+        stored = f.read()
+    start, flags, samples, _ = recorder.decode(bytes(central.data))
+    duration = samples[-1][0] / 1000
+    first = samples[0][0]
+    # the session starts at the first sample above the threshold, find when that was in the profile
+    start_s = next(t / 1000 for t in range(0, SECONDS * 1000) if profile(t / 1000) > firmware.recorder.threshold)
+    errors = [abs(weight - profile(start_s + (t - first) / 1000)) for t, weight, _ in samples]
+    print("session {} ({})".format(central.session, "finished" if flags & recorder.FINISHED else "unfinished"))
+    print("  duration        {:.1f} s, {} samples".format(duration, len(samples)))
+    print("  size            {} bytes, {:.1f} bytes/sample".format(len(stored), len(stored) / len(samples)))
+    print("  final weight    {:.2f} g (poured {:.2f} g)".format(samples[-1][1], profile(SECONDS)))
+    print("  weight error    mean {:.3f} g, worst {:.3f} g".format(sum(errors) / len(errors), max(errors)))
+    transfer_ms = (central.finished - central.started - central.paused) / 1000
+    print("transfer, dropped halfway and resumed after {:.1f} s".format(RECONNECT_AFTER))
+    print("  download        {} notifications in {:.0f} ms".format(central.notifications, transfer_ms))
+    print("  10 Hz replay    {} notifications in {:.0f} ms".format(int(duration * 10), duration * 1000))
+    print("  received        {}".format("identical" if bytes(central.data) == stored else "differs"))
+    assert bytes(central.data) == stored
+
+
+if __name__ == "__main__":
+    main()
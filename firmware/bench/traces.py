@@ -0,0 +1,50 @@
+"""Synthetic load cell traces shared by the host benchmarks.
+
+Each trace is a list of `(t_ms, true_weight, measured_weight)` tuples at the HX711 sample rate, built from the
+simulator's weight profiles. The noise level matches what the scale shows at rest (about 0.1 g peak to peak after
+scaling).
+"""
+import random
+
+import signals
+
+RATE_HZ = 80
+NOISE = 0.04
+
+
+def _samples(profile, duration_s, seed, rate_hz=RATE_HZ, noise=NOISE):
+    rng = random.Random(seed)
+    trace = []
+    for i in range(int(duration_s * rate_hz)):
+        t = i * 1000 // rate_hz
+        weight = profile(t / 1000)
+        trace.append((t, weight, weight + rng.gauss(0.0, noise)))
+    return trace
+
+
+def cup_drop(seed=1):
+    """Idle for 2 s, then a 250 g cup is put down, then idle for 4 s."""
+    return _samples(signals.step(2.0, 250.0), 6.0, seed)
+
+
+def small_step(seed=5):
+    """A 1.5 g weight (a few beans, a spoon) is added after 2 s."""
+    return _samples(signals.step(2.0, 1.5), 6.0, seed)
+
+
+def beans(seed=2):
+    """18 g of beans poured in over half a second."""
+    return _samples(signals.ramp(1.0, 0.5, 18.0), 5.0, seed)
+
+
+def espresso(seed=3):
+    """5 s idle, 25 s pour up to 36 g at an increasing flow, 5 s of drips, 5 s idle."""
+    return _samples(signals.espresso(), 40.0, seed)
+
+
+def idle(seed=4):
+    """Nothing on the scale for 60 s."""
+    return _samples(signals.constant(0.0), 60.0, seed)
+
+
+TRACES = {"cup_drop": cup_drop, "small_step": small_step, "beans": beans, "espresso": espresso, "idle": idle}
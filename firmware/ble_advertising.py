@@ -18,6 +18,7 @@ _ADV_TYPE_UUID16_MORE = const(0x2)
 _ADV_TYPE_UUID32_MORE = const(0x4)
 _ADV_TYPE_UUID128_MORE = const(0x6)
 _ADV_TYPE_APPEARANCE = const(0x19)
+_ADV_TYPE_CONN_INTERVAL_RANGE = const(0x12)
 
 
 # Generate a payload to be passed to gap_advertise(adv_data=...).
@@ -33,7 +34,7 @@ def advertising_payload(limited_disc=False, br_edr=False, name=None, services=No
     )
 
     if name:
-        _append(_ADV_TYPE_NAME, name)
+        _append(_ADV_TYPE_NAME, name.encode())
 
     if services:
         for uuid in services:
@@ -51,6 +52,12 @@ def advertising_payload(limited_disc=False, br_edr=False, name=None, services=No
     return payload
 
 
+# Generate a scan response telling centrals which connection interval we prefer (in ms, 1.25ms steps).
+def connection_interval_payload(min_interval_ms, max_interval_ms):
+    value = struct.pack("<HH", int(min_interval_ms / 1.25), int(max_interval_ms / 1.25))
+    return struct.pack("BB", len(value) + 1, _ADV_TYPE_CONN_INTERVAL_RANGE) + value
+
+
 def decode_field(payload, adv_type):
     i = 0
     result = []
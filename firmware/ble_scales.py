@@ -4,25 +4,78 @@
 # any connected central every 10 seconds.
 
 import struct
+import time
 
 import bluetooth
-from ble_advertising import advertising_payload
+from ble_advertising import advertising_payload, connection_interval_payload
+from calibration import RECORD_SIZE
+from codec import FrameEncoder
 from micropython import const
 
 _IRQ_CENTRAL_CONNECT = const(1 << 0)
 _IRQ_CENTRAL_DISCONNECT = const(1 << 1)
+_IRQ_GATTS_WRITE = const(3)
+_IRQ_MTU_EXCHANGED = const(21)
+_IRQ_CONNECTION_UPDATE = const(27)
 
 # org.bluetooth.service.automation_io
 _AUTOMATION_IO_UUID = bluetooth.UUID(0x1815)
 # org.bluetooth.characteristic.analog_output
 _CHAR_WEIGHT_ANALOG = (bluetooth.UUID(0x2A59), bluetooth.FLAG_READ | bluetooth.FLAG_NOTIFY)
 
-_AUTOMATION_IO_SERVICE = (_AUTOMATION_IO_UUID, (_CHAR_WEIGHT_ANALOG,))
+
+def _custom_uuid(short):
+    # characteristics without a standard assigned number share this base
+    return bluetooth.UUID('c0ffee{:02x}-5ca1-4e5b-9d2c-3b1e5f7a9d10'.format(short))
+
+
+# sint16, hundredths of a gram per second
+_CHAR_FLOW_RATE = (_custom_uuid(0x01), bluetooth.FLAG_READ | bluetooth.FLAG_NOTIFY)
+
+# batches of timestamped samples, see BLEScales.add_sample
+_CHAR_WEIGHT_STREAM = (_custom_uuid(0x02), bluetooth.FLAG_NOTIFY)
+
+# the same samples as frames of the compact encoding of `codec`, weight and flow rate in hundredths
+_CHAR_WEIGHT_STREAM_PACKED = (_custom_uuid(0x06), bluetooth.FLAG_NOTIFY)
+
+# profiling statistics, see profiling.pack; write a command byte to act on them
+_CHAR_STATS = (_custom_uuid(0x03), bluetooth.FLAG_READ | bluetooth.FLAG_WRITE)
+
+# calibration record, see calibration.Calibration.pack; write a record or a command to change it
+_CHAR_CALIBRATION = (_custom_uuid(0x04), bluetooth.FLAG_READ | bluetooth.FLAG_WRITE)
+
+# recorded shots, see recorder.ShotTransfer; write a command, read the list of sessions or get a session notified
+_CHAR_SHOTS = (_custom_uuid(0x05), bluetooth.FLAG_READ | bluetooth.FLAG_WRITE | bluetooth.FLAG_NOTIFY)
+
+# shot timer, see shot_timer; state (uint8) then the time on the timer in ms (uint32), little endian
+_CHAR_SHOT_TIMER = (_custom_uuid(0x07), bluetooth.FLAG_READ | bluetooth.FLAG_NOTIFY)
+
+_AUTOMATION_IO_SERVICE = (
+    _AUTOMATION_IO_UUID,
+    (
+        _CHAR_WEIGHT_ANALOG,
+        _CHAR_FLOW_RATE,
+        _CHAR_WEIGHT_STREAM,
+        _CHAR_STATS,
+        _CHAR_CALIBRATION,
+        _CHAR_SHOTS,
+        _CHAR_WEIGHT_STREAM_PACKED,
+        _CHAR_SHOT_TIMER,
+    ),
+)
+
+# ATT_MTU before any exchange, 3 bytes of each notification are the ATT header
+_DEFAULT_MTU = const(23)
+_MAX_MTU = const(247)
+_STREAM_FLAG_FLOW = const(0x01)
+# flags, timestamp of the first sample in ms
+_STREAM_HEADER = '!BI'
+_STREAM_HEADER_SIZE = const(5)
 
 # org.bluetooth.service.battery_service
 _BATTERY_UUID = bluetooth.UUID(0x180F)
 # org.bluetooth.characteristic.battery_level
-_CHAR_BATTERY_LEVEL = (bluetooth.UUID(0x2A19), bluetooth.FLAG_READ)
+_CHAR_BATTERY_LEVEL = (bluetooth.UUID(0x2A19), bluetooth.FLAG_READ | bluetooth.FLAG_NOTIFY)
 
 _BATTERY_SERVICE = (_BATTERY_UUID, (_CHAR_BATTERY_LEVEL,))
 
@@ -30,43 +83,531 @@ _BATTERY_SERVICE = (_BATTERY_UUID, (_CHAR_BATTERY_LEVEL,))
 _ADV_APPEARANCE_GENERIC_WEIGHT_SCALE = const(3200)
 
 
+def _clamp_int16(value):
+    value = int(value)
+    if value > 32767:
+        return 32767
+    if value < -32768:
+        return -32768
+    return value
+
+
+class NotifyPolicy:
+    """Decides when a new weight is worth a notification.
+
+    A value that moved by at least `deadband` since the last notification is sent as soon as `min_interval_ms` has
+    elapsed, so the rate goes up to 1000 / `min_interval_ms` Hz while the weight is changing. A steady value is only
+    repeated every `max_interval_ms` as a heartbeat.
+    """
+
+    def __init__(self, deadband=0.05, min_interval_ms=50, max_interval_ms=1000):
+        self.deadband = deadband
+        self.min_interval_ms = min_interval_ms
+        self.max_interval_ms = max_interval_ms
+        self._last_value = None
+        self._last_time = 0
+
+    def should_notify(self, value, now):
+        if self._last_value is not None:
+            elapsed = time.ticks_diff(now, self._last_time)
+            if elapsed < self.max_interval_ms and (
+                elapsed < self.min_interval_ms or abs(value - self._last_value) < self.deadband
+            ):
+                return False
+        self._last_value = value
+        self._last_time = now
+        return True
+
+    def reset(self):
+        """Make the next value go out straight away."""
+        self._last_value = None
+
+
+class Subscriber:
+    """A connected central: its link parameters, the characteristics it subscribed to and its own send queue.
+
+    Notifications go out straight away while the rate cap allows, a token bucket refilled at `rate` per second up to
+    `burst`. The rest waits in a queue of `queue_size` entries which drops the oldest one when full, so a central that
+    can't keep up loses its stale notifications instead of holding the radio buffers shared with the others. The rate
+    is lowered to `per_event` notifications per connection event once the central reports its connection interval.
+    """
+
+    def __init__(self, conn_handle, max_rate=100, burst=8, queue_size=4, per_event=2):
+        self.conn_handle = conn_handle
+        self.mtu = _DEFAULT_MTU
+        self.interval_ms = 0
+        self.max_rate = max_rate
+        self.per_event = per_event
+        self.rate = max_rate
+        self.burst = burst
+        self.queue_size = queue_size
+        # value handles written to through their CCCD, None until the central writes one: some stacks handle the
+        # CCCD themselves and never report it, every characteristic is then sent
+        self.subscriptions = None
+        # [value_handle, payload, latest value only]
+        self.queue = []
+        self.sent = 0
+        self.dropped = 0
+        self._tokens = burst
+        self._refill = time.ticks_ms()
+
+    def set_interval(self, interval_ms):
+        self.interval_ms = interval_ms
+        rate = self.per_event * 1000 / interval_ms
+        self.rate = rate if rate < self.max_rate else self.max_rate
+
+    def subscribe(self, value_handle, enabled):
+        if self.subscriptions is None:
+            self.subscriptions = set()
+        if enabled:
+            self.subscriptions.add(value_handle)
+        else:
+            self.subscriptions.discard(value_handle)
+            self.queue = [entry for entry in self.queue if entry[0] != value_handle]
+
+    def wants(self, value_handle):
+        return self.subscriptions is None or value_handle in self.subscriptions
+
+    def send(self, ble, value_handle, data, latest=False, now=None):
+        """Notify `data` now if the queue is empty and the rate allows, otherwise queue a copy.
+
+        Args:
+            latest (bool, optional): only the latest value matters (e.g. the weight), it replaces a queued one.
+                Defaults to False.
+        """
+        if self.try_send(ble, value_handle, data, now):
+            return
+        if latest:
+            for entry in self.queue:
+                if entry[0] == value_handle:
+                    entry[1] = bytes(data)
+                    return
+        if len(self.queue) >= self.queue_size:
+            self.queue.pop(0)
+            self.dropped += 1
+        self.queue.append([value_handle, bytes(data), latest])
+
+    def try_send(self, ble, value_handle, data, now=None):
+        """Notify `data` now if the queue is empty and the rate allows, without queueing it. Returns whether it was
+        sent."""
+        if self.queue:
+            self.pump(ble, now)
+        return not self.queue and self._take(now) and self._notify(ble, value_handle, data)
+
+    def pump(self, ble, now=None):
+        """Send the queued notifications the rate allows."""
+        queue = self.queue
+        while queue and self._take(now):
+            if not self._notify(ble, queue[0][0], queue[0][1]):
+                return
+            queue.pop(0)
+
+    def _take(self, now):
+        if now is None:
+            now = time.ticks_ms()
+        tokens = self._tokens + time.ticks_diff(now, self._refill) * self.rate / 1000
+        self._refill = now
+        if tokens > self.burst:
+            tokens = self.burst
+        if tokens < 1:
+            self._tokens = tokens
+            return False
+        self._tokens = tokens - 1
+        return True
+
+    def _notify(self, ble, value_handle, data):
+        try:
+            ble.gatts_notify(self.conn_handle, value_handle, data)
+        except OSError:
+            # the stack is out of buffers, the token is given back and the notification waits in the queue
+            self._tokens += 1
+            return False
+        self.sent += 1
+        return True
+
+
 class BLEScales:
-    def __init__(self, ble, name="mpy-coffee"):
+    def __init__(
+        self,
+        ble,
+        name="mpy-coffee",
+        mtu=185,
+        interval_ms=(7.5, 15),
+        policy=None,
+        max_connections=2,
+        max_rate=100,
+        queue_size=4,
+    ):
+        """Register the services and start advertising.
+
+        Args:
+            ble (bluetooth.BLE): the BLE interface
+            name (str, optional): advertised name. Defaults to "mpy-coffee".
+            mtu (int, optional): ATT MTU to negotiate with each central. Defaults to 185.
+            interval_ms (Optional[tuple], optional): preferred connection interval range in ms, advertised in the
+                scan response. MicroPython can't request a connection parameter update from the peripheral side, so
+                the central decides, and the negotiated interval is recorded. Defaults to (7.5, 15).
+            policy (Optional[NotifyPolicy], optional): when `update_weight` notifies. Defaults to a 0.05g deadband
+                with a 1s heartbeat.
+            max_connections (int, optional): advertising goes on until this many centrals are connected. Defaults
+                to 2.
+            max_rate (int, optional): most notifications per second to a central, see `Subscriber`. Defaults to 100.
+            queue_size (int, optional): notifications held for a central that is behind. Defaults to 4.
+        """
         self._ble = ble
         self._ble.active(True)
         print('bt activated')
+        self._mtu = min(mtu, _MAX_MTU)
+        self._ble.config(mtu=self._mtu)
         self._ble.irq(self._irq)
-        ((self._weight_handle,), (self._battery_handle,),) = self._ble.gatts_register_services(
-            (_AUTOMATION_IO_SERVICE, _BATTERY_SERVICE)
+        (
+            (
+                self._weight_handle,
+                self._flow_handle,
+                self._stream_handle,
+                self._stats_handle,
+                self._calibration_handle,
+                self._shots_handle,
+                self._packed_handle,
+                self._shot_handle,
+            ),
+            (self._battery_handle,),
+        ) = self._ble.gatts_register_services((_AUTOMATION_IO_SERVICE, _BATTERY_SERVICE))
+        # writes from a central are cut to 20 bytes without a buffer for a whole record
+        self._ble.gatts_set_buffer(self._calibration_handle, RECORD_SIZE)
+        # the CCCD of each of these follows its value handle
+        self._notify_handles = (
+            self._weight_handle,
+            self._flow_handle,
+            self._stream_handle,
+            self._shots_handle,
+            self._packed_handle,
+            self._shot_handle,
+            self._battery_handle,
         )
-        self._connections = set()
+        self.max_connections = max_connections
+        self.max_rate = max_rate
+        self.queue_size = queue_size
+        # conn_handle: Subscriber
+        self._subscribers = {}
+        # replaced, never changed in place, so a loop over it survives a central connecting or leaving in the IRQ
+        self._subscriber_list = []
+        self._stream = bytearray(_MAX_MTU - 3)
+        self._stream_view = memoryview(self._stream)
+        self._stream_size = _DEFAULT_MTU - 3
+        # set by the IRQ handler when a central connects, leaves or changes its MTU, see `_update_stream_size`
+        self._resize = False
+        self._stream_len = 0
+        self._stream_flow = False
+        self._stream_start = 0
+        self._stream_last = 0
+        self._packed = FrameEncoder(_MAX_MTU - 3)
+        self._packed.size = self._stream_size
+        self._packed_start = 0
+        self.stream_max_latency_ms = 100
+        self.policy = policy or NotifyPolicy()
+        # value_handle: callback(conn_handle, data) for characteristics written by a central
+        self._write_callbacks = {}
         self._payload = advertising_payload(
             name=name, services=[_AUTOMATION_IO_UUID, _BATTERY_UUID], appearance=_ADV_APPEARANCE_GENERIC_WEIGHT_SCALE,
         )
+        self._resp_payload = None
+        if interval_ms:
+            self._resp_payload = connection_interval_payload(*interval_ms)
+        self._adv_interval_us = 500000
         self._advertise()
 
     def _irq(self, event, data):
         # Track connections so we can send notifications.
         if event == _IRQ_CENTRAL_CONNECT:
             conn_handle, _, _, = data
-            self._connections.add(conn_handle)
+            self._subscribers[conn_handle] = Subscriber(conn_handle, self.max_rate, queue_size=self.queue_size)
+            self._subscriber_list = list(self._subscribers.values())
+            # give the new central a value right away
+            self.policy.reset()
+            self._resize = True
+            try:
+                self._ble.gattc_exchange_mtu(conn_handle)
+            except (AttributeError, OSError):
+                # older firmware or the central refused, stay on the default MTU
+                pass
+            # advertising stops on a connection, keep it going for the next central
+            if len(self._subscribers) < self.max_connections:
+                self._advertise()
         elif event == _IRQ_CENTRAL_DISCONNECT:
             conn_handle, _, _, = data
-            self._connections.remove(conn_handle)
+            if self._subscribers.pop(conn_handle, None) is not None:
+                self._subscriber_list = list(self._subscribers.values())
+                self._resize = True
             # Start advertising again to allow a new connection.
             self._advertise()
+        elif event == _IRQ_GATTS_WRITE:
+            conn_handle, value_handle, = data
+            callback = self._write_callbacks.get(value_handle)
+            if callback is not None:
+                callback(conn_handle, self._ble.gatts_read(value_handle))
+            elif value_handle - 1 in self._notify_handles:
+                subscriber = self._subscribers.get(conn_handle)
+                cccd = self._ble.gatts_read(value_handle)
+                if subscriber is not None and cccd:
+                    # bit 0: notifications enabled
+                    subscriber.subscribe(value_handle - 1, cccd[0] & 1)
+        elif event == _IRQ_MTU_EXCHANGED:
+            conn_handle, mtu = data
+            subscriber = self._subscribers.get(conn_handle)
+            if subscriber is not None:
+                subscriber.mtu = mtu
+                self._resize = True
+        elif event == _IRQ_CONNECTION_UPDATE:
+            conn_handle, conn_interval, _, _, status = data
+            subscriber = self._subscribers.get(conn_handle)
+            if status == 0 and subscriber is not None:
+                # the interval is in units of 1.25ms
+                subscriber.set_interval(conn_interval * 1.25)
+
+    def _fitting_payload(self):
+        # the same payload goes to every central so it must fit the smallest MTU
+        subscribers = self._subscriber_list
+        if not subscribers:
+            return _DEFAULT_MTU - 3
+        mtu = _MAX_MTU
+        for subscriber in subscribers:
+            if subscriber.mtu < mtu:
+                mtu = subscriber.mtu
+        return mtu - 3
+
+    def _update_stream_size(self):
+        # on the main thread: the IRQ handler only sets `_resize`, it could land in the middle of a sample being
+        # added to the stream buffers
+        self._resize = False
+        size = self._fitting_payload()
+        # flush before shrinking so the queued samples still fit
+        if size < self._stream_len:
+            self._flush_raw()
+        if size < len(self._packed) + 2:
+            self._flush_packed()
+        self._stream_size = size
+        self._packed.size = size
+
+    @property
+    def connected(self):
+        return bool(self._subscriber_list)
+
+    def connection_params(self, conn_handle):
+        """Return the negotiated (ATT MTU, connection interval in ms) of a connection, the interval is 0 until the
+        central reports it."""
+        subscriber = self._subscribers[conn_handle]
+        return subscriber.mtu, subscriber.interval_ms
+
+    def subscriber(self, conn_handle):
+        """The `Subscriber` of a connected central, None if it isn't connected."""
+        return self._subscribers.get(conn_handle)
+
+    def _notify(self, value_handle, data, latest=False):
+        now = time.ticks_ms()
+        for subscriber in self._subscriber_list:
+            if subscriber.wants(value_handle):
+                subscriber.send(self._ble, value_handle, data, latest, now)
+
+    def pump(self):
+        """Send what the rate cap held back, call it often (e.g. every loop)."""
+        if self._resize:
+            self._update_stream_size()
+        now = time.ticks_ms()
+        for subscriber in self._subscriber_list:
+            if subscriber.queue:
+                subscriber.pump(self._ble, now)
+
+    @property
+    def payload_size(self):
+        """Largest notification payload that fits every connected central."""
+        return self._fitting_payload()
 
     def set_weight(self, weight, notify=False):
         # Data is sint16 in hundreth of a gram, signed.
         # Write the local value, ready for a central to read.
-        self._ble.gatts_write(self._weight_handle, struct.pack("!h", int(weight * 100)))
+        data = struct.pack("!h", int(weight * 100))
+        self._ble.gatts_write(self._weight_handle, data)
+        if notify:
+            self._notify(self._weight_handle, data, latest=True)
+
+    def update_weight(self, weight, flow_rate=None, now=None):
+        """Notify the weight (rounded to 0.05g) and flow rate if the notification policy says so.
+
+        Args:
+            weight (float): filtered weight in grams
+            flow_rate (Optional[float], optional): flow rate in grams per second. Defaults to None.
+            now (Optional[int], optional): `time.ticks_ms()` timestamp. Defaults to the current time.
+
+        Returns:
+            bool: whether notifications were sent
+        """
+        if not self._subscriber_list:
+            return False
+        if now is None:
+            now = time.ticks_ms()
+        rounded_weight = round(weight / 0.05) * 0.05
+        if not self.policy.should_notify(rounded_weight, now):
+            return False
+        self.set_weight(rounded_weight, notify=True)
+        if flow_rate is not None:
+            self.set_flow_rate(flow_rate, notify=True)
+        return True
+
+    def set_flow_rate(self, flow_rate, notify=False):
+        # Data is sint16 in hundreth of a gram per second, signed.
+        data = struct.pack("!h", _clamp_int16(flow_rate * 100))
+        self._ble.gatts_write(self._flow_handle, data)
         if notify:
-            for conn_handle in self._connections:
-                # Notify connected centrals to issue a read.
-                self._ble.gatts_notify(conn_handle, self._weight_handle)
+            self._notify(self._flow_handle, data, latest=True)
+
+    def add_sample(self, t_ms, weight, flow_rate=None):
+        """Queue a sample for the weight stream characteristic.
+
+        Samples are packed into a single notification until it is as large as the ATT payload allows, or until the
+        first sample is older than `stream_max_latency_ms`.
+
+        A notification is a header made of one flags byte (bit 0: flow rate included) and the uint32 `ticks_ms` of
+        its first sample, followed by the samples: a uint8 delay in ms since the previous sample (0 for the first),
+        the weight as sint16 in hundredths of a gram and, if flagged, the flow rate as sint16 in hundredths of a gram
+        per second. All values are big-endian.
+
+        The packed stream characteristic gets the same samples as `codec` frames, a full notification holds two to
+        three times as many samples. Its own latency is capped the same way.
+
+        Args:
+            t_ms (int): `time.ticks_ms()` timestamp of the sample
+            weight (float): weight in grams
+            flow_rate (Optional[float], optional): flow rate in grams per second. Defaults to None.
+        """
+        if self._resize:
+            self._update_stream_size()
+        if not self._subscriber_list:
+            self._stream_len = 0
+            self._packed.reset()
+            return
+        with_flow = flow_rate is not None
+        self._add_packed(t_ms, weight, flow_rate)
+        sample_size = 5 if with_flow else 3
+        delay = time.ticks_diff(t_ms, self._stream_last)
+        if self._stream_len and (
+            with_flow != self._stream_flow
+            or not 0 <= delay <= 255
+            or self._stream_len + sample_size > self._stream_size
+        ):
+            self._flush_raw()
+        if not self._stream_len:
+            self._stream_flow = with_flow
+            self._stream_start = t_ms
+            struct.pack_into(_STREAM_HEADER, self._stream, 0, _STREAM_FLAG_FLOW if with_flow else 0, t_ms)
+            self._stream_len = _STREAM_HEADER_SIZE
+            delay = 0
+        offset = self._stream_len
+        if with_flow:
+            struct.pack_into(
+                '!Bhh', self._stream, offset, delay, _clamp_int16(weight * 100), _clamp_int16(flow_rate * 100)
+            )
+        else:
+            struct.pack_into('!Bh', self._stream, offset, delay, _clamp_int16(weight * 100))
+        self._stream_len = offset + sample_size
+        self._stream_last = t_ms
+        if (
+            self._stream_len + sample_size > self._stream_size
+            or time.ticks_diff(t_ms, self._stream_start) >= self.stream_max_latency_ms
+        ):
+            self._flush_raw()
+
+    def _add_packed(self, t_ms, weight, flow_rate):
+        packed = self._packed
+        channels = 1 if flow_rate is None else 2
+        if packed.count and packed.channels != channels:
+            self._flush_packed()
+        if not packed.count:
+            packed.reset(channels)
+            self._packed_start = t_ms
+        weight = int(round(weight * 100))
+        flow_rate = 0 if flow_rate is None else int(round(flow_rate * 100))
+        if not packed.add(t_ms, weight, flow_rate):
+            self._flush_packed()
+            self._packed_start = t_ms
+            packed.add(t_ms, weight, flow_rate)
+        if time.ticks_diff(t_ms, self._packed_start) >= self.stream_max_latency_ms:
+            self._flush_packed()
+
+    def _flush_packed(self):
+        if not self._packed.count:
+            return
+        self._notify(self._packed_handle, self._packed.finish())
 
-    def set_battery_level(self, battery):
-        self._ble.gatts_write(self._battery_handle, struct.pack("!B", int(battery)))
+    def flush_stream(self):
+        """Send the queued samples of both streams now."""
+        self._flush_raw()
+        self._flush_packed()
+
+    def _flush_raw(self):
+        if not self._stream_len:
+            return
+        data = self._stream_view[: self._stream_len]
+        self._stream_len = 0
+        self._notify(self._stream_handle, data)
+
+    def on_write(self, value_handle, callback):
+        """Call `callback(conn_handle, data)` when a central writes the characteristic.
+
+        The callback runs in the BLE IRQ handler, it should only store the value or queue work for the main loop.
+        """
+        self._write_callbacks[value_handle] = callback
+
+    def on_stats_command(self, callback):
+        self.on_write(self._stats_handle, callback)
+
+    def set_stats(self, data):
+        self._ble.gatts_write(self._stats_handle, data)
+
+    def on_calibration(self, callback):
+        self.on_write(self._calibration_handle, callback)
+
+    def set_calibration(self, data):
+        self._ble.gatts_write(self._calibration_handle, data)
+
+    def on_shots_command(self, callback):
+        self.on_write(self._shots_handle, callback)
+
+    def set_shots(self, data):
+        self._ble.gatts_write(self._shots_handle, data)
+
+    def notify_shots(self, conn_handle, data):
+        """Notify `data` on the shots characteristic to a single central, returns False if it couldn't be sent.
+
+        It goes through the rate cap of the central, after what it has queued, and is never queued itself: the
+        caller sends the same chunk again later.
+        """
+        subscriber = self._subscribers.get(conn_handle)
+        if subscriber is None:
+            return False
+        return subscriber.try_send(self._ble, self._shots_handle, data)
+
+    def set_shot(self, state, timer_ms, notify=False):
+        data = struct.pack("<BI", state, timer_ms)
+        self._ble.gatts_write(self._shot_handle, data)
+        if notify:
+            self._notify(self._shot_handle, data)
+
+    def set_battery_level(self, battery, notify=False):
+        data = struct.pack("!B", int(battery))
+        self._ble.gatts_write(self._battery_handle, data)
+        if notify:
+            self._notify(self._battery_handle, data, latest=True)
+
+    def set_advertising_interval(self, interval_us):
+        """Change the advertising interval, `None` stops advertising. It applies straight away while there is room
+        for another central, otherwise the next time advertising restarts."""
+        self._adv_interval_us = interval_us
+        if len(self._subscribers) < self.max_connections:
+            self._advertise()
 
-    def _advertise(self, interval_us=500000):
-        self._ble.gap_advertise(interval_us, adv_data=self._payload)
+    def _advertise(self):
+        if self._adv_interval_us is None:
+            self._ble.gap_advertise(None)
+        else:
+            self._ble.gap_advertise(self._adv_interval_us, adv_data=self._payload, resp_data=self._resp_payload)
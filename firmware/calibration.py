@@ -0,0 +1,234 @@
+"""Load cell calibration, kept in flash so the scales boot without measuring it again.
+
+The file holds a single little-endian record: magic, version, flags, HX711 gain, scale (raw counts per unit), offset
+(raw reading of the empty scales), measurement uncertainty and process noise of the weight filter, the number of
+points of the calibration table followed by each point (raw reading above the offset as int32, units as float32),
+then the CRC32 of all the previous bytes. A missing or corrupted file gives the defaults, which tare at boot as
+before.
+
+To calibrate from the REPL, stop `main.py` and run `calibration.calibrate(hx, 100)` with a known 100g mass at hand,
+or `calibration.calibrate_points(hx, (100, 500, 1000, 2000))` for a table correcting the non-linearity of the cell.
+"""
+import os
+import struct
+from binascii import crc32
+
+from micropython import const
+
+PATH = 'calibration.bin'
+
+# flags
+TARE_ON_BOOT = const(0x01)
+ZERO_TRACKING = const(0x02)
+AUTO_TARE = const(0x04)
+
+# commands written to the calibration characteristic, a whole record replaces the calibration
+CMD_ZERO = const(0)  # the scales are empty
+CMD_SPAN = const(1)  # followed by the mass on the scales as a float32
+
+_MAGIC = b'CAL'
+_VERSION = const(2)
+# version 1 records stop before the table
+_FORMAT_V1 = '<3sBBBfiff'
+_SIZE_V1 = const(26)
+_FORMAT = '<3sBBBfiffB'
+_HEADER_SIZE = const(23)
+_POINT_FORMAT = '<if'
+_POINT_SIZE = const(8)
+MAX_POINTS = const(8)
+# largest record, with a full table
+RECORD_SIZE = const(91)
+
+
+class Calibration:
+    def __init__(
+        self,
+        scale=1544.667,
+        offset=0,
+        gain=64,
+        measurement_uncertainty=0.03,
+        q=0.1,
+        flags=TARE_ON_BOOT | ZERO_TRACKING,
+        points=(),
+    ):
+        """Hold the calibration of the load cell and the weight filter parameters.
+
+        Args:
+            scale (float, optional): raw counts per unit. Defaults to 1544.667.
+            offset (int, optional): raw reading of the empty scales. Defaults to 0.
+            gain (int, optional): HX711 gain, 128, 64 or 32. Defaults to 64.
+            measurement_uncertainty (float, optional): see `filtering.KalmanFilter`. Defaults to 0.03.
+            q (float, optional): see `filtering.KalmanFilter`. Defaults to 0.1.
+            flags (int, optional): `TARE_ON_BOOT` to ignore the offset and tare at boot, `ZERO_TRACKING` to follow
+                the drift of the zero (see `hx711.ZeroTracker`), `AUTO_TARE` to tare when a cup is put down (see
+                `shot_timer.ShotTimer`, anything heavier than a cup is tared, so not while calibrating). Defaults to
+                `TARE_ON_BOOT` and `ZERO_TRACKING`, the offset of the defaults is meaningless.
+            points (tuple, optional): calibration table, see `HX711.set_table`. Defaults to none, the single scale
+                is used.
+        """
+        self.scale = scale
+        self.offset = offset
+        self.gain = gain
+        self.measurement_uncertainty = measurement_uncertainty
+        self.q = q
+        self.flags = flags
+        self.points = tuple(points)
+
+    def pack(self):
+        crc_offset = _HEADER_SIZE + _POINT_SIZE * len(self.points)
+        data = bytearray(crc_offset + 4)
+        struct.pack_into(
+            _FORMAT,
+            data,
+            0,
+            _MAGIC,
+            _VERSION,
+            self.flags,
+            self.gain,
+            self.scale,
+            int(self.offset),
+            self.measurement_uncertainty,
+            self.q,
+            len(self.points),
+        )
+        for i, (raw, units) in enumerate(self.points):
+            struct.pack_into(_POINT_FORMAT, data, _HEADER_SIZE + _POINT_SIZE * i, int(raw), units)
+        struct.pack_into('<I', data, crc_offset, crc32(memoryview(data)[:crc_offset]) & 0xFFFFFFFF)
+        return bytes(data)
+
+    @classmethod
+    def unpack(cls, data):
+        """Read a record made by `pack`, raise ValueError if it is not valid."""
+        if len(data) == _SIZE_V1 and data[3] == 1:
+            crc_offset = _SIZE_V1 - 4
+            count = 0
+        elif len(data) >= _HEADER_SIZE + 4:
+            count = data[_HEADER_SIZE - 1]
+            crc_offset = _HEADER_SIZE + _POINT_SIZE * count
+            if len(data) != crc_offset + 4 or count > MAX_POINTS or count == 1:
+                raise ValueError('bad size')
+        else:
+            raise ValueError('bad size')
+        if struct.unpack_from('<I', data, crc_offset)[0] != crc32(memoryview(data)[:crc_offset]) & 0xFFFFFFFF:
+            raise ValueError('bad checksum')
+        magic, version, flags, gain, scale, offset, measurement_uncertainty, q = struct.unpack_from(_FORMAT_V1, data)
+        if magic != _MAGIC or version not in (1, _VERSION):
+            raise ValueError('unknown format')
+        if gain not in (128, 64, 32) or not scale:
+            raise ValueError('bad value')
+        points = [struct.unpack_from(_POINT_FORMAT, data, _HEADER_SIZE + _POINT_SIZE * i) for i in range(count)]
+        return cls(scale, offset, gain, measurement_uncertainty, q, flags, points)
+
+    def apply(self, hx):
+        """Set the scale, the table and, unless `TARE_ON_BOOT` is set, the offset of the HX711."""
+        hx.set_scale(self.scale)
+        if not self.flags & TARE_ON_BOOT:
+            hx.set_offset(self.offset)
+        hx.set_table(self.points or None, zero=self.offset)
+
+    def save(self, path=None):
+        path = path or PATH
+        # write a copy first so a reset halfway leaves the previous record in place
+        with open(path + '.tmp', 'wb') as f:
+            f.write(self.pack())
+        try:
+            # LittleFS replaces the previous record in one step
+            os.rename(path + '.tmp', path)
+        except OSError:
+            # FAT can't rename over a file, `load` falls back to the copy if a reset comes in between
+            os.remove(path)
+            os.rename(path + '.tmp', path)
+
+
+def load(path=None):
+    """Read the calibration file, or the copy left by an interrupted `save`, or return the defaults if there is
+    none or it is corrupted."""
+    path = path or PATH
+    for name in (path, path + '.tmp'):
+        try:
+            with open(name, 'rb') as f:
+                return Calibration.unpack(f.read())
+        except (OSError, ValueError):
+            pass
+    return Calibration()
+
+
+def zero(hx, cal, times=16):
+    """Record the reading of the empty scales as the offset, the scales also get tared."""
+    hx.tare(times)
+    cal.offset = int(hx.OFFSET)
+    cal.flags &= ~TARE_ON_BOOT
+    if cal.points:
+        hx.set_table(cal.points, zero=cal.offset)
+
+
+def span(hx, cal, mass, times=16):
+    """Compute the scale from a known `mass` on the scales, relative to the current offset.
+
+    The single scale replaces the calibration table, if there was one.
+    """
+    hx.flush()
+    delta = hx.read_trimmed(times) - hx.OFFSET
+    if not mass or abs(delta) < 100:
+        raise ValueError('no load')
+    cal.scale = delta / mass
+    cal.points = ()
+    hx.set_scale(cal.scale)
+    hx.set_table(None)
+
+
+def run_command(cal, data, hx):
+    """Act on a write to the calibration characteristic and save the result.
+
+    Returns:
+        Calibration: `cal` updated in place, or the calibration written as a whole record
+    """
+    if data[:3] == _MAGIC:
+        cal = Calibration.unpack(data)
+        cal.apply(hx)
+    elif len(data) == 1 and data[0] == CMD_ZERO:
+        zero(hx, cal)
+    elif len(data) == 5 and data[0] == CMD_SPAN:
+        span(hx, cal, struct.unpack_from('<f', data, 1)[0])
+    else:
+        raise ValueError('unknown command')
+    cal.save()
+    return cal
+
+
+def calibrate(hx, mass, cal=None, times=16):
+    """Guided calibration from the REPL with a known `mass`, in the unit the scales should display.
+
+    The gain and filter parameters are kept from `cal`, or from the saved calibration.
+    """
+    cal = cal or load()
+    input('Empty the scales, then press enter')
+    zero(hx, cal, times)
+    input('Put {} on the scales, then press enter'.format(mass))
+    span(hx, cal, mass, times)
+    cal.save()
+    print('Scale {:.3f}, offset {}, saved to {}'.format(cal.scale, cal.offset, PATH))
+    return cal
+
+
+def calibrate_points(hx, masses, cal=None, times=16):
+    """Guided calibration from the REPL with several known `masses`, for a table through each of them.
+
+    The scale is taken from the largest mass, the table corrects the readings in between.
+    """
+    if not 1 <= len(masses) < MAX_POINTS:
+        raise ValueError('1 to {} masses'.format(MAX_POINTS - 1))
+    cal = cal or load()
+    input('Empty the scales, then press enter')
+    zero(hx, cal, times)
+    points = [(0, 0.0)]
+    for mass in sorted(masses):
+        input('Put {} on the scales, then press enter'.format(mass))
+        hx.flush()
+        points.append((int(hx.read_trimmed(times) - hx.OFFSET), float(mass)))
+    cal.scale = points[-1][0] / points[-1][1]
+    cal.points = tuple(points)
+    cal.apply(hx)
+    cal.save()
+    print('Table {}, saved to {}'.format(points, PATH))
+    return cal
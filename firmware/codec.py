@@ -0,0 +1,205 @@
+"""Compact encoding of timestamped samples, shared by the packed weight stream and the recorded shots.
+
+Samples are grouped in frames. Each frame stands on its own, so a lost notification or a damaged flash block only
+loses its own samples:
+
+- flags (uint8, the number of channels in bits 0-1) and number of samples (uint8)
+- keyframe: timestamp of the first sample in ms (uint32), then the value of each channel as a zig-zag varint
+- every following sample: a zig-zag varint of the change of the first channel shifted left by 2, with the change of
+  the delay since the previous sample in the low bits (0: same delay, 1: one ms less, 2: one ms more, 3: the delay
+  follows as a varint), then a zig-zag varint of the change of each other channel
+- the low 16 bits of the CRC32 of all the previous bytes of the frame
+
+Varints are little-endian base 128 (7 bits per byte, the high bit set on every byte but the last), fixed-size fields
+are little-endian. Values are integers, e.g. hundredths of a gram: a slow brew changes by a few hundredths per sample,
+which takes a single byte with a steady sample rate.
+
+This module is also imported on CPython by `host.shots`.
+"""
+import struct
+import time
+from binascii import crc32
+
+try:
+    from micropython import const
+except ImportError:
+
+    def const(value):
+        return value
+
+
+_FRAME_HEADER_SIZE = const(6)
+_CRC_SIZE = const(2)
+# largest sample: varints of 3 bytes for each channel and for the delay, with room to spare
+_MAX_SAMPLE_SIZE = const(16)
+MAX_SAMPLES = const(255)
+
+
+def zigzag(value):
+    """Map signed integers to unsigned ones so small values of either sign stay small: 0, -1, 1, -2 -> 0, 1, 2, 3."""
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
+
+
+def unzigzag(value):
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def put_varint(buf, offset, value):
+    """Write the unsigned `value` at `offset` in `buf`, returns the offset after it."""
+    while value > 0x7F:
+        buf[offset] = (value & 0x7F) | 0x80
+        value >>= 7
+        offset += 1
+    buf[offset] = value
+    return offset + 1
+
+
+def get_varint(buf, offset):
+    """Read an unsigned varint at `offset` in `buf`, returns it and the offset after it."""
+    value = 0
+    shift = 0
+    while True:
+        byte = buf[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+
+class FrameEncoder:
+    """Builds a frame in a preallocated buffer, one sample at a time."""
+
+    def __init__(self, size, channels=2):
+        """Initialize the encoder.
+
+        Args:
+            size (int): largest frame, including the checksum. `size` can be lowered later, not raised above this.
+            channels (int, optional): 1 or 2 values per sample. Defaults to 2.
+        """
+        self.size = size
+        # room for a sample past the end, which is dropped if it doesn't fit
+        self._buf = bytearray(size + _MAX_SAMPLE_SIZE)
+        self._view = memoryview(self._buf)
+        self.channels = channels
+        self.count = 0
+        self._len = 0
+        self._t = 0
+        self._dt = 0
+        self._a = 0
+        self._b = 0
+
+    def __len__(self):
+        """Size of the frame so far, without the checksum."""
+        return self._len
+
+    def reset(self, channels=None):
+        """Drop the samples of the frame, optionally changing the number of channels of the next one."""
+        if channels is not None:
+            self.channels = channels
+        self.count = 0
+        self._len = 0
+
+    def add(self, t_ms, a, b=0):
+        """Append a sample to the frame.
+
+        Args:
+            t_ms (int): `time.ticks_ms()` timestamp, or any time in ms going forward
+            a (int): value of the first channel
+            b (int, optional): value of the second channel, ignored with a single channel. Defaults to 0.
+
+        Returns:
+            bool: False if the sample doesn't fit, the frame must then be finished and the sample added to the next
+        """
+        buf = self._buf
+        if not self.count:
+            buf[0] = self.channels
+            struct.pack_into('<I', buf, 2, t_ms & 0xFFFFFFFF)
+            offset = put_varint(buf, _FRAME_HEADER_SIZE, zigzag(a))
+            if self.channels > 1:
+                offset = put_varint(buf, offset, zigzag(b))
+            dt = 0
+        else:
+            dt = time.ticks_diff(t_ms, self._t)
+            if self.count >= MAX_SAMPLES or dt < 0:
+                return False
+            change = dt - self._dt
+            if -1 <= change <= 1:
+                offset = put_varint(buf, self._len, zigzag(a - self._a) << 2 | zigzag(change))
+            else:
+                offset = put_varint(buf, self._len, zigzag(a - self._a) << 2 | 3)
+                offset = put_varint(buf, offset, dt)
+            if self.channels > 1:
+                offset = put_varint(buf, offset, zigzag(b - self._b))
+        if offset + _CRC_SIZE > self.size:
+            return False
+        self.count += 1
+        self._len = offset
+        self._t = t_ms
+        self._dt = dt
+        self._a = a
+        self._b = b
+        return True
+
+    def finish(self):
+        """Complete the frame with the number of samples and the checksum, then empty the encoder.
+
+        Returns:
+            memoryview: the frame, valid until the next `add`
+        """
+        length = self._len
+        self._buf[1] = self.count
+        struct.pack_into('<H', self._buf, length, crc32(self._view[:length]) & 0xFFFF)
+        self.reset()
+        return self._view[: length + _CRC_SIZE]
+
+
+def decode_frame(data, offset=0):
+    """Read the frame starting at `offset` in `data`, anything after it (e.g. padding) is ignored.
+
+    Returns:
+        tuple: list of `(t_ms, a)` or `(t_ms, a, b)` samples, and the offset after the frame
+
+    Raises:
+        ValueError: the frame is truncated or its checksum doesn't match
+    """
+    start = offset
+    if len(data) < offset + _FRAME_HEADER_SIZE + _CRC_SIZE:
+        raise ValueError('truncated frame')
+    channels = data[offset] & 0x03
+    count = data[offset + 1]
+    if not count:
+        raise ValueError('empty frame')
+    t = struct.unpack_from('<I', data, offset + 2)[0]
+    offset += _FRAME_HEADER_SIZE
+    try:
+        value, offset = get_varint(data, offset)
+        a = unzigzag(value)
+        b = 0
+        if channels > 1:
+            value, offset = get_varint(data, offset)
+            b = unzigzag(value)
+        dt = 0
+        samples = [(t, a, b) if channels > 1 else (t, a)]
+        for i in range(count - 1):
+            value, offset = get_varint(data, offset)
+            a += unzigzag(value >> 2)
+            code = value & 0x03
+            if code == 3:
+                dt, offset = get_varint(data, offset)
+            else:
+                dt += unzigzag(code)
+            t += dt
+            if channels > 1:
+                value, offset = get_varint(data, offset)
+                b += unzigzag(value)
+                samples.append((t, a, b))
+            else:
+                samples.append((t, a))
+    except IndexError:
+        raise ValueError('truncated frame')
+    if len(data) < offset + _CRC_SIZE:
+        raise ValueError('truncated frame')
+    if struct.unpack_from('<H', data, offset)[0] != crc32(memoryview(data)[start:offset]) & 0xFFFF:
+        raise ValueError('bad checksum')
+    return samples, offset + _CRC_SIZE
@@ -0,0 +1,268 @@
+"""Incremental weight renderer for the 128x32 OLED, and the scheduler pacing its frames."""
+from art import (
+    BATTERY,
+    BREWING_MARK,
+    CUP_MARK,
+    DOT,
+    DRIPPING_MARK,
+    FINISHED_MARK,
+    GRAM,
+    SMALL_DOT,
+    show_digit,
+    show_sprite,
+)
+from micropython import const
+from shot_timer import BREWING
+from time import ticks_diff, ticks_ms, ticks_us
+
+# layouts of `WeightDisplay`
+LAYOUT_WEIGHT = const(0)
+LAYOUT_TIMER = const(1)  # the shot timer in seconds on the left
+LAYOUT_FLOW = const(2)  # the flow rate in g/s on the left
+LAYOUT_AUTO = const(3)  # the timer once a shot started, the weight alone otherwise
+
+_DIGIT_CELL = const(22)  # horizontal space taken by a digit
+_DIGIT_WIDTH = const(19)  # widest digit glyph, the rest of the cell is spacing
+_DOT_CELL = const(7)
+_DOT_WIDTH = const(4)
+_RIGHT_EDGE = const(118)
+# half-size digits, bottom-aligned with the weight
+_SMALL_CELL = const(12)
+_SMALL_WIDTH = const(10)
+_SMALL_DOT_CELL = const(4)
+_SMALL_DOT_WIDTH = const(2)
+_SIDE_EDGE = const(36)  # the value on the left is right-aligned here, the weight starts after it
+# indexed by the shot_timer state, nothing while idle
+_SHOT_MARKS = (None, CUP_MARK, BREWING_MARK, DRIPPING_MARK, FINISHED_MARK)
+
+
+def format_weight(weight, short=False):
+    """Weight to 0.05, or to 0.1 when `short` for the layouts sharing the screen."""
+    if short:
+        string = '{:.1f}'.format(weight)
+        if len(string) > 5:
+            string = '{:.0f}'.format(weight)
+        return '0.0' if string == '-0.0' else string
+    rounded_weight = round(weight / 0.05) * 0.05
+    string = '{:.2f}'.format(rounded_weight)
+    if len(string) > 6:
+        string = '{:.1f}'.format(rounded_weight)
+    if string == '-0.00':
+        string = '0.00'
+    return string
+
+
+def format_side(value, layout_mode):
+    """Timer in whole seconds, or flow rate to 0.1 g/s below 10, at most 3 characters."""
+    if layout_mode == LAYOUT_TIMER:
+        return str(min(int(value), 999))
+    if value < 9.95:
+        return '{:.1f}'.format(max(value, 0.0))
+    return '{:.0f}'.format(min(value, 99.0))
+
+
+def layout(string, right=_RIGHT_EDGE, left=0, small=False):
+    """Return the (x position, glyph width, char) of every cell for a string right-aligned on `right`, the cells
+    that would start before `left` are left out."""
+    if small:
+        digit_cell, digit_width, dot_cell, dot_width = _SMALL_CELL, _SMALL_WIDTH, _SMALL_DOT_CELL, _SMALL_DOT_WIDTH
+    else:
+        digit_cell, digit_width, dot_cell, dot_width = _DIGIT_CELL, _DIGIT_WIDTH, _DOT_CELL, _DOT_WIDTH
+    cells = []
+    position = right
+    for char in reversed(string):
+        if char == '-':
+            char = 'MINUS'
+        if char == '.':
+            position -= dot_cell
+            if position < left:
+                break
+            cells.append((position, dot_width, char))
+        else:
+            position -= digit_cell
+            if position < left:
+                break
+            cells.append((position, digit_width, char))
+    return cells
+
+
+def _clear_cells(screen, old_cells, cells):
+    for i, cell in enumerate(old_cells):
+        if i >= len(cells) or cells[i] != cell:
+            screen.fill_rect(cell[0], 0, cell[1], screen.height, 0)
+            screen.mark_dirty(cell[0], 0, cell[1], screen.height)
+
+
+class WeightDisplay:
+    """Draws the weight screen, only touching the cells that changed since the previous frame.
+
+    The screen is expected to be an `SSD1306` so that only the dirty window gets flushed by `show`.
+    """
+
+    def __init__(self, screen, layout_mode=LAYOUT_AUTO):
+        """Args:
+            screen (SSD1306): the OLED
+            layout_mode (int, optional): one of the `LAYOUT_*`, can be changed between frames. Defaults to
+                `LAYOUT_AUTO`.
+        """
+        self.screen = screen
+        self.layout = layout_mode
+        self._cells = None
+        self._side = []
+        self._battery_low = False
+        self._shot = 0
+
+    def draw(self, weight, battery_low=False, shot=0, timer=0.0, flow_rate=0.0):
+        screen = self.screen
+        if self._cells is None:
+            screen.fill(0)
+            show_sprite(screen, GRAM, 117, 16)
+            self._cells = []
+            self._side = []
+            self._battery_low = False
+            self._shot = 0
+        layout_mode = self.layout
+        if layout_mode == LAYOUT_AUTO:
+            layout_mode = LAYOUT_TIMER if shot >= BREWING else LAYOUT_WEIGHT
+        side = []
+        if layout_mode == LAYOUT_WEIGHT:
+            cells = layout(format_weight(weight))
+        else:
+            string = format_weight(weight, short=True)
+            cells = layout(string, left=_SIDE_EDGE)
+            if len(cells) < len(string):
+                # too heavy to share the screen
+                cells = layout(format_weight(weight))
+            else:
+                value = timer if layout_mode == LAYOUT_TIMER else flow_rate
+                side = layout(format_side(value, layout_mode), _SIDE_EDGE, small=True)
+        old_cells = self._cells
+        old_side = self._side
+        # every cell to clear first, a cell of the other layout may cover a new one
+        _clear_cells(screen, old_cells, cells)
+        _clear_cells(screen, old_side, side)
+        for i, cell in enumerate(side):
+            if i < len(old_side) and old_side[i] == cell:
+                continue
+            position, width, char = cell
+            if char == '.':
+                show_sprite(screen, SMALL_DOT, position, 29)
+            else:
+                show_digit(screen, char, position, 16, half=True)
+            screen.mark_dirty(position, 0, width, screen.height)
+        self._side = side
+        for i, cell in enumerate(cells):
+            if i < len(old_cells) and old_cells[i] == cell:
+                continue
+            position, width, char = cell
+            if char == '.':
+                show_sprite(screen, DOT, position, 27)
+            else:
+                show_digit(screen, char, position, 1)
+            screen.mark_dirty(position, 0, width, screen.height)
+        self._cells = cells
+        if battery_low != self._battery_low:
+            self._battery_low = battery_low
+            if battery_low:
+                show_sprite(screen, BATTERY, 117, 1)
+            else:
+                screen.fill_rect(117, 1, 11, 7, 0)
+            screen.mark_dirty(117, 1, 11, 7)
+        if shot != self._shot:
+            self._shot = shot
+            screen.fill_rect(117, 8, 11, 8, 0)
+            mark = _SHOT_MARKS[shot]
+            if mark is not None:
+                show_sprite(screen, mark, 121 if mark is BREWING_MARK else 120, 9)
+            screen.mark_dirty(117, 8, 11, 8)
+        screen.show()
+
+    def invalidate(self):
+        """Force a full redraw on the next frame, e.g. after something else used the screen."""
+        self._cells = None
+
+
+class FrameScheduler:
+    """Paces the frames of the display: a target rate, a time budget per frame, and a lower rate while the sampler
+    needs the CPU.
+
+    The rate halves (down to `min_fps`) when the sampler falls behind or a frame goes over its budget, and doubles
+    back towards `fps` once neither happened for `recover_ms`. `frames`, `dropped` (frames of the target rate that
+    were not drawn while there was something new to show), `over_budget`, `frame_us_max` and `frame_us_total` can be
+    read to see how the display keeps up.
+    """
+
+    def __init__(self, fps=30, budget_ms=15, min_fps=4, recover_ms=2000):
+        """Args:
+            fps (int, optional): target frame rate. Defaults to 30.
+            budget_ms (int, optional): longest a frame should take to draw and flush. Defaults to 15, half of a frame
+                at the default rate.
+            min_fps (int, optional): lowest rate when backing off. Defaults to 4.
+            recover_ms (int, optional): how long the sampler must keep up before the rate goes back up. Defaults to
+                2000.
+        """
+        self.target_ms = 1000 // fps
+        self.max_period_ms = 1000 // min_fps
+        self.budget_us = budget_ms * 1000
+        self.recover_ms = recover_ms
+        self.period_ms = self.target_ms
+        self._busy = False
+        self._last = ticks_ms()
+        self._changed = self._last
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.frames = 0
+        self.dropped = 0
+        self.over_budget = 0
+        self.frame_us_max = 0
+        self.frame_us_total = 0
+
+    def busy(self):
+        """The sampler found itself behind, e.g. half a batch waiting in the ring buffer. Can be called from the
+        sampling thread, the rate is lowered at the next frame."""
+        self._busy = True
+
+    def start(self, updates=1):
+        """Call before drawing a frame, returns its `ticks_us` start time for `finish`.
+
+        Args:
+            updates (int, optional): values published since the previous frame, the frames missed are counted only
+                while there was something new to show. Defaults to 1.
+        """
+        now = ticks_ms()
+        if self.frames and updates > 1:
+            missed = ticks_diff(now, self._last) // self.target_ms - 1
+            if missed > updates - 1:
+                missed = updates - 1
+            if missed > 0:
+                self.dropped += missed
+        self._last = now
+        if self._busy:
+            self._busy = False
+            self._slow_down(now)
+        elif self.period_ms > self.target_ms and ticks_diff(now, self._changed) >= self.recover_ms:
+            self.period_ms = max(self.period_ms // 2, self.target_ms)
+            self._changed = now
+        return ticks_us()
+
+    def finish(self, start):
+        """Call once the frame is on the screen."""
+        elapsed = ticks_diff(ticks_us(), start)
+        self.frames += 1
+        self.frame_us_total += elapsed
+        if elapsed > self.frame_us_max:
+            self.frame_us_max = elapsed
+        if elapsed > self.budget_us:
+            self.over_budget += 1
+            self._slow_down(ticks_ms())
+
+    def rest_ms(self):
+        """Time to sleep before the next frame: until its slot, or a whole period if the slot has passed (the frame
+        ran late, or nothing was drawn)."""
+        rest = self.period_ms - ticks_diff(ticks_ms(), self._last)
+        return rest if rest > 0 else self.period_ms
+
+    def _slow_down(self, now):
+        self.period_ms = min(self.period_ms * 2, self.max_period_ms)
+        self._changed = now
@@ -1,4 +1,5 @@
 """Simple Kalman filter implementation for single-channel feed"""
+from array import array
 from math import fabs
 
 
@@ -36,3 +37,279 @@ class KalmanFilter:
         self.last_estimate = current_estimate
 
         return current_estimate
+
+    def update_many(self, samples, count=None) -> float:
+        """Filter a buffer of measurements in place.
+
+        Gives the same results as calling `update_estimate` on each value in turn, but keeps the filter state in
+        locals for the whole buffer.
+
+        Args:
+            samples (array): buffer of measurements, e.g. `array('f')` or a memoryview, overwritten with the estimates
+            count (Optional[int], optional): only filter the first `count` values. Defaults to the whole buffer.
+
+        Returns:
+            float: the last estimate, equal to `last_estimate`
+        """
+        if count is None:
+            count = len(samples)
+        err_meas = self.err_meas
+        err_est = self.err_est
+        q = self.q
+        last_estimate = self.last_estimate
+        for i in range(count):
+            kalman_gain = err_est / (err_est + err_meas)
+            current_estimate = last_estimate + kalman_gain * (samples[i] - last_estimate)
+            err_est = (1.0 - kalman_gain) * err_est + fabs(last_estimate - current_estimate) * q
+            last_estimate = current_estimate
+            samples[i] = current_estimate
+        self.err_est = err_est
+        self.last_estimate = last_estimate
+
+        return last_estimate
+
+
+class AdaptiveKalmanFilter(KalmanFilter):
+    """Kalman filter that follows step changes quickly and smooths heavily once the reading is stable."""
+
+    def __init__(
+        self,
+        measurement_uncertainty,
+        q=0.01,
+        estimation_uncertainty=None,
+        window=6,
+        step_threshold=0.5,
+        stable_threshold=0.15,
+        fast_uncertainty=None,
+    ) -> None:
+        """Initialize the filter.
+
+        The residuals (measurement minus previous estimate) of the last `window` samples are kept. When their mean
+        is larger than `step_threshold`, the readings are consistently away from the estimate: the estimation
+        uncertainty is raised to `fast_uncertainty` so the gain gets close to 1. Once every residual in the window is
+        below `stable_threshold`, the estimation uncertainty is brought back down and `stable` is set.
+
+        Args:
+            measurement_uncertainty (float): how much do we expect our measurement to vary
+            q (float, optional): covariance of the process noise, usually between 0.001 and 1. Defaults to 0.01.
+            estimation_uncertainty (Optional[float], optional): will be overwritten when we apply the filter. Defaults
+                to None.
+            window (int, optional): number of residuals used for the detection. Defaults to 6.
+            step_threshold (float, optional): mean residual above which a step is detected. Defaults to 0.5.
+            stable_threshold (float, optional): residual below which the reading is stable. Defaults to 0.15.
+            fast_uncertainty (Optional[float], optional): estimation uncertainty while following a step. Defaults to
+                100 times the measurement uncertainty.
+        """
+        super().__init__(measurement_uncertainty, q=q, estimation_uncertainty=estimation_uncertainty)
+        self.settled_uncertainty = self.err_est
+        self.fast_uncertainty = fast_uncertainty or 100 * measurement_uncertainty
+        self.step_threshold = step_threshold
+        self.stable_threshold = stable_threshold
+        self._residuals = array('f', [0.0] * window)
+        self._index = 0
+        self._residual_sum = 0.0
+        self.fast = False
+        self.stable = False
+
+    def update_estimate(self, measurement) -> float:
+        """Perform filtering on the current measurement, drop-in for `KalmanFilter.update_estimate`.
+
+        Args:
+            measurement (float): latest measurement
+
+        Returns:
+            float: filtered measurement taking into account previous values and trend
+        """
+        residuals = self._residuals
+        residual = measurement - self.last_estimate
+        index = self._index
+        self._residual_sum += residual - residuals[index]
+        residuals[index] = residual
+        self._index = (index + 1) % len(residuals)
+
+        if fabs(self._residual_sum) > self.step_threshold * len(residuals):
+            self.fast = True
+            if self.err_est < self.fast_uncertainty:
+                self.err_est = self.fast_uncertainty
+
+        current_estimate = super().update_estimate(measurement)
+
+        stable = True
+        for r in residuals:
+            if fabs(r) > self.stable_threshold:
+                stable = False
+                break
+        if stable and (self.fast or not self.stable):
+            # back to heavy smoothing
+            self.fast = False
+            if self.err_est > self.settled_uncertainty:
+                self.err_est = self.settled_uncertainty
+        self.stable = stable
+        # the running sum drifts with rounding, it is cheap to rebuild it once per window
+        if self._index == 0:
+            self._residual_sum = sum(residuals)
+
+        return current_estimate
+
+    def update_many(self, samples, count=None, stable_flags=None) -> float:
+        """Filter a buffer of measurements in place, see `KalmanFilter.update_many`.
+
+        Gives the same results as calling `update_estimate` on each value in turn, with the filter and detection
+        state in locals for the whole buffer. `stable` is only left as it is after the last value, a caller judging
+        each sample gets the flag of each one in `stable_flags` (e.g. a `bytearray` as long as the buffer).
+        """
+        if count is None:
+            count = len(samples)
+        err_meas = self.err_meas
+        err_est = self.err_est
+        q = self.q
+        last_estimate = self.last_estimate
+        residuals = self._residuals
+        window = len(residuals)
+        index = self._index
+        residual_sum = self._residual_sum
+        step = self.step_threshold * window
+        stable_threshold = self.stable_threshold
+        fast_uncertainty = self.fast_uncertainty
+        settled_uncertainty = self.settled_uncertainty
+        fast = self.fast
+        stable = self.stable
+        for i in range(count):
+            measurement = samples[i]
+            residual = measurement - last_estimate
+            residual_sum += residual - residuals[index]
+            residuals[index] = residual
+            index = (index + 1) % window
+            if fabs(residual_sum) > step:
+                fast = True
+                if err_est < fast_uncertainty:
+                    err_est = fast_uncertainty
+            kalman_gain = err_est / (err_est + err_meas)
+            current_estimate = last_estimate + kalman_gain * (measurement - last_estimate)
+            err_est = (1.0 - kalman_gain) * err_est + fabs(last_estimate - current_estimate) * q
+            last_estimate = current_estimate
+            samples[i] = current_estimate
+            settled = True
+            for r in residuals:
+                if fabs(r) > stable_threshold:
+                    settled = False
+                    break
+            if settled and (fast or not stable):
+                fast = False
+                if err_est > settled_uncertainty:
+                    err_est = settled_uncertainty
+            stable = settled
+            if stable_flags is not None:
+                stable_flags[i] = stable
+            if index == 0:
+                residual_sum = sum(residuals)
+        self.err_est = err_est
+        self.last_estimate = last_estimate
+        self._index = index
+        self._residual_sum = residual_sum
+        self.fast = fast
+        self.stable = stable
+
+        return last_estimate
+
+    def reset(self, value=0.0) -> None:
+        """Restart from a known value, e.g. after taring."""
+        self.last_estimate = value
+        self.err_est = self.settled_uncertainty
+        residuals = self._residuals
+        for i in range(len(residuals)):
+            residuals[i] = 0.0
+        self._residual_sum = 0.0
+        self.fast = False
+        # the readings from before don't say anything about the new ones
+        self.stable = False
+
+
+class FlowRateEstimator:
+    """Two-state (weight and flow rate) Kalman filter with a constant flow model, which catches up with a sudden
+    change of flow."""
+
+    def __init__(
+        self, measurement_uncertainty=0.03, q=4.0, window=4, step_threshold=0.3, fast_uncertainty=1000.0
+    ) -> None:
+        """Initialize the filter.
+
+        A constant flow model is slow to follow beans poured in or a cup put down: the rate starts and stops within a
+        few samples. Like in `AdaptiveKalmanFilter`, the residuals (measurement minus predicted weight) of the last
+        `window` samples are kept. When their mean is larger than `step_threshold`, the flow changed: the variance
+        of the rate is raised to `fast_uncertainty` so the next measurements set it again.
+
+        Args:
+            measurement_uncertainty (float, optional): variance of the weight measurements. Defaults to 0.03.
+            q (float, optional): variance of the change of flow rate per second, higher reacts faster to a change of
+                flow but is noisier. Defaults to 4.0.
+            window (int, optional): number of residuals used for the detection. Defaults to 4.
+            step_threshold (float, optional): mean residual in grams above which the flow changed. Defaults to 0.3.
+            fast_uncertainty (float, optional): variance of the rate after a change of flow. Defaults to 1000.0.
+        """
+        self.err_meas = measurement_uncertainty
+        self.q = q
+        self.step_threshold = step_threshold
+        self.fast_uncertainty = fast_uncertainty
+        self._residuals = array('f', [0.0] * window)
+        self._index = 0
+        self._residual_sum = 0.0
+        self.weight = 0.0
+        self.rate = 0.0
+        # covariance matrix [[p00, p01], [p01, p11]]
+        self.p00 = measurement_uncertainty
+        self.p01 = 0.0
+        self.p11 = 1.0
+
+    def update(self, measurement, dt) -> float:
+        """Perform filtering on the current measurement.
+
+        Args:
+            measurement (float): latest weight measurement
+            dt (float): time since the previous measurement in seconds
+
+        Returns:
+            float: estimated flow rate in units per second
+        """
+        q = self.q
+        dt2 = dt * dt
+        # predict
+        weight = self.weight + self.rate * dt
+        residual = measurement - weight
+        residuals = self._residuals
+        index = self._index
+        self._residual_sum += residual - residuals[index]
+        residuals[index] = residual
+        self._index = (index + 1) % len(residuals)
+        if fabs(self._residual_sum) > self.step_threshold * len(residuals):
+            if self.p11 < self.fast_uncertainty:
+                self.p11 = self.fast_uncertainty
+        if self._index == 0:
+            # the running sum drifts with rounding, it is cheap to rebuild it once per window
+            self._residual_sum = sum(residuals)
+        p00 = self.p00 + dt * (2.0 * self.p01 + dt * self.p11) + 0.25 * q * dt2 * dt2
+        p01 = self.p01 + dt * self.p11 + 0.5 * q * dt2 * dt
+        p11 = self.p11 + q * dt2
+        # correct
+        s = p00 + self.err_meas
+        k0 = p00 / s
+        k1 = p01 / s
+        self.weight = weight + k0 * residual
+        self.rate += k1 * residual
+        self.p00 = (1.0 - k0) * p00
+        self.p01 = (1.0 - k0) * p01
+        self.p11 = p11 - k1 * p01
+
+        return self.rate
+
+    def reset(self, value=0.0) -> None:
+        """Restart from a known weight with no flow, e.g. after taring."""
+        self.weight = value
+        self.rate = 0.0
+        self.p00 = self.err_meas
+        self.p01 = 0.0
+        self.p11 = 1.0
+        residuals = self._residuals
+        for i in range(len(residuals)):
+            residuals[i] = 0.0
+        self._residual_sum = 0.0
@@ -0,0 +1 @@
+"""Host-side (CPython) tools to analyse data recorded from the scales, not meant to be uploaded to the ESP32."""
@@ -0,0 +1,113 @@
+"""Decode the shots recorded by the scales and the packed weight stream, for analysis on a computer.
+
+    python3 -m host.shots shots/3.bin > shot.csv
+
+Run from the `firmware` folder, the session files are downloaded through the shots characteristic (see
+`recorder.ShotTransfer`) or copied from the flash with `mpremote cp :shots/3.bin .`.
+"""
+import argparse
+import sys
+from math import fabs
+
+import numpy as np
+from codec import decode_frame
+from recorder import FINISHED, decode
+
+
+def read_session(path):
+    """Read a session file.
+
+    Returns:
+        dict: `t` (s since the start of the session), `weight` (g) and `flow` (g/s) as float64 arrays, `start`
+            (`time.time()` of the scales at the start), `finished` (False if the session was cut short by a reset)
+            and `damaged` (number of blocks that failed their checksum and were skipped)
+    """
+    with open(path, 'rb') as f:
+        start, flags, samples, damaged = decode(f.read())
+    values = np.array(samples, dtype=np.float64).reshape(-1, 3)
+    return {
+        't': values[:, 0] / 1000,
+        'weight': values[:, 1],
+        'flow': values[:, 2],
+        'start': start,
+        'finished': bool(flags & FINISHED),
+        'damaged': damaged,
+    }
+
+
+def refilter(samples, measurement_uncertainty, q=0.01, estimation_uncertainty=None, initial_estimate=0.0):
+    """Filter a whole recording again, matching `filtering.KalmanFilter.update_estimate` called on each sample, e.g.
+    to try other filter settings on the `weight` of `read_session`.
+
+    The gain update depends on the previous estimate through an absolute value, so the recursion can't be expressed
+    as a linear filter or a ufunc accumulation. The loop runs on plain floats, NumPy handles the I/O.
+
+    Args:
+        samples (array_like): measurements
+        measurement_uncertainty (float): see `KalmanFilter`
+        q (float, optional): see `KalmanFilter`. Defaults to 0.01.
+        estimation_uncertainty (Optional[float], optional): see `KalmanFilter`. Defaults to None.
+        initial_estimate (float, optional): estimate before the first sample. Defaults to 0.0.
+
+    Returns:
+        numpy.ndarray: the filtered samples, as float64
+    """
+    values = np.asarray(samples, dtype=np.float64).tolist()
+    err_meas = measurement_uncertainty
+    err_est = estimation_uncertainty or measurement_uncertainty
+    last_estimate = initial_estimate
+    out = [0.0] * len(values)
+    for i, measurement in enumerate(values):
+        kalman_gain = err_est / (err_est + err_meas)
+        current_estimate = last_estimate + kalman_gain * (measurement - last_estimate)
+        err_est = (1.0 - kalman_gain) * err_est + fabs(last_estimate - current_estimate) * q
+        last_estimate = current_estimate
+        out[i] = current_estimate
+    return np.array(out, dtype=np.float64)
+
+
+def decode_stream(payloads):
+    """Decode the notifications of the packed weight stream characteristic, in the order they were received.
+
+    Returns:
+        dict: `t_ms` (`ticks_ms` of the scales) as int64, `weight` (g) and `flow` (g/s, NaN for frames without flow
+            rate) as float64 arrays, and `damaged` (number of notifications that failed their checksum)
+    """
+    t_ms = []
+    weight = []
+    flow = []
+    damaged = 0
+    for payload in payloads:
+        try:
+            samples, _ = decode_frame(bytes(payload))
+        except ValueError:
+            damaged += 1
+            continue
+        for sample in samples:
+            t_ms.append(sample[0])
+            weight.append(sample[1] / 100)
+            flow.append(sample[2] / 100 if len(sample) > 2 else np.nan)
+    return {
+        't_ms': np.array(t_ms, dtype=np.int64),
+        'weight': np.array(weight, dtype=np.float64),
+        'flow': np.array(flow, dtype=np.float64),
+        'damaged': damaged,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help='session file')
+    args = parser.parse_args(argv)
+    session = read_session(args.path)
+    if not session['finished']:
+        print('session cut short, the samples stop at the last full block', file=sys.stderr)
+    if session['damaged']:
+        print('{} damaged blocks skipped'.format(session['damaged']), file=sys.stderr)
+    print('t,weight,flow')
+    for row in zip(session['t'], session['weight'], session['flow']):
+        print('{:.3f},{:.2f},{:.2f}'.format(*row))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,29 @@
+from array import array
+
 from machine import Pin, enable_irq, disable_irq, idle
+from micropython import const, schedule
+from time import ticks_diff, ticks_ms
+
+# readings the HX711 clamps to when the input is out of range
+_RAIL_HIGH = const(0x7FFFFF)
+_RAIL_LOW = const(-0x800000)
+_WINDOW = const(5)
+_MAX_TRIMMED = const(16)
+
+try:
+    from hx711_native import shift_in as _native_shift_in
+except (ImportError, SyntaxError):
+    # not an ESP32 or no viper emitter in this firmware build
+    _native_shift_in = None
 
 
 class HX711:
     def __init__(self, dout, pd_sck, gain=128):
 
+        # the native reader addresses the pins by number in the first GPIO bank
+        self._native = _native_shift_in is not None and dout < 32 and pd_sck < 32
+        self._dout = dout
+        self._sck = pd_sck
         self.pSCK = Pin(pd_sck, mode=Pin.OUT)
         self.pOUT = Pin(dout, mode=Pin.IN, pull=Pin.PULL_DOWN)
         self.pSCK.value(False)
@@ -11,10 +31,42 @@ class HX711:
         self.GAIN = 0
         self.OFFSET = 0
         self.SCALE = 1
+        # integer copies of OFFSET and SCALE for to_fixed
+        self._offset_i = 0
+        self.set_scale(1)
+        # calibration table, see set_table
+        self._lut_base = None
+        self._lut_slope = None
+        self._lut_start = 0
+        self._lut_shift = 0
+        self._zero = 0
+        self._zero_i = 0
+        self._tare_fixed = 0
 
         self.time_constant = 0.1
         self.filtered = 0
 
+        # outlier rejection, see _accept
+        self.max_jump = 1 << 12
+        self.rejected = 0
+        self._window = array('i', [0] * _WINDOW)
+        # separate from the one of read_trimmed, _median runs from the scheduled callback
+        self._window_sorted = array('i', [0] * _WINDOW)
+        self._sorted = array('i', [0] * _MAX_TRIMMED)
+        self._window_index = 0
+        self._window_count = 0
+        self._last = 0
+        self._rails = 0
+
+        # ring buffer filled from the DOUT interrupt, see start_sampling
+        self._ring = None
+        self._ring_time = None
+        self._head = 0
+        self._tail = 0
+        self._busy = False
+        self._sample_cb = self._sample
+        self.overruns = 0
+
         self.set_gain(gain)
 
     def set_gain(self, gain):
@@ -25,26 +77,88 @@ class HX711:
         elif gain == 32:
             self.GAIN = 2
 
+        # the gain applies from the next conversion, read_lowpass starts from the first reading it gets
         self.read()
-        self.filtered = self.read()
-        print('Gain & initial value set')
+        self._window_count = 0
+        self.filtered = None
+        print('Gain set')
 
     def is_ready(self):
         return self.pOUT() == 0
 
     def read(self):
-        # wait for the device being ready
-        while self.pOUT() == 1:
-            idle()
+        if self._ring is not None:
+            # interrupt-driven mode: hand out the buffered samples in order
+            while self._head == self._tail:
+                idle()
+            return self._pop()
+
+        while True:
+            # wait for the device being ready
+            while self.pOUT() == 1:
+                idle()
+            value = self._shift_in()
+            if self._accept(value):
+                return value
 
+    def _accept(self, value):
+        """Tell whether a reading is sound, before it reaches the ring buffer or the caller of `read`.
+
+        Rail values are dropped unless they keep coming, which is a real overload. A reading further than `max_jump`
+        counts from the last accepted one is only kept if it is also close to the median of the last readings:
+        a glitch is dropped, a real step of the weight goes through once it makes up most of the window, 2 samples
+        later. `max_jump = None` only drops the rail values.
+        """
+        if value >= _RAIL_HIGH or value <= _RAIL_LOW:
+            self._rails += 1
+            if self._rails <= _WINDOW:
+                self.rejected += 1
+                return False
+            return True
+        self._rails = 0
+        window = self._window
+        index = self._window_index
+        window[index] = value
+        self._window_index = (index + 1) % _WINDOW
+        if self._window_count < _WINDOW:
+            # not enough history to judge, e.g. right after power up
+            self._window_count += 1
+        elif self.max_jump is not None and abs(value - self._last) > self.max_jump:
+            if abs(value - self._median()) > self.max_jump:
+                self.rejected += 1
+                return False
+        self._last = value
+        return True
+
+    def _median(self):
+        # insertion sort of the window into the preallocated scratch array
+        ordered = self._window_sorted
+        window = self._window
+        for i in range(_WINDOW):
+            value = window[i]
+            j = i
+            while j > 0 and ordered[j - 1] > value:
+                ordered[j] = ordered[j - 1]
+                j -= 1
+            ordered[j] = value
+        return ordered[_WINDOW // 2]
+
+    def _shift_in(self):
         # shift in data, and gain & channel info
-        result = 0
-        for j in range(24 + self.GAIN):
+        if self._native:
             state = disable_irq()
-            self.pSCK(True)
-            self.pSCK(False)
+            result = _native_shift_in(self._sck, self._dout, 24 + self.GAIN)
             enable_irq(state)
-            result = (result << 1) | self.pOUT()
+        else:
+            result = 0
+            sck = self.pSCK
+            out = self.pOUT
+            for j in range(24 + self.GAIN):
+                state = disable_irq()
+                sck(True)
+                sck(False)
+                enable_irq(state)
+                result = (result << 1) | out()
 
         # shift back the extra bits
         result >>= self.GAIN
@@ -63,7 +177,32 @@ class HX711:
             sum += self.read()
         return sum / times
 
+    def read_trimmed(self, times=8, trim=None):
+        """Average `times` readings (at most 16) without the `trim` lowest and the `trim` highest ones.
+
+        A glitch that got through `_accept`, or the bump of a finger on the button, moves a plain average by a
+        `1 / times` share of its error, here it is discarded. `trim` defaults to a quarter of the readings rounded
+        up, 3 readings give their median.
+        """
+        if trim is None:
+            trim = (times + 2) // 4
+        ordered = self._sorted
+        for i in range(times):
+            value = self.read()
+            j = i
+            while j > 0 and ordered[j - 1] > value:
+                ordered[j] = ordered[j - 1]
+                j -= 1
+            ordered[j] = value
+        sum = 0
+        for i in range(trim, times - trim):
+            sum += ordered[i]
+        return sum / (times - 2 * trim)
+
     def read_lowpass(self):
+        if self.filtered is None:
+            self.filtered = self.read()
+            return self.filtered
         self.filtered += self.time_constant * (self.read() - self.filtered)
         return self.filtered
 
@@ -71,17 +210,105 @@ class HX711:
         return self.read_average(times) - self.OFFSET
 
     def get_units(self, times=3):
+        if self._lut_base is not None:
+            return self.to_fixed(int(self.read_average(times))) / 100
         return self.get_value(times) / self.SCALE
 
-    def tare(self, times=15):
-        sum = self.read_average(times)
-        self.set_offset(sum)
+    def tare(self, times=8):
+        self.flush()
+        self.set_offset(self.read_trimmed(times))
 
     def set_scale(self, scale):
         self.SCALE = scale
+        # hundredths of a unit per raw count in Q20, 17 bits for the usual scales
+        self._scale_q = int(100 * (1 << 20) / scale + 0.5)
 
     def set_offset(self, offset):
         self.OFFSET = offset
+        self._offset_i = int(offset)
+        if self._lut_base is not None:
+            self._tare_fixed = self._lookup(self._offset_i - self._zero_i)
+
+    def set_table(self, points, zero=None, cells=64):
+        """Convert the readings through a piecewise-linear calibration instead of the single scale.
+
+        The curve through `points` is sampled on a grid of `cells` equal segments, the end segments extend it beyond
+        the first and last points. Each segment keeps its start value in hundredths of a unit and its slope in Q20,
+        so a conversion is a shift to find the segment and the same small-int products as `to_fixed`. The table
+        follows the empty scales reading `zero`, a tare still reads 0 but the weight on top of it gets the
+        correction of the part of the curve it actually uses.
+
+        Args:
+            points (Optional[list]): at least 2 (raw reading minus `zero`, units) pairs in increasing order, None
+                goes back to the single scale
+            zero (Optional[int], optional): raw reading of the empty scales. Defaults to the current offset.
+            cells (int, optional): number of grid segments. Defaults to 64.
+        """
+        if points is None:
+            self._lut_base = None
+            self._lut_slope = None
+            return
+        if zero is None:
+            zero = self.OFFSET
+        start = points[0][0]
+        span = points[-1][0] - start
+        shift = 0
+        while (cells << shift) < span:
+            shift += 1
+        width = 1 << shift
+
+        def curve(x):
+            # hundredths of a unit at x, the end segments are extended
+            for i in range(1, len(points) - 1):
+                if x < points[i][0]:
+                    break
+            else:
+                i = len(points) - 1
+            (x0, y0), (x1, y1) = points[i - 1], points[i]
+            return 100 * (y0 + (y1 - y0) * (x - x0) / (x1 - x0))
+
+        base = array('i', [0] * cells)
+        slope = array('i', [0] * cells)
+        for i in range(cells):
+            y0 = curve(start + i * width)
+            y1 = curve(start + (i + 1) * width)
+            base[i] = int(round(y0))
+            slope[i] = int(round((y1 - y0) * (1 << 20) / width))
+        self._lut_start = start
+        self._lut_shift = shift
+        self._lut_slope = slope
+        self._lut_base = base
+        self._zero = zero
+        self._zero_i = int(zero)
+        self.set_offset(self.OFFSET)
+
+    def _lookup(self, delta):
+        delta -= self._lut_start
+        i = delta >> self._lut_shift
+        if i < 0:
+            i = 0
+        elif i >= len(self._lut_base):
+            i = len(self._lut_base) - 1
+        delta -= i << self._lut_shift
+        q = self._lut_slope[i]
+        return self._lut_base[i] + (((delta >> 12) * q) >> 8) + (((delta & 0xFFF) * q) >> 20)
+
+    def track_zero(self, counts):
+        """Move the offset, and the zero of the table, by `counts` to follow a drift of the load cell."""
+        self._zero += counts
+        self._zero_i = int(self._zero)
+        self.set_offset(self.OFFSET + counts)
+
+    def to_fixed(self, raw):
+        """Convert a raw reading to hundredths of a unit using only small-int arithmetic (no heap allocation).
+
+        The reading is split in 12-bit halves so each product stays below the 31-bit small-int limit.
+        """
+        if self._lut_base is not None:
+            return self._lookup(raw - self._zero_i) - self._tare_fixed
+        delta = raw - self._offset_i
+        q = self._scale_q
+        return (((delta >> 12) * q) >> 8) + (((delta & 0xFFF) * q) >> 20)
 
     def set_time_constant(self, time_constant=None):
         if time_constant is None:
@@ -95,3 +322,154 @@ class HX711:
 
     def power_up(self):
         self.pSCK.value(False)
+        # the readings before power down say nothing about the next ones
+        self._window_count = 0
+
+    def start_sampling(self, size=16):
+        """Read the ADC from a falling-edge interrupt on DOUT into a ring buffer.
+
+        Each conversion is stored along with its `ticks_ms` timestamp. Use `drain` to fetch the samples without
+        blocking, `read` and everything built on it keep working and take the buffered samples in order.
+
+        Args:
+            size (int, optional): number of slots of the ring buffer, one is kept free. Defaults to 16.
+        """
+        self._ring = array('i', [0] * size)
+        self._ring_time = array('i', [0] * size)
+        self._head = 0
+        self._tail = 0
+        self._busy = False
+        self.overruns = 0
+        self.pOUT.irq(trigger=Pin.IRQ_FALLING, handler=self._ready_irq)
+        if self.pOUT() == 0:
+            # a conversion is already waiting, there will be no edge for it
+            self._ready_irq(self.pOUT)
+
+    def stop_sampling(self):
+        self.pOUT.irq(handler=None)
+        self._ring = None
+        self._ring_time = None
+        self._head = 0
+        self._tail = 0
+
+    def _ready_irq(self, pin):
+        # DOUT toggles while the bits are shifted in, ignore those edges
+        if self._busy:
+            return
+        self._busy = True
+        try:
+            schedule(self._sample_cb, 0)
+        except RuntimeError:
+            # schedule queue full, the sample is picked up on the next edge
+            self._busy = False
+
+    def _sample(self, _):
+        ring = self._ring
+        if ring is None or self.pOUT() == 1:
+            # sampling was stopped or spurious edge
+            self._busy = False
+            return
+        value = self._shift_in()
+        if not self._accept(value):
+            self._busy = False
+            return
+        head = self._head
+        next_head = (head + 1) % len(ring)
+        if next_head == self._tail:
+            # the consumer is too slow, drop the newest sample
+            self.overruns += 1
+        else:
+            ring[head] = value
+            self._ring_time[head] = ticks_ms()
+            self._head = next_head
+        self._busy = False
+
+    def _pop(self):
+        tail = self._tail
+        value = self._ring[tail]
+        self._tail = (tail + 1) % len(self._ring)
+        return value
+
+    def available(self):
+        if self._ring is None:
+            return 0
+        return (self._head - self._tail) % len(self._ring)
+
+    def drain(self, values, times=None):
+        """Move the buffered samples into `values` (and their timestamps into `times`) without blocking.
+
+        Only the producer moves the head and only the consumer moves the tail, so this is safe against the
+        scheduled interrupt callback.
+
+        Returns:
+            int: number of samples copied, at most `len(values)`
+        """
+        n = 0
+        count = len(values)
+        while n < count and self._head != self._tail:
+            if times is not None:
+                times[n] = self._ring_time[self._tail]
+            values[n] = self._pop()
+            n += 1
+        return n
+
+    def flush(self):
+        if self._ring is not None:
+            self._tail = self._head
+
+    def to_units(self, raw):
+        """Convert a raw reading to units, as a float for the filters.
+
+        The result is a heap-allocated float on the device whichever path is taken, `to_fixed` only saves the float
+        arithmetic of the conversion. With a table, that is one division of an int instead of the interpolation.
+        """
+        if self._lut_base is not None:
+            return self.to_fixed(raw) / 100
+        return (raw - self.OFFSET) / self.SCALE
+
+
+class ZeroTracker:
+    """Follow the drift of the zero, e.g. while the load cell warms up next to the machine.
+
+    The offset only moves while the filtered weight is stable and within `band` of zero, after it has been so for
+    `hold_ms`. Each update corrects the weight with a time constant of `time_constant_ms`, and by at most
+    `max_rate` units per second, so a slow pour is not mistaken for a drift.
+    """
+
+    def __init__(self, hx, band=0.3, hold_ms=1000, time_constant_ms=2000, max_rate=0.05):
+        self._hx = hx
+        self.band = band
+        self.hold_ms = hold_ms
+        self.time_constant_ms = time_constant_ms
+        self.max_rate = max_rate
+        self._since = None
+        self._last = 0
+        # total correction in units, for diagnostics
+        self.tracked = 0.0
+
+    def update(self, weight, stable, now=None):
+        if now is None:
+            now = ticks_ms()
+        if not stable or abs(weight) > self.band:
+            self._since = None
+            return
+        if self._since is None:
+            self._since = now
+            self._last = now
+            return
+        dt = ticks_diff(now, self._last)
+        self._last = now
+        if ticks_diff(now, self._since) < self.hold_ms or dt <= 0:
+            return
+        step = weight * dt / self.time_constant_ms
+        limit = self.max_rate * dt / 1000
+        if step > limit:
+            step = limit
+        elif step < -limit:
+            step = -limit
+        self.tracked += step
+        self._hx.track_zero(step * self._hx.SCALE)
+
+    def reset(self):
+        """Wait for a new hold period, e.g. after taring."""
+        self._since = None
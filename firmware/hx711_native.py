@@ -0,0 +1,34 @@
+"""Viper bit-bang reader for the HX711, writing the ESP32 GPIO registers directly.
+
+Only pins 0-31 are handled, they live in the first GPIO bank.
+"""
+import sys
+
+import micropython
+from micropython import const
+
+if sys.platform != 'esp32':
+    raise ImportError('GPIO register addresses are only known for the ESP32')
+
+_GPIO_OUT_W1TS_REG = const(0x3FF44008)
+_GPIO_OUT_W1TC_REG = const(0x3FF4400C)
+_GPIO_IN_REG = const(0x3FF4403C)
+
+
+@micropython.viper
+def shift_in(sck: int, dout: int, bits: int) -> int:
+    set_reg = ptr32(_GPIO_OUT_W1TS_REG)  # noqa: F821
+    clear_reg = ptr32(_GPIO_OUT_W1TC_REG)  # noqa: F821
+    in_reg = ptr32(_GPIO_IN_REG)  # noqa: F821
+    sck_mask = 1 << sck
+    result = 0
+    i = 0
+    while i < bits:
+        set_reg[0] = sck_mask
+        # reading the input register while SCK is high stretches the pulse over the 0.2us minimum
+        level = in_reg[0]
+        clear_reg[0] = sck_mask
+        level = in_reg[0]
+        result = (result << 1) | ((level >> dout) & 1)
+        i += 1
+    return result
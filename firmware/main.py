@@ -1,13 +1,22 @@
 """Main file running on the scales ESP32."""
 import time
+from array import array
 
 import _thread
 import bluetooth
+import calibration
 import micropython
-from art import BATTERY, DOT, GRAM, LOGO, show_digit, show_sprite
+import profiling
+from art import LOGO, precompile, show_sprite
+from battery import BatteryMonitor
 from ble_scales import BLEScales
-from filtering import KalmanFilter
-from hx711 import HX711
+from display import FrameScheduler, WeightDisplay
+from filtering import AdaptiveKalmanFilter, FlowRateEstimator
+from hx711 import HX711, ZeroTracker
+from power import PowerManager
+from recorder import ShotRecorder, ShotTransfer
+from shared_state import BATTERY, FIELDS, FLOW_RATE, SHOT, TIMER, WEIGHT, SharedState
+from shot_timer import ShotTimer
 from machine import ADC, I2C, Pin
 from ssd1306 import SSD1306_I2C
 
@@ -18,110 +27,185 @@ screen = SSD1306_I2C(width=128, height=32, i2c=i2c)
 screen.fill(0)
 show_sprite(screen, LOGO, 51, 1)
 screen.show()
+precompile()
+weight_display = WeightDisplay(screen)
+frames = FrameScheduler()
 
 ble = bluetooth.BLE()
 print('bt loaded')
 scales = BLEScales(ble)
-kf = KalmanFilter(0.03, q=0.1)
+cal = calibration.load()
+kf = AdaptiveKalmanFilter(cal.measurement_uncertainty, q=cal.q)
+flow = FlowRateEstimator(0.03)
 button_pin = Pin(0, Pin.IN, Pin.PULL_UP)
 vsense_pin = ADC(Pin(34))
 vsense_pin.atten(ADC.ATTN_11DB)
-bat_percent = 0
-
-hx = HX711(dout=14, pd_sck=13, gain=64)
-hx.set_scale(1544.667)
-hx.tare()
+battery = BatteryMonitor(vsense_pin, scales)
+state = SharedState()
+shot = ShotTimer(on_tare=state.request_tare if cal.flags & calibration.AUTO_TARE else None)
+
+hx = HX711(dout=14, pd_sck=13, gain=cal.gain)
+cal.apply(hx)
+if cal.flags & calibration.TARE_ON_BOOT:
+    hx.tare()
 kf.update_estimate(hx.get_units(times=1))
-filtered_weight = 0
+scales.set_calibration(cal.pack())
+zero_tracker = ZeroTracker(hx)
+power = PowerManager(hx, scales, button=button_pin)
+recorder = ShotRecorder()
+transfer = ShotTransfer(scales, recorder)
+stats_command = None
+calibration_command = None
+raw_samples = array('i', [0] * 8)
+sample_times = array('i', [0] * 8)
+unit_samples = array('f', [0] * 8)
+flow_samples = array('f', [0] * 8)
+stable_samples = bytearray(8)
 
 
 def tare_callback(pin):
-    global hx, kf
-    hx.tare(times=3)
-    kf.last_estimate = 0.0
+    # taring waits for new samples, which are delivered through micropython.schedule, so it can't run in here
+    # a press on a blank screen only wakes the scales up
+    if power.screen_on:
+        state.request_tare()
+    power.wake()
+
+
+def stats_callback(conn_handle, data):
+    global stats_command
+    if data:
+        stats_command = data[0]
+
+
+def calibration_callback(conn_handle, data):
+    global calibration_command
+    if data:
+        calibration_command = data
+
+
+def run_calibration_command(command):
+    global cal, kf
+    try:
+        new_cal = calibration.run_command(cal, command, hx)
+    except (ValueError, OSError) as e:
+        print('calibration failed:', e)
+        return
+    if new_cal.measurement_uncertainty != cal.measurement_uncertainty or new_cal.q != cal.q:
+        kf = AdaptiveKalmanFilter(new_cal.measurement_uncertainty, q=new_cal.q)
+    cal = new_cal
+    kf.reset()
+    flow.reset()
+    zero_tracker.reset()
+    shot.on_tare = state.request_tare if cal.flags & calibration.AUTO_TARE else None
+    scales.set_calibration(cal.pack())
 
 
 def main():
-    global filtered_weight, bat_percent, scales, button_pin, hx, kf
+    global stats_command, calibration_command
 
-    # uncomment next 2 lines to get a load cell reading for calibration (in the console/serial)
-    # while True:
-    #    print(hx.read_average(times=100))
+    # to calibrate from the console/serial, interrupt here and run calibration.calibrate(hx, <known mass>)
 
-    battery_sum = 0
-    for i in range(10):
-        battery_sum += vsense_pin.read()
-    bat_percent = adc_to_percent(battery_sum / 10)
-    scales.set_battery_level(bat_percent)
+    battery.update()
+    state.publish(0.0, 0.0, battery.percent)
 
     _thread.start_new_thread(display_weight, ())
 
     button_pin.irq(trigger=Pin.IRQ_FALLING, handler=tare_callback)
+    scales.on_stats_command(stats_callback)
+    scales.on_calibration(calibration_callback)
+    hx.start_sampling()
 
-    last = 0
+    last_sample_time = time.ticks_ms()
+    last_stats = last_sample_time
     while True:
-        weight = hx.get_units(times=1)
-        filtered_weight = kf.update_estimate(weight)
-        now = time.ticks_ms()
-        if time.ticks_diff(now, last) > 100:
-            last = now
-            rounded_weight = round(filtered_weight / 0.05) * 0.05
-            scales.set_weight(rounded_weight, notify=True)
-
-
-def adc_to_percent(v_adc):
-    if v_adc > 2399:  # 4.1-4.2 = 94-100%
-        val = int(0.10169492 * v_adc - 149.966)
-        return val if val <= 100 else 100
-    if v_adc > 2341:  # 4.0-4.1 = 83-94%
-        return int(0.18965517 * v_adc - 360.983)
-    if v_adc > 2282:  # 3.9-4.0 = 72-83%
-        return int(0.18644068 * v_adc - 353.458)
-    if v_adc > 2224:  # 3.8-3.9 = 59-72%
-        return int(0.22413793 * v_adc - 439.483)
-    if v_adc > 2165:  # 3.7-3.8 = 50-59%
-        return int(0.15254237 * v_adc - 280.254)
-    if v_adc > 2107:  # 3.6-3.7 = 33-50%
-        return int(0.29310345 * v_adc - 584.569)
-    if v_adc > 2048:  # 3.5-3.6 = 15-33%
-        return int(0.30508475 * v_adc - 609.814)
-    if v_adc > 1990:  # 3.4-3.5 = 6-15%
-        return int(0.15517241 * v_adc - 302.793)
-    if v_adc >= 1931:  # 3.3-3.4 = 0-6%
-        return int(0.10169492 * v_adc - 196.373)
-    return 0
-
-
-def display_weight():
-    global filtered_weight, bat_percent
+        if __debug__ and profiling.enabled:
+            loop_start = profiling.start()
+        if state.take_tare():
+            power.resume()
+            weight = kf.last_estimate
+            hx.tare(times=3)
+            kf.reset()
+            flow.reset()
+            zero_tracker.reset()
+            shot.tared(weight)
+            recorder.tared()
+            scales.set_shot(shot.state, shot.elapsed_ms(time.ticks_ms()), notify=True)
+        count = hx.drain(raw_samples, sample_times)
+        if count >= 4:
+            # 50 ms of samples were waiting, the display gives the loop more time
+            frames.busy()
+        if count == 0:
+            count = power.wait(raw_samples, sample_times)
+        if count:
+            if __debug__ and profiling.enabled:
+                profiling.lap(profiling.SAMPLER)
+            for i in range(count):
+                units = hx.to_units(raw_samples[i])
+                unit_samples[i] = units
+                dt = time.ticks_diff(sample_times[i], last_sample_time)
+                last_sample_time = sample_times[i]
+                flow_samples[i] = flow.update(units, min(max(dt, 1), 2000) / 1000)
+            filtered_weight = kf.update_many(unit_samples, count, stable_samples)
+            if cal.flags & calibration.ZERO_TRACKING:
+                zero_tracker.update(filtered_weight, kf.stable)
+            if __debug__ and profiling.enabled:
+                profiling.lap(profiling.FILTER)
+            for i in range(count):
+                scales.add_sample(sample_times[i], unit_samples[i], flow_samples[i])
+                recorder.add(sample_times[i], unit_samples[i], flow_samples[i])
+                # each sample with its own stable flag, the start of the shot is caught within a sample period
+                if shot.update(sample_times[i], unit_samples[i], flow_samples[i], stable_samples[i]):
+                    scales.set_shot(shot.state, shot.elapsed_ms(sample_times[i]), notify=True)
+            scales.update_weight(filtered_weight, flow.rate)
+            # a sample every few seconds, otherwise only a clock read
+            battery.update(sample_times[count - 1])
+            timer = shot.elapsed_ms(sample_times[count - 1]) / 1000
+            state.publish(filtered_weight, flow.rate, battery.percent, shot.state, timer)
+            power.update(filtered_weight)
+            if __debug__ and profiling.enabled:
+                profiling.lap(profiling.BLE)
+                now = time.ticks_ms()
+                if time.ticks_diff(now, last_stats) > 1000:
+                    last_stats = now
+                    scales.set_stats(profiling.pack())
+        transfer.pump()
+        # notifications held back by the rate cap of each central
+        scales.pump()
+        if __debug__ and profiling.enabled:
+            profiling.record(profiling.LOOP, loop_start)
+        if stats_command is not None:
+            # at the end of the loop so enabling the probes never leaves a lap chain half started
+            profiling.run_command(stats_command)
+            stats_command = None
+        if calibration_command is not None:
+            power.resume()
+            run_calibration_command(calibration_command)
+            calibration_command = None
+        if transfer.command is not None:
+            power.resume()
+            transfer.run_command()
+
+
+def display_weight(refresh_ms=1000):
+    values = array('f', [0.0] * FIELDS)
+    seq = state.seq
     while True:
-        screen.fill(0)
-        rounded_weight = round(filtered_weight / 0.05) * 0.05
-        string = '{:.2f}'.format(rounded_weight)
-        if len(string) > 6:
-            string = '{:.1f}'.format(rounded_weight)
-        if string == '-0.00':
-            string = '0.00'
-        position = 118
-        for char in reversed(string):
-            if position < 0:
-                break
-            if char == '-':
-                char = 'MINUS'
-            if char == '.':
-                position -= 7
-                if position < 0:
-                    break
-                show_sprite(screen, DOT, position, 27)
-            else:
-                position -= 22
-                if position < 0:
-                    break
-                show_digit(screen, char, position, 1)
-        show_sprite(screen, GRAM, 117, 16)
-        if bat_percent <= 20:
-            show_sprite(screen, BATTERY, 117, 1)
-        screen.show()
+        if not power.apply_screen(screen):
+            # nothing to draw until the scales wake up, which takes at least a sample
+            time.sleep_ms(power.idle_sample_ms)
+            continue
+        updates = state.since(seq)
+        seq = state.read(values)
+        start = frames.start(updates)
+        weight_display.draw(
+            values[WEIGHT], values[BATTERY] <= 20, int(values[SHOT]), values[TIMER], values[FLOW_RATE]
+        )
+        frames.finish(start)
+        if __debug__ and profiling.enabled:
+            profiling.record(profiling.RENDER, start)
+        # keep to the frame rate, then sleep until there is something new to show
+        time.sleep_ms(frames.rest_ms())
+        state.wait(seq, refresh_ms)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,314 @@
+"""Alternative entry point running the scales as cooperative uasyncio tasks.
+
+Each job is a task with its own period and the scheduler sleeps in between, instead of the busy sampling loop and
+the display thread of `main.py`. To use it on the device, replace the content of `main.py` with `import main_async`
+followed by `main_async.start()`.
+
+The `profiling` probes time the work of each task: `sampler` a drain of the ring buffer, `filter` the conversion and
+filtering of a batch, `ble` the stream, recorder and shot timer updates of the batch plus each run of the notifier,
+`render` a frame. With no loop to time, `loop` is the time from the drain of a batch to its publication, the wait for
+the filter task included.
+"""
+import time
+from array import array
+
+import bluetooth
+import calibration
+import micropython
+import profiling
+from art import LOGO, precompile, show_sprite
+from battery import BatteryMonitor
+from ble_scales import BLEScales
+from display import FrameScheduler, WeightDisplay
+from filtering import AdaptiveKalmanFilter, FlowRateEstimator
+from hx711 import HX711, ZeroTracker
+from machine import ADC, I2C, Pin
+from power import IDLE, PowerManager
+from recorder import ShotRecorder, ShotTransfer
+from shared_state import BATTERY, FIELDS, FLOW_RATE, SHOT, TIMER, WEIGHT, SharedState
+from shot_timer import ShotTimer
+from ssd1306 import SSD1306_I2C
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+micropython.alloc_emergency_exception_buf(100)
+
+SAMPLER_MS = 10
+BLE_MS = 20
+FPS = 30
+BATTERY_MS = 10000
+BUTTON_MS = 20
+TRANSFER_MS = 10
+_BATCH = 16
+_TARE_SAMPLES = 3
+
+
+class Scales:
+    """The hardware and the tasks driving it."""
+
+    def __init__(self):
+        i2c = I2C(-1, scl=Pin(22), sda=Pin(21))
+        self.screen = SSD1306_I2C(width=128, height=32, i2c=i2c)
+        self.screen.fill(0)
+        show_sprite(self.screen, LOGO, 51, 1)
+        self.screen.show()
+        precompile()
+        self.display = WeightDisplay(self.screen)
+        self.frames = FrameScheduler(fps=FPS)
+
+        self.ble = bluetooth.BLE()
+        self.scales = BLEScales(self.ble)
+        self.cal = calibration.load()
+        self.kf = AdaptiveKalmanFilter(self.cal.measurement_uncertainty, q=self.cal.q)
+        self.flow = FlowRateEstimator(0.03)
+        self.button_pin = Pin(0, Pin.IN, Pin.PULL_UP)
+        self.vsense_pin = ADC(Pin(34))
+        self.vsense_pin.atten(ADC.ATTN_11DB)
+        self.state = SharedState()
+
+        self.hx = HX711(dout=14, pd_sck=13, gain=self.cal.gain)
+        self.cal.apply(self.hx)
+        if self.cal.flags & calibration.TARE_ON_BOOT:
+            self.hx.tare()
+        self.kf.update_estimate(self.hx.get_units(times=1))
+        self.scales.set_calibration(self.cal.pack())
+        self.zero_tracker = ZeroTracker(self.hx)
+        self.calibration_command = None
+        self.scales.on_calibration(self._calibration_callback)
+        self.stats_command = None
+        self.scales.on_stats_command(self._stats_callback)
+        self.power = PowerManager(self.hx, self.scales, button=self.button_pin)
+        self.recorder = ShotRecorder()
+        self.transfer = ShotTransfer(self.scales, self.recorder)
+        self.tare_requested = False
+        self.shot = ShotTimer(on_tare=self._auto_tare(self.cal))
+
+        self.raw_samples = array('i', [0] * _BATCH)
+        self.sample_times = array('i', [0] * _BATCH)
+        self.unit_samples = array('f', [0] * _BATCH)
+        self.flow_samples = array('f', [0] * _BATCH)
+        self.stable_samples = bytearray(_BATCH)
+        self.batch = 0
+        self._drained_us = 0
+        self.samples_ready = asyncio.Event()
+        self.battery = BatteryMonitor(self.vsense_pin, self.scales, period_ms=BATTERY_MS)
+        self.battery.sample()
+        self.weight = 0.0
+
+    def _calibration_callback(self, conn_handle, data):
+        if data:
+            self.calibration_command = data
+
+    def _stats_callback(self, conn_handle, data):
+        if data:
+            self.stats_command = data[0]
+
+    def _request_tare(self):
+        self.tare_requested = True
+
+    def _auto_tare(self, cal):
+        return self._request_tare if cal.flags & calibration.AUTO_TARE else None
+
+    def tare(self):
+        """Tare on the buffered samples, the sampler task waits for them first."""
+        weight = self.kf.last_estimate
+        self.hx.set_offset(self.hx.read_trimmed(_TARE_SAMPLES))
+        self.kf.reset()
+        self.flow.reset()
+        self.zero_tracker.reset()
+        self.shot.tared(weight)
+        self.recorder.tared()
+        self.scales.set_shot(self.shot.state, self.shot.elapsed_ms(time.ticks_ms()), notify=True)
+
+    def run_calibration_command(self, command):
+        try:
+            cal = calibration.run_command(self.cal, command, self.hx)
+        except (ValueError, OSError) as e:
+            print('calibration failed:', e)
+            return
+        if cal.measurement_uncertainty != self.cal.measurement_uncertainty or cal.q != self.cal.q:
+            self.kf = AdaptiveKalmanFilter(cal.measurement_uncertainty, q=cal.q)
+        self.cal = cal
+        self.kf.reset()
+        self.flow.reset()
+        self.zero_tracker.reset()
+        self.shot.on_tare = self._auto_tare(cal)
+        self.scales.set_calibration(cal.pack())
+
+    async def sampler(self):
+        hx = self.hx
+        power = self.power
+        hx.start_sampling(size=2 * _BATCH)
+        while True:
+            # the previous batch must be filtered before the buffers are reused
+            if not self.batch and self.calibration_command is not None:
+                power.resume()
+                self.run_calibration_command(self.calibration_command)
+                self.calibration_command = None
+            if not self.batch and self.tare_requested:
+                # asked by the button or the shot timer
+                self.tare_requested = False
+                power.resume()
+                hx.flush()
+                # the readings of the tare come in while the other tasks run, `read` would wait for them in a loop
+                while hx.available() < _TARE_SAMPLES:
+                    await asyncio.sleep_ms(SAMPLER_MS)
+                self.tare()
+            if not self.batch:
+                if __debug__ and profiling.enabled:
+                    start = time.ticks_us()
+                if power.stage < IDLE:
+                    self.batch = hx.drain(self.raw_samples, self.sample_times)
+                elif power.stage == IDLE:
+                    # the HX711 settles for about 60 ms, the other tasks run meanwhile
+                    for ms in power.sample_steps(self.raw_samples, self.sample_times):
+                        await asyncio.sleep_ms(ms)
+                    if __debug__ and profiling.enabled:
+                        # the other tasks ran meanwhile
+                        start = time.ticks_us()
+                    # unless a task woke the scales up, which discards the reading
+                    self.batch = 0 if power.stage < IDLE else 1
+                else:
+                    # light sleep stops every task anyway
+                    self.batch = power.wait(self.raw_samples, self.sample_times)
+                if self.batch:
+                    if __debug__ and profiling.enabled:
+                        profiling.record(profiling.SAMPLER, start)
+                        self._drained_us = start
+                    self.samples_ready.set()
+                    if self.batch >= _BATCH // 2:
+                        # 100 ms of samples were waiting, the display gives the other tasks more time
+                        self.frames.busy()
+            await asyncio.sleep_ms(power.idle_sample_ms if power.stage == IDLE else SAMPLER_MS)
+
+    async def filter(self):
+        last_sample_time = time.ticks_ms()
+        while True:
+            await self.samples_ready.wait()
+            self.samples_ready.clear()
+            if __debug__ and profiling.enabled:
+                profiling.start()
+            count = self.batch
+            hx = self.hx
+            flow = self.flow
+            for i in range(count):
+                units = hx.to_units(self.raw_samples[i])
+                self.unit_samples[i] = units
+                dt = time.ticks_diff(self.sample_times[i], last_sample_time)
+                last_sample_time = self.sample_times[i]
+                self.flow_samples[i] = flow.update(units, min(max(dt, 1), 2000) / 1000)
+            self.weight = self.kf.update_many(self.unit_samples, count, self.stable_samples)
+            if self.cal.flags & calibration.ZERO_TRACKING:
+                self.zero_tracker.update(self.weight, self.kf.stable)
+            if __debug__ and profiling.enabled:
+                profiling.lap(profiling.FILTER)
+            for i in range(count):
+                self.scales.add_sample(self.sample_times[i], self.unit_samples[i], self.flow_samples[i])
+                self.recorder.add(self.sample_times[i], self.unit_samples[i], self.flow_samples[i])
+                # each sample with its own stable flag, the start of the shot is caught within a sample period
+                if self.shot.update(
+                    self.sample_times[i], self.unit_samples[i], self.flow_samples[i], self.stable_samples[i]
+                ):
+                    self.scales.set_shot(self.shot.state, self.shot.elapsed_ms(self.sample_times[i]), notify=True)
+            self.batch = 0
+            timer = self.shot.elapsed_ms(self.sample_times[count - 1]) / 1000
+            self.state.publish(self.weight, flow.rate, self.battery.percent, self.shot.state, timer)
+            self.power.update(self.weight)
+            if __debug__ and profiling.enabled:
+                profiling.lap(profiling.BLE)
+                if self._drained_us:
+                    profiling.record(profiling.LOOP, self._drained_us)
+                    self._drained_us = 0
+
+    async def notifier(self):
+        last_stats = time.ticks_ms()
+        while True:
+            if __debug__ and profiling.enabled:
+                start = time.ticks_us()
+            self.scales.update_weight(self.weight, self.flow.rate)
+            # notifications held back by the rate cap of each central
+            self.scales.pump()
+            if __debug__ and profiling.enabled:
+                profiling.record(profiling.BLE, start)
+                now = time.ticks_ms()
+                if time.ticks_diff(now, last_stats) > 1000:
+                    last_stats = now
+                    self.scales.set_stats(profiling.pack())
+            if self.stats_command is not None:
+                # no probe of this task is running, a chain of laps of the other tasks never spans an await
+                profiling.run_command(self.stats_command)
+                self.stats_command = None
+            # a connection wakes the scales up, there is nobody to notify before that
+            await asyncio.sleep_ms(BLE_MS if self.power.stage < IDLE else self.power.idle_sample_ms)
+
+    async def display_task(self):
+        values = array('f', [0.0] * FIELDS)
+        frames = self.frames
+        seq = self.state.seq
+        while True:
+            if not self.power.apply_screen(self.screen):
+                # nothing to draw until the scales wake up, which takes at least a sample
+                await asyncio.sleep_ms(self.power.idle_sample_ms)
+                continue
+            updates = self.state.since(seq)
+            if updates:
+                seq = self.state.read(values)
+                start = frames.start(updates)
+                self.display.draw(
+                    values[WEIGHT], values[BATTERY] <= 20, int(values[SHOT]), values[TIMER], values[FLOW_RATE]
+                )
+                frames.finish(start)
+                if __debug__ and profiling.enabled:
+                    profiling.record(profiling.RENDER, start)
+            await asyncio.sleep_ms(frames.rest_ms())
+
+    async def battery_monitor(self):
+        while True:
+            await asyncio.sleep_ms(BATTERY_MS)
+            self.battery.sample()
+
+    async def shot_transfer(self):
+        transfer = self.transfer
+        while True:
+            if transfer.command is not None:
+                self.power.resume()
+                transfer.run_command()
+            transfer.pump()
+            await asyncio.sleep_ms(TRANSFER_MS if transfer.active else BLE_MS)
+
+    async def button(self):
+        # the press must read low twice in a row, and the button be released before it can trigger again
+        pressed = 0
+        while True:
+            if self.button_pin() == 0:
+                pressed += 1
+                if pressed == 2:
+                    # a press on a blank screen only wakes the scales up
+                    screen_on = self.power.screen_on
+                    self.power.resume()
+                    if screen_on:
+                        # taring waits for new samples, the sampler task does it between two batches
+                        self._request_tare()
+            else:
+                pressed = 0
+            await asyncio.sleep_ms(BUTTON_MS)
+
+    async def run(self):
+        tasks = [
+            asyncio.create_task(self.sampler()),
+            asyncio.create_task(self.filter()),
+            asyncio.create_task(self.notifier()),
+            asyncio.create_task(self.display_task()),
+            asyncio.create_task(self.battery_monitor()),
+            asyncio.create_task(self.shot_transfer()),
+            asyncio.create_task(self.button()),
+        ]
+        for task in tasks:
+            await task
+
+
+def start():
+    asyncio.run(Scales().run())
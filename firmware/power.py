@@ -0,0 +1,228 @@
+"""Idle power management.
+
+With no weight change and no central connected, the scales go through the stages below, each after its own delay
+since the last activity:
+
+- `DIM`: the OLED contrast is lowered.
+- `IDLE`: the OLED is switched off, advertising slows down and the HX711 is powered down between single readings
+  every `idle_sample_ms` instead of converting continuously.
+- `SLEEP`: advertising stops and the ESP32 light sleeps between readings every `sleep_sample_ms`.
+
+A weight change, a connection or the button brings them back to `ACTIVE`. Only the weight readings taken between
+sleeps can notice a load, so a cup put on the scales is seen at most one sample period later, the button wakes the
+ESP32 from light sleep straight away.
+"""
+import time
+
+from machine import idle, lightsleep
+from micropython import const
+
+try:
+    import esp32
+except ImportError:
+    esp32 = None
+
+ACTIVE = const(0)
+DIM = const(1)
+IDLE = const(2)
+SLEEP = const(3)
+
+NAMES = ('active', 'dim', 'idle', 'sleep')
+
+
+class PowerManager:
+    def __init__(
+        self,
+        hx,
+        scales,
+        button=None,
+        dim_ms=30000,
+        idle_ms=60000,
+        sleep_ms=300000,
+        threshold=0.5,
+        idle_sample_ms=250,
+        sleep_sample_ms=2000,
+        rate_hz=80,
+        adv_interval_us=500000,
+        idle_adv_interval_us=2000000,
+        contrast=0xFF,
+        dim_contrast=0x08,
+    ):
+        """Watch the activity and step the hardware down when there is none.
+
+        Args:
+            hx (HX711): the load cell ADC, sampling into its ring buffer while active
+            scales (BLEScales): the BLE service, its connections count as activity
+            button (Optional[Pin], optional): wakes the ESP32 from light sleep when pulled low. Defaults to None.
+            dim_ms (int, optional): inactivity before dimming the screen. Defaults to 30000.
+            idle_ms (int, optional): inactivity before blanking the screen and slowing down. Defaults to 60000.
+            sleep_ms (int, optional): inactivity before light sleeping. Defaults to 300000.
+            threshold (float, optional): weight change in units that counts as activity. Defaults to 0.5.
+            idle_sample_ms (int, optional): time between readings in the idle stage. Defaults to 250.
+            sleep_sample_ms (int, optional): light sleep between readings in the sleep stage. Defaults to 2000.
+            rate_hz (int, optional): HX711 output data rate, to sleep rather than poll while it wakes up. Defaults
+                to 80.
+            adv_interval_us (int, optional): advertising interval while active. Defaults to 500000.
+            idle_adv_interval_us (int, optional): advertising interval in the idle stage. Defaults to 2000000.
+            contrast (int, optional): OLED contrast while active. Defaults to 0xFF.
+            dim_contrast (int, optional): OLED contrast in the dim stage. Defaults to 0x08.
+        """
+        self._hx = hx
+        self._scales = scales
+        self._button = button
+        self.dim_ms = dim_ms
+        self.idle_ms = idle_ms
+        self.sleep_ms = sleep_ms
+        self.threshold = threshold
+        self.idle_sample_ms = idle_sample_ms
+        self.sleep_sample_ms = sleep_sample_ms
+        self._conversion_ms = 1000 // rate_hz + 1
+        self.adv_interval_us = adv_interval_us
+        self.idle_adv_interval_us = idle_adv_interval_us
+        self.contrast = contrast
+        self.dim_contrast = dim_contrast
+        self.stage = ACTIVE
+        # stage the screen was last set to by apply_screen, capped at IDLE
+        self._screen_stage = ACTIVE
+        self._reference = None
+        self._last_activity = time.ticks_ms()
+        self._wake = False
+        if button is not None and esp32 is not None:
+            esp32.wake_on_ext0(pin=button, level=esp32.WAKEUP_ALL_LOW)
+
+    @property
+    def screen_on(self):
+        return self.stage < IDLE
+
+    def wake(self):
+        """Count as activity at the next `update`, safe to call from an interrupt handler."""
+        self._wake = True
+
+    def resume(self):
+        """Go back to the active stage straight away, e.g. before taring. Call it from the sampling loop."""
+        self._last_activity = time.ticks_ms()
+        self._reference = None
+        if self.stage != ACTIVE:
+            self._enter(ACTIVE)
+
+    def update(self, weight, now=None):
+        """Feed the latest filtered weight and move to the stage matching the time without activity.
+
+        Returns:
+            bool: True when this update woke the scales up
+        """
+        if now is None:
+            now = time.ticks_ms()
+        if (
+            self._wake
+            or self._reference is None
+            or abs(weight - self._reference) >= self.threshold
+            or self._scales.connected
+        ):
+            self._wake = False
+            self._reference = weight
+            self._last_activity = now
+            if self.stage != ACTIVE:
+                self._enter(ACTIVE)
+                return True
+            return False
+        inactive = time.ticks_diff(now, self._last_activity)
+        if inactive >= self.sleep_ms:
+            stage = SLEEP
+        elif inactive >= self.idle_ms:
+            stage = IDLE
+        elif inactive >= self.dim_ms:
+            stage = DIM
+        else:
+            stage = ACTIVE
+        if stage > self.stage:
+            self._enter(stage)
+        return False
+
+    def _enter(self, stage):
+        previous = self.stage
+        self.stage = stage
+        hx = self._hx
+        if stage >= IDLE > previous:
+            hx.stop_sampling()
+            hx.power_down()
+        elif previous >= IDLE > stage:
+            hx.power_up()
+            # the HX711 restarts on channel A with a gain of 128, this conversion sets the gain again
+            hx.read()
+            hx.start_sampling()
+        if stage == SLEEP:
+            # the radio is off in light sleep anyway
+            self._scales.set_advertising_interval(None)
+        elif stage == IDLE:
+            self._scales.set_advertising_interval(self.idle_adv_interval_us)
+        elif previous >= IDLE:
+            self._scales.set_advertising_interval(self.adv_interval_us)
+
+    def wait(self, values, times):
+        """Wait for the next sample when the ring buffer is empty.
+
+        While active or dim this only idles until the next interrupt, the samples keep coming through the ring
+        buffer. In the idle and sleep stages the HX711 is off: wait for the sample period, then power it up for a
+        single reading stored in `values` and `times` like `HX711.drain` does.
+
+        Returns:
+            int: number of samples stored
+        """
+        if self.stage < IDLE:
+            idle()
+            return 0
+        if self.stage == SLEEP:
+            lightsleep(self.sleep_sample_ms)
+            if self._button is not None and self._button() == 0:
+                # the edge that woke the ESP32 may not have reached the pin interrupt
+                self._wake = True
+        else:
+            time.sleep_ms(self.idle_sample_ms)
+        return self.sample(values, times)
+
+    def sample(self, values, times):
+        """Power the HX711 up for a single reading while it is off, see `wait`."""
+        for ms in self.sample_steps(values, times):
+            time.sleep_ms(ms)
+        return 1
+
+    def sample_steps(self, values, times):
+        """The steps of `sample`, as a generator of the delays in ms to wait between them.
+
+        The caller decides how to wait: `sample` sleeps, the uasyncio firmware awaits so that its other tasks keep
+        running. If the scales were woken up meanwhile, the HX711 is sampling again and the steps stop without a
+        reading, the stage tells whether one was stored.
+        """
+        hx = self._hx
+        hx.power_up()
+        # the first conversion comes after 4 periods of settling and uses the default gain
+        yield 4 * self._conversion_ms
+        if self.stage < IDLE:
+            return
+        hx.read()
+        yield self._conversion_ms
+        if self.stage < IDLE:
+            return
+        values[0] = hx.read()
+        times[0] = time.ticks_ms()
+        hx.power_down()
+
+    def apply_screen(self, screen):
+        """Dim or switch off the OLED to match the stage, from the thread that draws on it.
+
+        Returns:
+            bool: whether the screen is on and worth drawing
+        """
+        stage = self.stage
+        if stage > IDLE:
+            stage = IDLE
+        if stage != self._screen_stage:
+            if stage == IDLE:
+                screen.poweroff()
+            else:
+                if self._screen_stage == IDLE:
+                    screen.poweron()
+                screen.contrast(self.dim_contrast if stage == DIM else self.contrast)
+            self._screen_stage = stage
+        return stage < IDLE
@@ -0,0 +1,117 @@
+"""Lightweight timing probes for the firmware.
+
+Every probe keeps a call count, the total and maximum duration and a histogram with power-of-two buckets, all in a
+preallocated `array`, so recording a duration allocates nothing.
+
+Probes are meant to be guarded with `if __debug__ and profiling.enabled:`. When the firmware is compiled with an
+optimisation level of 1 or more (`mpy-cross -O1` or `micropython.opt_level(1)` in `boot.py`), `__debug__` is False
+and the compiler drops the guarded code entirely. Otherwise it costs one attribute lookup while `enabled` is False.
+"""
+import struct
+from array import array
+
+from micropython import const
+from time import ticks_diff, ticks_us
+
+SAMPLER = const(0)
+FILTER = const(1)
+BLE = const(2)
+RENDER = const(3)
+LOOP = const(4)
+NAMES = ('sampler', 'filter', 'ble', 'render', 'loop')
+
+_BINS = const(12)  # <16us, <32us, ... <16ms, <32ms, the last one also holds anything longer
+_FIRST_BIN_US = const(16)
+_COUNT = const(0)
+_TOTAL = const(1)
+_MAX = const(2)
+_HIST = const(3)
+_STRIDE = const(15)  # _HIST + _BINS
+# halve count and total before the total leaves the small int range, the mean stays right
+_TOTAL_LIMIT = const(0x3FFFFFFF)
+
+enabled = False
+_stats = array('I', [0] * (_STRIDE * len(NAMES)))
+_lap = 0
+
+
+def record(probe, start_us):
+    """Record the time elapsed since `start_us` (a `ticks_us` value) for `probe`."""
+    elapsed = ticks_diff(ticks_us(), start_us)
+    stats = _stats
+    base = probe * _STRIDE
+    total = stats[base + _TOTAL] + elapsed
+    if total > _TOTAL_LIMIT:
+        stats[base + _COUNT] >>= 1
+        total >>= 1
+    stats[base + _COUNT] += 1
+    stats[base + _TOTAL] = total
+    if elapsed > stats[base + _MAX]:
+        stats[base + _MAX] = elapsed
+    index = 0
+    limit = _FIRST_BIN_US
+    while elapsed >= limit and index < _BINS - 1:
+        limit <<= 1
+        index += 1
+    stats[base + _HIST + index] += 1
+
+
+def start():
+    """Start a chain of laps on the calling thread's loop, returns the `ticks_us` start time."""
+    global _lap
+    _lap = ticks_us()
+    return _lap
+
+
+def lap(probe):
+    """Record the time since the previous `start` or `lap` for `probe`."""
+    global _lap
+    now = ticks_us()
+    record(probe, _lap)
+    _lap = now
+
+
+def run_command(command):
+    """Run a command written to the stats characteristic: 0 prints on the REPL, 1 resets, 2 enables, 3 disables."""
+    global enabled
+    if command == 0:
+        report()
+    elif command == 1:
+        reset()
+    elif command == 2:
+        enabled = True
+    elif command == 3:
+        enabled = False
+
+
+def reset():
+    stats = _stats
+    for i in range(len(stats)):
+        stats[i] = 0
+
+
+def pack():
+    """Summary of every probe as big-endian (uint32 count, uint32 mean us, uint32 max us), in `NAMES` order."""
+    data = bytearray()
+    stats = _stats
+    for probe in range(len(NAMES)):
+        base = probe * _STRIDE
+        count = stats[base + _COUNT]
+        data += struct.pack('!III', count, stats[base + _TOTAL] // count if count else 0, stats[base + _MAX])
+    return data
+
+
+def report():
+    """Print the statistics on the REPL."""
+    stats = _stats
+    print(
+        '{:<8} {:>8} {:>8} {:>8}  histogram from <{}us, x2 per bucket'.format(
+            'probe', 'count', 'mean', 'max', _FIRST_BIN_US
+        )
+    )
+    for probe, name in enumerate(NAMES):
+        base = probe * _STRIDE
+        count = stats[base + _COUNT]
+        mean = stats[base + _TOTAL] // count if count else 0
+        histogram = ' '.join(str(stats[base + _HIST + i]) for i in range(_BINS))
+        print('{:<8} {:>8} {:>8} {:>8}  {}'.format(name, count, mean, stats[base + _MAX], histogram))
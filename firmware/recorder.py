@@ -0,0 +1,374 @@
+"""Shots recorded to flash while the scales are used, downloaded later over BLE.
+
+A session starts when the filtered weight goes above `threshold` (0.5g, like the web app) and ends once the weight has
+been steady for `end_ms`, when the cup is taken away or after `max_ms`. A tare discards the session in progress, it was
+measured from the old zero. Sessions are recorded whether or not a central is connected, each one is a file in
+`DIRECTORY` made of:
+
+- a header: magic, version, flags, block size, start time (`time.time()`), duration in ms and number of samples
+- fixed-size blocks, each holding a `codec` frame padded with zeros: the time since the start of the session in ms,
+  the weight in hundredths of a gram and the flow rate in hundredths of a gram per second
+
+All values are little-endian. A session cut short by a reset keeps its full blocks, with a header showing no samples
+and without the `FINISHED` flag; `decode` reads it from the blocks. A damaged block only loses its own samples.
+
+This module is also imported on CPython by `host.shots`.
+"""
+import os
+import struct
+import time
+
+from codec import FrameEncoder, decode_frame
+
+try:
+    from micropython import const
+except ImportError:
+
+    def const(value):
+        return value
+
+
+DIRECTORY = 'shots'
+
+# flags
+FINISHED = const(0x01)
+
+# commands written to the shots characteristic
+CMD_LIST = const(0)  # the characteristic then reads as the list of sessions, see `list_payload`
+CMD_READ = const(1)  # followed by the session id and the byte offset to start from, both uint32
+CMD_DELETE = const(2)  # followed by the session id as uint32
+CMD_ABORT = const(3)  # stop the transfer in progress
+
+_MAGIC = b'SHOT'
+_VERSION = const(2)
+_HEADER = '<4sBBHIII'
+HEADER_SIZE = const(20)
+BLOCK_SIZE = const(256)
+_PADDING = bytes(BLOCK_SIZE)
+# offset of a transfer notification reporting an unknown session
+_TRANSFER_ERROR = const(0xFFFFFFFF)
+
+
+def _path(session):
+    return '{}/{}.bin'.format(DIRECTORY, session)
+
+
+def _files():
+    found = []
+    try:
+        names = os.listdir(DIRECTORY)
+    except OSError:
+        return found
+    for name in names:
+        if name.endswith('.bin') and name[:-4].isdigit():
+            session = int(name[:-4])
+            found.append((session, os.stat(_path(session))[6]))
+    found.sort()
+    return found
+
+
+def sessions():
+    """Return the `(id, size in bytes)` of the sessions in flash, oldest first.
+
+    A file too short for the header, left by a reset right after its session was opened, is left out.
+    """
+    return [s for s in _files() if s[1] >= HEADER_SIZE]
+
+
+def delete(session):
+    try:
+        os.remove(_path(session))
+    except OSError:
+        pass
+
+
+def list_payload(exclude=None):
+    """The value of the shots characteristic after `CMD_LIST`: the number of sessions (uint8), then the id and size
+    of each one (uint32), oldest first. The session being recorded is left out."""
+    found = [s for s in sessions() if s[0] != exclude]
+    data = bytearray(1 + 8 * len(found))
+    data[0] = len(found)
+    for i, (session, size) in enumerate(found):
+        struct.pack_into('<II', data, 1 + 8 * i, session, size)
+    return bytes(data)
+
+
+def decode(data):
+    """Read a session file.
+
+    Returns:
+        tuple: start time, flags, the list of `(ms since the start, weight, flow rate)` samples and the number of
+            damaged blocks that were skipped
+    """
+    if len(data) < HEADER_SIZE:
+        raise ValueError('truncated')
+    magic, version, flags, block_size, start, _, _ = struct.unpack_from(_HEADER, data)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError('unknown format')
+    samples = []
+    damaged = 0
+    for offset in range(HEADER_SIZE, len(data) - block_size + 1, block_size):
+        try:
+            frame, _ = decode_frame(data, offset)
+        except ValueError:
+            damaged += 1
+            continue
+        for t, weight, flow in frame:
+            samples.append((t, weight / 100, flow / 100))
+    return start, flags, samples, damaged
+
+
+class ShotRecorder:
+    def __init__(
+        self,
+        threshold=0.5,
+        end_threshold=-0.1,
+        steady_band=0.2,
+        end_ms=10000,
+        min_ms=3000,
+        max_ms=300000,
+        interval_ms=50,
+        max_sessions=16,
+    ):
+        """Record sessions from the filtered weight passed to `add`.
+
+        Args:
+            threshold (float, optional): weight starting a session. Defaults to 0.5.
+            end_threshold (float, optional): weight ending a session, the cup was taken away. Defaults to -0.1.
+            steady_band (float, optional): the weight is steady while it stays within this band. Defaults to 0.2.
+            end_ms (int, optional): a session ends once the weight has been steady this long. Defaults to 10000.
+            min_ms (int, optional): a session where the weight stopped changing within this time of the start is
+                dropped, it was a cup put down rather than a shot. Defaults to 3000.
+            max_ms (int, optional): longest session. Defaults to 300000.
+            interval_ms (int, optional): time between two recorded samples. Defaults to 50.
+            max_sessions (int, optional): the oldest sessions are deleted to stay within this count. Defaults to 16.
+        """
+        self.threshold = threshold
+        self.end_threshold = end_threshold
+        self.steady_band = steady_band
+        self.end_ms = end_ms
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.interval_ms = interval_ms
+        self.max_sessions = max_sessions
+        try:
+            os.mkdir(DIRECTORY)
+        except OSError:
+            pass
+        found = _files()
+        for session, size in found:
+            if size < HEADER_SIZE:
+                delete(session)
+        self._next = found[-1][0] + 1 if found else 1
+        # id of the session being recorded
+        self.session = None
+        # a new session can start once the weight went below the threshold
+        self.armed = False
+        self._file = None
+        self._header = bytearray(HEADER_SIZE)
+        self._encoder = FrameEncoder(BLOCK_SIZE)
+        self._samples = 0
+        self._start = 0
+        self._start_time = 0
+        self._last_t = 0
+        self._steady_weight = 0.0
+        self._steady_since = 0
+
+    @property
+    def recording(self):
+        return self.session is not None
+
+    def add(self, t_ms, weight, flow_rate):
+        """Feed a filtered sample, called for every sample.
+
+        Returns:
+            bool: True when a session was saved
+        """
+        if self.session is None:
+            if weight < self.threshold:
+                self.armed = True
+            elif self.armed:
+                self._open(t_ms, weight)
+                self._append(t_ms, weight, flow_rate)
+            return False
+        if time.ticks_diff(t_ms, self._last_t) < self.interval_ms:
+            return False
+        if abs(weight - self._steady_weight) > self.steady_band:
+            self._steady_weight = weight
+            self._steady_since = t_ms
+        elapsed = time.ticks_diff(t_ms, self._start)
+        if (
+            weight < self.end_threshold
+            or time.ticks_diff(t_ms, self._steady_since) >= self.end_ms
+            or elapsed >= self.max_ms
+        ):
+            return self.stop()
+        self._append(t_ms, weight, flow_rate)
+        return False
+
+    def tared(self):
+        """The scales were tared: the open session measured from the old zero is discarded, and a new one starts
+        once the weight from the new zero goes above the threshold."""
+        if self.session is not None:
+            self._file.close()
+            self._file = None
+            delete(self.session)
+            self.session = None
+        self.armed = True
+
+    def stop(self):
+        """End the session now, returns True if it was saved."""
+        if self.session is None:
+            return False
+        if self._encoder.count:
+            self._write_block()
+        duration = time.ticks_diff(self._last_t, self._start)
+        struct.pack_into(
+            _HEADER, self._header, 0, _MAGIC, _VERSION, FINISHED, BLOCK_SIZE, self._start_time, duration, self._samples
+        )
+        self._file.seek(0)
+        self._file.write(self._header)
+        self._file.close()
+        self._file = None
+        session = self.session
+        self.session = None
+        self.armed = False
+        if time.ticks_diff(self._steady_since, self._start) < self.min_ms:
+            delete(session)
+            return False
+        return True
+
+    def _open(self, t_ms, weight):
+        found = sessions()
+        while len(found) >= self.max_sessions:
+            delete(found.pop(0)[0])
+        self.session = self._next
+        self._next += 1
+        self._start = self._steady_since = t_ms
+        self._start_time = int(time.time())
+        self._steady_weight = weight
+        self._samples = 0
+        self._encoder.reset()
+        self._file = open(_path(self.session), 'wb')
+        struct.pack_into(_HEADER, self._header, 0, _MAGIC, _VERSION, 0, BLOCK_SIZE, self._start_time, 0, 0)
+        self._file.write(self._header)
+
+    def _append(self, t_ms, weight, flow_rate):
+        t = time.ticks_diff(t_ms, self._start)
+        weight = int(round(weight * 100))
+        flow_rate = int(round(flow_rate * 100))
+        if not self._encoder.add(t, weight, flow_rate):
+            self._write_block()
+            self._encoder.add(t, weight, flow_rate)
+        self._last_t = t_ms
+
+    def _write_block(self):
+        self._samples += self._encoder.count
+        frame = self._encoder.finish()
+        self._file.write(frame)
+        self._file.write(memoryview(_PADDING)[: BLOCK_SIZE - len(frame)])
+        self._file.flush()
+
+
+class ShotTransfer:
+    """Sends recorded sessions to a central through the shots characteristic of `BLEScales`.
+
+    After `CMD_READ`, the session file is notified in chunks as large as the MTU of the connection allows, each one
+    starting with its byte offset in the file (uint32). A chunk with no data after the offset marks the end of the
+    file, or an unknown session when the offset is 0xFFFFFFFF. A central that got disconnected resumes by sending
+    `CMD_READ` again from the offset it has reached.
+    """
+
+    def __init__(self, scales, recorder, burst=4):
+        """Serve the sessions of `recorder` through `scales`.
+
+        Args:
+            scales (BLEScales): the BLE interface
+            recorder (ShotRecorder): the session being recorded is not listed and can't be read
+            burst (int, optional): most notifications sent by a call to `pump`. Defaults to 4.
+        """
+        self.scales = scales
+        self.recorder = recorder
+        self.burst = burst
+        self.command = None
+        self.conn_handle = None
+        self.offset = 0
+        self.size = 0
+        self._file = None
+        # offset and the largest payload (ATT MTU 247)
+        self._chunk = bytearray(4 + 244)
+        self._view = memoryview(self._chunk)
+        scales.on_shots_command(self._callback)
+        scales.set_shots(list_payload())
+
+    def _callback(self, conn_handle, data):
+        # runs in the BLE IRQ handler, the command is run from the main loop
+        if data:
+            self.command = (conn_handle, bytes(data))
+
+    @property
+    def active(self):
+        return self._file is not None
+
+    def run_command(self):
+        """Act on the last command written by a central, if any."""
+        if self.command is None:
+            return
+        conn_handle, data = self.command
+        self.command = None
+        if data[0] == CMD_LIST:
+            self.scales.set_shots(list_payload(self.recorder.session))
+        elif data[0] == CMD_READ and len(data) == 9:
+            session, offset = struct.unpack_from('<II', data, 1)
+            self._open(conn_handle, session, offset)
+        elif data[0] == CMD_DELETE and len(data) == 5:
+            session = struct.unpack_from('<I', data, 1)[0]
+            if session != self.recorder.session:
+                delete(session)
+            self.scales.set_shots(list_payload(self.recorder.session))
+        elif data[0] == CMD_ABORT:
+            self.close()
+
+    def _open(self, conn_handle, session, offset):
+        self.close()
+        self.conn_handle = conn_handle
+        try:
+            if session == self.recorder.session:
+                raise OSError
+            self._file = open(_path(session), 'rb')
+            self.size = os.stat(_path(session))[6]
+        except OSError:
+            struct.pack_into('<I', self._chunk, 0, _TRANSFER_ERROR)
+            self.scales.notify_shots(conn_handle, self._view[:4])
+            return
+        self.offset = min(offset, self.size)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def pump(self):
+        """Send the next chunks of the transfer in progress, called from the main loop."""
+        if self._file is None:
+            return
+        try:
+            mtu = self.scales.connection_params(self.conn_handle)[0]
+        except KeyError:
+            # the central is gone, it resumes with a new CMD_READ
+            self.close()
+            return
+        size = min(mtu - 3, len(self._chunk)) - 4
+        for i in range(self.burst):
+            length = min(size, self.size - self.offset)
+            struct.pack_into('<I', self._chunk, 0, self.offset)
+            if length:
+                self._file.seek(self.offset)
+                self._file.readinto(self._view[4 : 4 + length])
+            if not self.scales.notify_shots(self.conn_handle, self._view[: 4 + length]):
+                # the notification queue is full, send the same chunk next time
+                return
+            self.offset += length
+            if not length:
+                self.close()
+                return
@@ -0,0 +1,83 @@
+"""State shared between the sampling loop, the display thread and interrupt handlers."""
+from array import array
+
+from micropython import const
+from time import sleep_ms, ticks_add, ticks_diff, ticks_ms
+
+WEIGHT = const(0)
+FLOW_RATE = const(1)
+BATTERY = const(2)
+SHOT = const(3)  # shot_timer state
+TIMER = const(4)  # shot timer in seconds
+# size of the buffer given to `read`
+FIELDS = const(5)
+_SEQ_MASK = const(0x3FFFFFFF)
+
+
+class SharedState:
+    """Sequence-numbered double buffer for the latest readings, plus a queue of tare requests.
+
+    Only the sampling loop publishes. It writes the slot that readers are not using, then bumps the sequence number,
+    so a reader gets a consistent set of values without locking: it retries if the sequence changed while it was
+    copying.
+    """
+
+    def __init__(self):
+        self._values = array('f', [0.0] * (2 * FIELDS))
+        self._seq = 0
+        self._tare_requests = 0
+        self._tares_done = 0
+
+    def publish(self, weight, flow_rate, battery, shot=0, timer=0.0):
+        seq = (self._seq + 1) & _SEQ_MASK
+        base = (seq & 1) * FIELDS
+        values = self._values
+        values[base + WEIGHT] = weight
+        values[base + FLOW_RATE] = flow_rate
+        values[base + BATTERY] = battery
+        values[base + SHOT] = shot
+        values[base + TIMER] = timer
+        self._seq = seq
+
+    def read(self, out):
+        """Copy the latest values into `out` (indexed by WEIGHT, FLOW_RATE, BATTERY, SHOT and TIMER), returns their
+        sequence number."""
+        values = self._values
+        while True:
+            seq = self._seq
+            base = (seq & 1) * FIELDS
+            for i in range(FIELDS):
+                out[i] = values[base + i]
+            if seq == self._seq:
+                return seq
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def since(self, seq):
+        """Number of values published after `seq`."""
+        return (self._seq - seq) & _SEQ_MASK
+
+    def wait(self, seq, timeout_ms):
+        """Sleep until values newer than `seq` are published or `timeout_ms` has elapsed, returns the latest sequence.
+
+        MicroPython locks can't be acquired with a timeout, so this polls every millisecond. Sleeping hands the GIL
+        over to the sampling loop instead of spinning on it.
+        """
+        deadline = ticks_add(ticks_ms(), timeout_ms)
+        while self._seq == seq and ticks_diff(deadline, ticks_ms()) > 0:
+            sleep_ms(1)
+        return self._seq
+
+    def request_tare(self):
+        """Queue a tare, safe to call from an interrupt handler."""
+        self._tare_requests = (self._tare_requests + 1) & _SEQ_MASK
+
+    def take_tare(self):
+        """Return True once for every batch of queued tare requests."""
+        requests = self._tare_requests
+        if requests == self._tares_done:
+            return False
+        self._tares_done = requests
+        return True
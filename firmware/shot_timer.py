@@ -0,0 +1,176 @@
+"""Shot detection on the scales: auto-tare when a cup is put down, timer started by the first drops, end of the shot.
+
+The states follow the filtered weight, flow rate and `AdaptiveKalmanFilter.stable` of every sample:
+
+- `IDLE`: waiting for a cup. Once a weight of at least `cup_weight` is stable, a tare is requested and the timer
+  waits for the shot once it is done.
+- `CUP_PLACED`: tared with the cup on, waiting for the shot. The timer starts with the first sample above
+  `start_threshold`, like the web app.
+- `BREWING`: the timer runs. The pour is over once the flow rate has stayed below `end_flow` for `end_ms`, the timer
+  stops at the first of those samples.
+- `DRIPPING`: the last drops fall, a flow above `resume_flow` goes back to brewing. Once the weight has been stable
+  for `finish_ms`, the shot is finished.
+- `FINISHED`: the timer shows the duration of the pour until the cup is taken away and the next one put down,
+  which is handled as in `IDLE`.
+
+Taking the cup away (the weight goes below minus half of `cup_weight`) ends a shot in progress, and tares the empty
+scales once stable. Without auto-tare, it clears the timer of a finished shot instead (`IDLE`). A tare from the
+button arms the timer again (`CUP_PLACED`) when a cup was tared away, a lighter load such as an empty dosing cup
+leaves it idle so that adding the beans doesn't start a shot.
+"""
+from micropython import const
+from time import ticks_diff
+
+IDLE = const(0)
+CUP_PLACED = const(1)
+BREWING = const(2)
+DRIPPING = const(3)
+FINISHED = const(4)
+NAMES = ('idle', 'cup placed', 'brewing', 'dripping', 'finished')
+
+
+class ShotTimer:
+    def __init__(
+        self,
+        on_tare=None,
+        cup_weight=30.0,
+        start_threshold=0.5,
+        end_flow=0.3,
+        end_ms=1000,
+        resume_flow=1.0,
+        finish_ms=3000,
+    ):
+        """Initialize the state machine in `IDLE`.
+
+        Args:
+            on_tare (Optional[callable], optional): called without arguments to request a tare, which must be
+                followed by a call to `tared` once done. Defaults to None, no auto-tare.
+            cup_weight (float, optional): lightest cup. Defaults to 30.0.
+            start_threshold (float, optional): weight starting the timer. Defaults to 0.5.
+            end_flow (float, optional): flow rate below which the pour is over, in g/s. Defaults to 0.3.
+            end_ms (int, optional): how long the flow must stay below `end_flow`. Defaults to 1000.
+            resume_flow (float, optional): flow rate going back from dripping to brewing. Defaults to 1.0.
+            finish_ms (int, optional): how long the weight must be stable to finish the shot. Defaults to 3000.
+        """
+        self.on_tare = on_tare
+        self.cup_weight = cup_weight
+        self.start_threshold = start_threshold
+        self.end_flow = end_flow
+        self.end_ms = end_ms
+        self.resume_flow = resume_flow
+        self.finish_ms = finish_ms
+        self.state = IDLE
+        self.start = 0
+        self.end = 0
+        self._since = None
+        self._tare_pending = False
+        self._after_tare = CUP_PLACED
+        self._cup_taken = False
+
+    def elapsed_ms(self, now):
+        """Time on the timer at `now` (a `ticks_ms` timestamp), in ms."""
+        if self.state == BREWING:
+            return ticks_diff(now, self.start)
+        if self.state in (DRIPPING, FINISHED):
+            return ticks_diff(self.end, self.start)
+        return 0
+
+    def tared(self, weight):
+        """The scales were tared, by the button or after a request from `on_tare`.
+
+        A tare requested for a cup, or from the button with a cup on the scales, waits for the next shot. One
+        requested because the cup was taken away keeps the state, and the timer of a finished shot.
+
+        Args:
+            weight (float): filtered weight just before the tare
+        """
+        if self._tare_pending:
+            state = self._after_tare
+        else:
+            state = CUP_PLACED if weight >= self.cup_weight else IDLE
+        self._tare_pending = False
+        self._enter(state)
+
+    def reset(self):
+        self._tare_pending = False
+        self._enter(IDLE)
+
+    def _enter(self, state):
+        self.state = state
+        self._since = None
+
+    def _finish(self):
+        self._cup_taken = False
+        self._enter(FINISHED)
+
+    def _request_tare(self, state):
+        if self.on_tare is not None and not self._tare_pending:
+            self._tare_pending = True
+            self._after_tare = state
+            self.on_tare()
+
+    def update(self, t_ms, weight, flow_rate, stable):
+        """Follow a filtered sample.
+
+        Args:
+            t_ms (int): `time.ticks_ms()` timestamp of the sample
+            weight (float): filtered weight
+            flow_rate (float): flow rate in g/s
+            stable (bool): the weight filter has settled
+
+        Returns:
+            bool: True when the state changed
+        """
+        state = self.state
+        removed = weight < -0.5 * self.cup_weight
+        if state == IDLE or state == FINISHED:
+            if stable and removed:
+                self._cup_taken = True
+                if self.on_tare is None:
+                    # nothing to tare, the finished shot is cleared once its cup is taken away
+                    if state == FINISHED:
+                        self._enter(IDLE)
+                        return True
+                else:
+                    self._request_tare(state)
+            elif stable and weight >= self.cup_weight and (state == IDLE or self._cup_taken):
+                # the finished cup stays on the scales with its coffee until taken away, it is not a new one
+                self._request_tare(CUP_PLACED)
+            return False
+        if state == CUP_PLACED:
+            if stable and removed:
+                if self.on_tare is None:
+                    self._enter(IDLE)
+                    return True
+                self._request_tare(IDLE)
+            elif weight > self.start_threshold and not removed:
+                self.start = t_ms
+                self._enter(BREWING)
+                return True
+            return False
+        if removed:
+            if state == BREWING:
+                self.end = t_ms
+            self._finish()
+            return True
+        if state == BREWING:
+            if flow_rate >= self.end_flow:
+                self._since = None
+            elif self._since is None:
+                self._since = t_ms
+            elif ticks_diff(t_ms, self._since) >= self.end_ms:
+                self.end = self._since
+                self._enter(DRIPPING)
+                return True
+        else:
+            if flow_rate > self.resume_flow:
+                self._enter(BREWING)
+                return True
+            if not stable:
+                self._since = None
+            elif self._since is None:
+                self._since = t_ms
+            elif ticks_diff(t_ms, self._since) >= self.finish_ms:
+                self._finish()
+                return True
+        return False
@@ -0,0 +1,193 @@
+"""CPython stand-in for the MicroPython `bluetooth` module.
+
+`BLE` records every call made by the firmware in `calls` and keeps the last notified payloads, the helper methods
+`connect`, `disconnect`, `update_connection`, `subscribe` and `write` play the part of a central.
+
+With `tx_buffers`, the connections given a radio link by `set_link` share a pool of that many transmit buffers, as
+in the ESP32 controller: a notification holds one until a connection event of its central sends it, and
+`gatts_notify` raises `OSError(ENOMEM)` while they are all in use.
+"""
+import struct
+
+import clock
+
+FLAG_BROADCAST = 0x0001
+FLAG_READ = 0x0002
+FLAG_WRITE_NO_RESPONSE = 0x0004
+FLAG_WRITE = 0x0008
+FLAG_NOTIFY = 0x0010
+FLAG_INDICATE = 0x0020
+
+_IRQ_CENTRAL_CONNECT = 1
+_IRQ_CENTRAL_DISCONNECT = 2
+_IRQ_GATTS_WRITE = 3
+_IRQ_MTU_EXCHANGED = 21
+_IRQ_CONNECTION_UPDATE = 27
+
+
+class UUID:
+    def __init__(self, value):
+        if isinstance(value, UUID):
+            value = value._value
+        self._value = value
+        if isinstance(value, int):
+            self._bytes = struct.pack('<H', value)
+        elif isinstance(value, (bytes, bytearray)):
+            self._bytes = bytes(value)
+        else:
+            self._bytes = bytes(reversed(bytes.fromhex(value.replace('-', ''))))
+
+    def __bytes__(self):
+        return self._bytes
+
+    def __eq__(self, other):
+        return isinstance(other, UUID) and self._bytes == other._bytes
+
+    def __hash__(self):
+        return hash(self._bytes)
+
+    def __repr__(self):
+        if isinstance(self._value, int):
+            return 'UUID(0x{:04x})'.format(self._value)
+        return 'UUID({!r})'.format(self._value)
+
+
+class BLE:
+    def __init__(self, remote_mtu=247, tx_buffers=None):
+        self.calls = []
+        self.remote_mtu = remote_mtu
+        self.handler = None
+        self.values = {}
+        self.notifications = []
+        self.advertising = None
+        self._active = False
+        self._config = {'mtu': 23, 'gap_name': 'MPY ESP32'}
+        self._handles = {}
+        self._next_handle = 1
+        self.tx_buffers = tx_buffers
+        # (conn_handle, value_handle, payload, queued us, delivered us) of the notifications sent over a link
+        self.deliveries = []
+        # conn_handle: [interval us, notifications per event, next event us, [(value_handle, payload, queued us)]]
+        self._links = {}
+
+    def _record(self, name, *args):
+        self.calls.append((name,) + args)
+
+    def active(self, active=None):
+        if active is not None:
+            self._record('active', active)
+            self._active = bool(active)
+        return self._active
+
+    def config(self, *args, **kwargs):
+        if args:
+            return self._config[args[0]]
+        self._record('config', kwargs)
+        self._config.update(kwargs)
+        return None
+
+    def irq(self, handler):
+        self._record('irq')
+        self.handler = handler
+
+    def gatts_register_services(self, services):
+        self._record('gatts_register_services', len(services))
+        handles = []
+        for uuid, characteristics in services:
+            service_handles = []
+            for characteristic in characteristics:
+                handle = self._next_handle
+                self._next_handle += 2  # value handle and CCCD
+                self._handles[handle] = characteristic[0]
+                self.values[handle] = b''
+                service_handles.append(handle)
+            handles.append(tuple(service_handles))
+        return tuple(handles)
+
+    def gatts_write(self, value_handle, data, send_update=False):
+        self._record('gatts_write', value_handle, bytes(data))
+        self.values[value_handle] = bytes(data)
+
+    def gatts_read(self, value_handle):
+        return self.values[value_handle]
+
+    def gatts_set_buffer(self, value_handle, size, append=False):
+        self._record('gatts_set_buffer', value_handle, size, append)
+
+    def gatts_notify(self, conn_handle, value_handle, data=None):
+        payload = self.values[value_handle] if data is None else bytes(data)
+        link = self._links.get(conn_handle)
+        if link is not None:
+            self.deliver()
+            if self.tx_buffers is not None and self.buffers_used() >= self.tx_buffers:
+                self._record('gatts_notify_enomem', conn_handle, value_handle)
+                raise OSError(12)
+            link[3].append((value_handle, payload, clock.now_us()))
+        self._record('gatts_notify', conn_handle, value_handle, payload)
+        self.notifications.append((conn_handle, value_handle, payload))
+
+    def gatts_indicate(self, conn_handle, value_handle):
+        self._record('gatts_indicate', conn_handle, value_handle)
+
+    def gap_advertise(self, interval_us, adv_data=None, resp_data=None, connectable=True):
+        self._record('gap_advertise', interval_us)
+        self.advertising = None if interval_us is None else (interval_us, adv_data)
+
+    def gap_disconnect(self, conn_handle):
+        self._record('gap_disconnect', conn_handle)
+        self.disconnect(conn_handle)
+        return True
+
+    def gattc_exchange_mtu(self, conn_handle):
+        self._record('gattc_exchange_mtu', conn_handle)
+        mtu = min(self._config['mtu'], self.remote_mtu)
+        self._event(_IRQ_MTU_EXCHANGED, (conn_handle, mtu))
+
+    # central side of the simulation
+
+    def _event(self, event, data):
+        if self.handler is not None:
+            self.handler(event, data)
+
+    def connect(self, conn_handle, addr_type=0, addr=b'\x00\x11\x22\x33\x44\x55'):
+        self.advertising = None
+        self._event(_IRQ_CENTRAL_CONNECT, (conn_handle, addr_type, addr))
+
+    def disconnect(self, conn_handle, addr_type=0, addr=b'\x00\x11\x22\x33\x44\x55'):
+        # the notifications still waiting are lost with the link
+        self._links.pop(conn_handle, None)
+        self._event(_IRQ_CENTRAL_DISCONNECT, (conn_handle, addr_type, addr))
+
+    def set_link(self, conn_handle, interval_ms, per_event):
+        """Send the notifications of a connection over a radio link with a connection event every `interval_ms`, each
+        sending at most `per_event` notifications. Sent ones go to `deliveries`."""
+        self._links[conn_handle] = [int(interval_ms * 1000), per_event, clock.now_us(), []]
+
+    def buffers_used(self):
+        return sum(len(link[3]) for link in self._links.values())
+
+    def deliver(self):
+        """Run the connection events up to the current time."""
+        now = clock.now_us()
+        for conn_handle, link in self._links.items():
+            interval, per_event, next_event, waiting = link
+            while next_event <= now:
+                if not waiting:
+                    next_event += ((now - next_event) // interval + 1) * interval
+                    break
+                for value_handle, payload, queued in waiting[:per_event]:
+                    self.deliveries.append((conn_handle, value_handle, payload, queued, next_event))
+                del waiting[:per_event]
+                next_event += interval
+            link[2] = next_event
+
+    def update_connection(self, conn_handle, interval_units, latency=0, supervision_timeout=400, status=0):
+        self._event(_IRQ_CONNECTION_UPDATE, (conn_handle, interval_units, latency, supervision_timeout, status))
+
+    def write(self, conn_handle, value_handle, data):
+        self.values[value_handle] = bytes(data)
+        self._event(_IRQ_GATTS_WRITE, (conn_handle, value_handle))
+
+    def subscribe(self, conn_handle, value_handle, notify=True):
+        # the CCCD follows the value handle
+        self.write(conn_handle, value_handle + 1, struct.pack('<H', 1 if notify else 0))
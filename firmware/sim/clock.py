@@ -0,0 +1,108 @@
+"""MicroPython `time.ticks_*` functions for CPython, patched into the `time` module by `install`.
+
+The clock runs on `time.perf_counter` unless a virtual clock is selected with `use_virtual`, in which case time only
+moves forward through `advance` (and the `sleep*` functions), which makes simulations reproducible.
+"""
+import _thread
+import time
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = _TICKS_PERIOD // 2
+
+_perf_counter = time.perf_counter
+_sleep = time.sleep
+_virtual_us = None
+_driver_thread = None
+# called after every sleep, `machine` uses it to let the simulated devices raise their interrupts
+on_sleep = None
+
+
+def use_virtual(start_us=0):
+    """Switch to the virtual clock, only the calling thread moves it forward when it sleeps."""
+    global _virtual_us, _driver_thread
+    _virtual_us = start_us
+    _driver_thread = _thread.get_ident()
+
+
+def use_real():
+    global _virtual_us
+    _virtual_us = None
+
+
+def advance(us):
+    global _virtual_us
+    if _virtual_us is not None:
+        _virtual_us += int(us)
+
+
+def now_us():
+    if _virtual_us is not None:
+        return _virtual_us
+    return int(_perf_counter() * 1000000)
+
+
+def ticks_us():
+    return now_us() & _TICKS_MAX
+
+
+def ticks_ms():
+    return (now_us() // 1000) & _TICKS_MAX
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
+
+
+def sleep_us(us):
+    if _virtual_us is not None and _thread.get_ident() != _driver_thread:
+        # other threads wait for the driving thread to bring the clock to their deadline
+        deadline = _virtual_us + us
+        while _virtual_us is not None and _virtual_us < deadline:
+            _sleep(0.0002)
+        return
+    if _virtual_us is not None:
+        advance(us)
+    elif us > 0:
+        _sleep(us / 1000000)
+    if on_sleep is not None:
+        on_sleep()
+
+
+def sleep_ms(ms):
+    sleep_us(ms * 1000)
+
+
+def pause_us(us):
+    """Let `us` pass without calling `on_sleep`, for sleeps made of several steps."""
+    if _virtual_us is not None:
+        advance(us)
+    elif us > 0:
+        _sleep(us / 1000000)
+
+
+def busy_us(us):
+    """Keep the calling thread busy for `us` of virtual time (e.g. a blocking bus transfer), the devices are only
+    serviced at the next sleep. Nothing happens on the real clock, where the work takes the time it takes."""
+    if _virtual_us is None:
+        return
+    if _thread.get_ident() != _driver_thread:
+        sleep_us(us)
+    else:
+        advance(us)
+
+
+def install():
+    for name in ('ticks_us', 'ticks_ms', 'ticks_cpu', 'ticks_add', 'ticks_diff', 'sleep_us', 'sleep_ms'):
+        setattr(time, name, globals()[name])
+
+
+install()
@@ -0,0 +1,206 @@
+"""Simulated peripherals wired to the `machine` stand-in: the HX711 load cell ADC and the SSD1306 OLED."""
+import random
+import struct
+import zlib
+
+import clock
+import machine
+
+
+class HX711Device:
+    """HX711 behind a pair of pins, converting a weight profile with gaussian noise.
+
+    Conversions are ready every `1 / rate_hz` seconds of the (real or virtual) clock. DOUT goes low when a conversion
+    is ready, which fires the falling-edge interrupt the next time the simulation is polled (`machine.idle`, the
+    `sleep` functions). Clocking SCK shifts the 24 bits out MSB first, the extra 1 to 3 pulses select the gain.
+    Leaving SCK high while no conversion is being read powers the chip down, bringing it low powers it up again.
+    A `glitches` share of the conversions comes out wrong, alternately stuck on a rail or with a flipped bit.
+    """
+
+    def __init__(
+        self, dout, pd_sck, profile, scale=1544.667, offset=84000, noise=0.04, rate_hz=80, seed=0, glitches=0.0
+    ):
+        self.profile = profile
+        self.scale = scale
+        self.offset = offset
+        self.noise = noise
+        self.glitches = glitches
+        self.glitched = 0
+        self.period_us = 1000000 // rate_hz
+        self.conversions = 0
+        self.reads = 0
+        self.last_weight = 0.0
+        self._rng = random.Random(seed)
+        self._start_us = clock.now_us()
+        self._next_ready = self._start_us + self.period_us
+        self._notified = False
+        self._powered_down = False
+        self._sck = 0
+        self._pulses = 0
+        self._shifting = False
+        self._word = 0
+        self._bit = 1
+        self._last_edge = 0
+        self._dout = machine.pin_state(dout)
+        self._dout.driver = self._dout_level
+        machine.pin_state(pd_sck).on_write = self._sck_write
+        machine.add_device(self)
+
+    def _ready(self):
+        return not self._powered_down and clock.now_us() >= self._next_ready
+
+    def _dout_level(self):
+        if self._shifting:
+            return self._bit
+        return 0 if self._ready() else 1
+
+    def _convert(self):
+        t = (self._next_ready - self._start_us) / 1000000
+        weight = self.profile(t)
+        self.last_weight = weight
+        raw = int(round((weight + self._rng.gauss(0.0, self.noise)) * self.scale + self.offset))
+        raw = max(-0x800000, min(0x7FFFFF, raw))
+        if self.glitches and self._rng.random() < self.glitches:
+            self.glitched += 1
+            if self.glitched % 2:
+                raw = self._rng.choice((-0x800000, 0x7FFFFF))
+            else:
+                raw ^= 1 << self._rng.randrange(12, 23)
+        self.conversions += 1
+        return raw & 0xFFFFFF
+
+    def _sck_write(self, level):
+        now = clock.now_us()
+        if level and not self._sck:
+            if self._shifting:
+                self._pulse(now)
+            elif self._pulses >= 25 and self._pulses < 27 and now - self._last_edge < 50:
+                # gain selection pulses right after the data bits
+                self._pulses += 1
+            elif self._ready():
+                self._word = self._convert()
+                self._shifting = True
+                self._pulses = 0
+                self._pulse(now)
+            else:
+                self._powered_down = True
+            self._last_edge = now
+        elif not level and self._sck and self._powered_down and not self._shifting:
+            # power up, the first conversion takes a few periods to settle
+            self._powered_down = False
+            self._next_ready = now + 4 * self.period_us
+            self._notified = False
+        self._sck = level
+
+    def _pulse(self, now):
+        self._pulses += 1
+        if self._pulses <= 24:
+            self._bit = (self._word >> (24 - self._pulses)) & 1
+            return
+        # 25th pulse: DOUT back high until the next conversion
+        self._bit = 1
+        self._shifting = False
+        self.reads += 1
+        next_ready = self._next_ready + self.period_us
+        if next_ready <= now:
+            # conversions were missed, realign on the next one
+            next_ready = now + self.period_us - (now - self._next_ready) % self.period_us
+        self._next_ready = next_ready
+        self._notified = False
+
+    def poll(self):
+        if not self._notified and self._ready():
+            self._notified = True
+            self._dout.falling_edge()
+
+
+class SSD1306Device:
+    """I2C SSD1306 controller keeping a copy of the display RAM, with traffic counters and a PNG export."""
+
+    # number of argument bytes following each multi-byte command
+    _ARGS = {0x20: 1, 0x21: 2, 0x22: 2, 0x81: 1, 0x8D: 1, 0xA8: 1, 0xD3: 1, 0xD5: 1, 0xD9: 1, 0xDA: 1, 0xDB: 1}
+
+    def __init__(self, width=128, height=32):
+        self.width = width
+        self.height = height
+        self.pages = height // 8
+        self.ram = bytearray(width * self.pages)
+        self.display_on = False
+        self.contrast = 0xFF
+        self.transactions = 0
+        self.bytes = 0
+        self.flushes = 0
+        self._col = (0, width - 1)
+        self._page = (0, self.pages - 1)
+        self._x = 0
+        self._p = 0
+        self._cmd = []
+
+    def write(self, data):
+        self.transactions += 1
+        self.bytes += len(data)
+        control = data[0]
+        if control & 0x40:
+            self._data(data[1:])
+        else:
+            for i in range(1, len(data), 2 if control & 0x80 else 1):
+                self._command(data[i])
+
+    def _command(self, byte):
+        self._cmd.append(byte)
+        cmd = self._cmd[0]
+        if len(self._cmd) <= self._ARGS.get(cmd, 0):
+            return
+        args = self._cmd[1:]
+        self._cmd = []
+        if cmd == 0x21:
+            self._col = (args[0], args[1])
+            self._x = args[0]
+        elif cmd == 0x22:
+            self._page = (args[0], args[1])
+            self._p = args[0]
+            self.flushes += 1
+        elif cmd == 0x81:
+            self.contrast = args[0]
+        elif cmd in (0xAE, 0xAF):
+            self.display_on = cmd == 0xAF
+
+    def _data(self, data):
+        for byte in data:
+            if 0 <= self._x < self.width and 0 <= self._p < self.pages:
+                self.ram[self._p * self.width + self._x] = byte
+            self._x += 1
+            if self._x > self._col[1]:
+                self._x = self._col[0]
+                self._p += 1
+                if self._p > self._page[1]:
+                    self._p = self._page[0]
+
+    def pixel(self, x, y):
+        return (self.ram[(y >> 3) * self.width + x] >> (y & 7)) & 1
+
+    def to_text(self):
+        return "\n".join(
+            "".join("#" if self.pixel(x, y) else "." for x in range(self.width)) for y in range(self.height)
+        )
+
+    def to_png(self, path, scale=4):
+        """Write what the panel shows (blank if it is off) as a grayscale PNG."""
+        width = self.width * scale
+        height = self.height * scale
+        level = 0xFF if self.display_on else 0
+        rows = bytearray()
+        for y in range(self.height):
+            row = bytearray([0])  # no filter
+            for x in range(self.width):
+                row += bytes([level if self.pixel(x, y) else 0]) * scale
+            rows += bytes(row) * scale
+
+        def chunk(kind, data):
+            return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+        with open(path, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n")
+            f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)))
+            f.write(chunk(b"IDAT", zlib.compress(bytes(rows))))
+            f.write(chunk(b"IEND", b""))
@@ -0,0 +1,9 @@
+"""CPython stand-in for the MicroPython `esp32` module, only the light sleep wake-up source."""
+import machine
+
+WAKEUP_ALL_LOW = False
+WAKEUP_ANY_HIGH = True
+
+
+def wake_on_ext0(pin, level):
+    machine.set_wake_pin(pin.id, 1 if level else 0)
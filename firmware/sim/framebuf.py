@@ -0,0 +1,91 @@
+"""CPython stand-in for the MicroPython `framebuf` module.
+
+Only the MONO_VLSB format used by the SSD1306 driver is implemented. Every drawing primitive is counted in
+`calls` and every pixel it touches in `pixels_written`, so host benchmarks can compare rendering strategies.
+"""
+
+MONO_VLSB = 0
+MONO_HLSB = 3
+MONO_HMSB = 4
+
+
+class FrameBuffer:
+    def __init__(self, buffer, width, height, format, stride=None):
+        if format != MONO_VLSB:
+            raise ValueError("only MONO_VLSB is supported")
+        self._buf = buffer
+        self._width = width
+        self._height = height
+        self._stride = stride or width
+        self.calls = 0
+        self.pixels_written = 0
+
+    def _get(self, x, y):
+        return (self._buf[(y >> 3) * self._stride + x] >> (y & 7)) & 1
+
+    def _set(self, x, y, c):
+        index = (y >> 3) * self._stride + x
+        if c:
+            self._buf[index] |= 1 << (y & 7)
+        else:
+            self._buf[index] &= ~(1 << (y & 7)) & 0xFF
+
+    def pixel(self, x, y, c=None):
+        self.calls += 1
+        if not (0 <= x < self._width and 0 <= y < self._height):
+            return None
+        if c is None:
+            return self._get(x, y)
+        self.pixels_written += 1
+        self._set(x, y, c)
+        return None
+
+    def fill(self, c):
+        self.calls += 1
+        self.pixels_written += self._width * self._height
+        value = 0xFF if c else 0x00
+        for i in range(len(self._buf)):
+            self._buf[i] = value
+
+    def fill_rect(self, x, y, w, h, c):
+        self.calls += 1
+        for yy in range(max(y, 0), min(y + h, self._height)):
+            for xx in range(max(x, 0), min(x + w, self._width)):
+                self.pixels_written += 1
+                self._set(xx, yy, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c):
+        self.calls += 1
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        self.calls += 1
+        for sy in range(fbuf._height):
+            dy = y + sy
+            if not 0 <= dy < self._height:
+                continue
+            for sx in range(fbuf._width):
+                dx = x + sx
+                if not 0 <= dx < self._width:
+                    continue
+                c = fbuf._get(sx, sy)
+                if c == key:
+                    continue
+                self.pixels_written += 1
+                self._set(dx, dy, c)
+
+    def scroll(self, xstep, ystep):
+        raise NotImplementedError
+
+    def text(self, s, x, y, c=1):
+        # No font is bundled; keep the call count so layouts using text can still be benchmarked.
+        self.calls += 1
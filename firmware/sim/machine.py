@@ -0,0 +1,261 @@
+"""CPython stand-in for the MicroPython `machine` module.
+
+Pins keep their state per pin number so that simulated devices (see `devices`) can drive inputs and watch outputs.
+`idle` and the `time.sleep*` functions advance the virtual clock when it is used and let the devices raise their
+interrupts. `stop_at` ends a simulation by raising `SimulationEnd` from `idle` once the clock passes a deadline.
+`lightsleep` returns early when the pin given to `esp32.wake_on_ext0` reaches its level.
+"""
+import clock
+
+_devices = []
+_pins = {}
+_timers = []
+# number of times the firmware went idle or slept, a proxy for how often the CPU wakes up
+wakeups = 0
+_stop_at_us = None
+_idle_us = 1000
+# (pin id, level) waking up from light sleep
+_wake_pin = None
+
+
+class SimulationEnd(Exception):
+    pass
+
+
+class _PinState:
+    def __init__(self, pin_id):
+        self.pin_id = pin_id
+        self.level = 0
+        self.pull = None
+        self.driver = None
+        self.on_write = None
+        self.handler = None
+        self.trigger = 0
+        self.pin = None
+
+    def read(self):
+        if self.driver is not None:
+            return self.driver()
+        return self.level
+
+    def write(self, level):
+        level = 1 if level else 0
+        previous = self.level
+        self.level = level
+        if self.on_write is not None:
+            self.on_write(level)
+        if previous and not level:
+            self.falling_edge()
+        elif level and not previous and self.handler is not None and self.trigger & Pin.IRQ_RISING:
+            self.handler(self.pin)
+
+    def falling_edge(self):
+        if self.handler is not None and self.trigger & Pin.IRQ_FALLING:
+            self.handler(self.pin)
+
+
+def pin_state(pin_id):
+    state = _pins.get(pin_id)
+    if state is None:
+        state = _pins[pin_id] = _PinState(pin_id)
+    return state
+
+
+def add_device(device):
+    _devices.append(device)
+
+
+def reset_devices():
+    global _stop_at_us, wakeups, _wake_pin
+    del _devices[:]
+    del _timers[:]
+    _pins.clear()
+    wakeups = 0
+    _stop_at_us = None
+    _wake_pin = None
+
+
+def poll():
+    global wakeups
+    wakeups += 1
+    _service()
+
+
+def _service():
+    for device in _devices:
+        device.poll()
+    now = clock.now_us()
+    while _timers and _timers[0][0] <= now:
+        _timers.pop(0)[1]()
+    if _stop_at_us is not None and clock.now_us() >= _stop_at_us:
+        raise SimulationEnd()
+
+
+clock.on_sleep = poll
+
+
+def at(us, callback):
+    """Call `callback()` once the clock reaches `us`, e.g. to press a button during a simulation."""
+    _timers.append((us, callback))
+    _timers.sort(key=lambda timer: timer[0])
+
+
+def stop_at(us):
+    global _stop_at_us
+    _stop_at_us = us
+
+
+def set_wake_pin(pin_id, level):
+    global _wake_pin
+    _wake_pin = (pin_id, level)
+
+
+def set_idle_step(us):
+    """Virtual time skipped by each call to `idle`."""
+    global _idle_us
+    _idle_us = us
+
+
+def press(pin_id):
+    """Pull an input low, as a button does."""
+    pin_state(pin_id).write(0)
+
+
+def release(pin_id):
+    pin_state(pin_id).write(1)
+
+
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+    WAKE_LOW = 4
+    WAKE_HIGH = 5
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self._state = pin_state(id)
+        self._state.pin = self
+        if pull == Pin.PULL_UP and self._state.driver is None:
+            self._state.level = 1
+        if value is not None:
+            self._state.write(value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if value is not None:
+            self._state.write(value)
+
+    def value(self, x=None):
+        if x is None:
+            return self._state.read()
+        self._state.write(x)
+        return None
+
+    __call__ = value
+
+    def on(self):
+        self._state.write(1)
+
+    def off(self):
+        self._state.write(0)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, wake=None, hard=False):
+        self._state.handler = handler
+        self._state.trigger = trigger if handler is not None else 0
+
+
+class ADC:
+    ATTN_0DB = 0
+    ATTN_2_5DB = 1
+    ATTN_6DB = 2
+    ATTN_11DB = 3
+    # raw reading returned for each pin number, e.g. `ADC.values[34] = 2300` for a battery at about 4V
+    values = {}
+
+    def __init__(self, pin):
+        self._pin_id = pin.id if isinstance(pin, Pin) else pin
+
+    def atten(self, attn):
+        pass
+
+    def width(self, bits):
+        pass
+
+    def read(self):
+        value = ADC.values.get(self._pin_id, 0)
+        return value() if callable(value) else value
+
+    def read_u16(self):
+        return self.read() << 4
+
+
+class I2C:
+    """I2C bus, devices are looked up by address in `I2C.devices` and get the raw bytes of each transaction.
+
+    Transactions take the time the bus would on the virtual clock, so the cost of drawing on the OLED shows up.
+    """
+
+    devices = {}
+
+    def __init__(self, id=-1, scl=None, sda=None, freq=400000):
+        self.freq = freq
+
+    def scan(self):
+        return sorted(I2C.devices)
+
+    def writeto(self, addr, buf, stop=True):
+        device = I2C.devices.get(addr)
+        if device is None:
+            raise OSError(19)  # ENODEV
+        device.write(bytes(buf))
+        # the transfer blocks for 9 clocks per byte, address included
+        clock.busy_us((len(buf) + 1) * 9 * 1000000 // self.freq)
+        return len(buf)
+
+    def writevto(self, addr, vector, stop=True):
+        data = b"".join(bytes(b) for b in vector)
+        return self.writeto(addr, data, stop)
+
+
+def idle():
+    clock.advance(_idle_us)
+    poll()
+
+
+def disable_irq():
+    return 1
+
+
+def enable_irq(state):
+    pass
+
+
+def freq(hz=None):
+    return 240000000 if hz is None else None
+
+
+def unique_id():
+    return b"\x24\x0a\xc4\x00\x00\x01"
+
+
+def reset():
+    raise SimulationEnd("machine.reset()")
+
+
+def lightsleep(ms=None):
+    global wakeups
+    wakeups += 1
+    end = None if ms is None else clock.now_us() + ms * 1000
+    while end is None or clock.now_us() < end:
+        clock.pause_us(_idle_us if end is None else min(_idle_us, end - clock.now_us()))
+        _service()
+        if _wake_pin is not None and pin_state(_wake_pin[0]).read() == _wake_pin[1]:
+            break
+
+
+def deepsleep(ms=None):
+    raise SimulationEnd("machine.deepsleep()")
@@ -0,0 +1,32 @@
+"""CPython stand-in for the MicroPython `micropython` module."""
+import clock  # noqa: F401 - every firmware module imports micropython, make the ticks functions available early
+
+
+def const(value):
+    return value
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def schedule(func, arg):
+    # there is no interrupt context on the host, so scheduled callbacks run straight away
+    func(arg)
+    return True
+
+
+def native(func):
+    return func
+
+
+def viper(func):
+    return func
+
+
+def mem_info(verbose=False):
+    print("mem_info not available on the host")
+
+
+def opt_level(level=None):
+    return 0
@@ -0,0 +1,106 @@
+"""Run the unmodified firmware `main.py` on CPython against the simulated hardware.
+
+    python3 sim/run_main.py --profile shot --seconds 40 --png screen.png
+
+The load cell follows one of the `signals.PROFILES`, a central is connected to the fake BLE stack and the run stops
+after the given number of seconds of virtual time. The OLED content at the end can be saved as a PNG.
+"""
+import argparse
+import os
+import sys
+import tempfile
+from array import array
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(1, os.path.join(HERE, ".."))
+
+import clock  # noqa: E402
+import machine  # noqa: E402
+import recorder  # noqa: E402
+import signals  # noqa: E402
+from devices import HX711Device, SSD1306Device  # noqa: E402
+from shared_state import FIELDS  # noqa: E402
+
+
+def setup(profile, battery_adc=2300, rate_hz=80, seed=0, scale=1544.667):
+    """Wire the simulated devices the way they are on the board, return (hx711 device, oled device)."""
+    machine.reset_devices()
+    oled = SSD1306Device(128, 32)
+    machine.I2C.devices[0x3C] = oled
+    machine.ADC.values[34] = battery_adc
+    machine.release(0)  # tare button, pulled up
+    # a blank flash for the recorded shots
+    recorder.DIRECTORY = os.path.join(tempfile.mkdtemp(), "shots")
+    hx = HX711Device(dout=14, pd_sck=13, profile=profile, scale=scale, rate_hz=rate_hz, seed=seed)
+    return hx, oled
+
+
+def run(seconds, connect=True):
+    """Import the firmware and run `main.main` until `seconds` of virtual time have passed."""
+    machine.stop_at(clock.now_us() + int(seconds * 1000000))
+    import main as firmware
+
+    if connect:
+        firmware.ble.connect(1)
+    try:
+        firmware.main()
+    except machine.SimulationEnd:
+        pass
+    return firmware
+
+
+def run_async(seconds, connect=True):
+    """Run the uasyncio firmware (`main_async`) until `seconds` of virtual time have passed."""
+    machine.stop_at(clock.now_us() + int(seconds * 1000000))
+    import main_async
+
+    firmware = main_async.Scales()
+    if connect:
+        firmware.ble.connect(1)
+    try:
+        main_async.asyncio.run(firmware.run())
+    except machine.SimulationEnd:
+        pass
+    return firmware
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", default="shot", choices=sorted(signals.PROFILES))
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--rate", type=int, default=80, help="HX711 conversion rate in Hz")
+    parser.add_argument("--battery", type=int, default=2300, help="raw battery ADC reading")
+    parser.add_argument("--tare-at", type=float, action="append", default=[], help="press the button at (s)")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="run main_async instead of main")
+    parser.add_argument("--png", help="save the final screen to this file")
+    parser.add_argument("--text", action="store_true", help="print the final screen")
+    args = parser.parse_args(argv)
+
+    clock.use_virtual()
+    hx, oled = setup(signals.PROFILES[args.profile](), args.battery, args.rate)
+    for seconds in args.tare_at:
+        machine.at(int(seconds * 1000000), lambda: machine.press(0))
+        machine.at(int(seconds * 1000000) + 100000, lambda: machine.release(0))
+    firmware = run_async(args.seconds) if args.use_async else run(args.seconds)
+
+    ble = firmware.ble
+    values = array("f", [0.0] * FIELDS)
+    firmware.state.read(values)
+    print("virtual time        {:.1f} s".format(clock.now_us() / 1000000))
+    print("conversions read    {} / {}".format(hx.reads, hx.conversions))
+    print("final weight        {:.2f} g (true {:.2f} g)".format(values[0], hx.last_weight))
+    print("BLE notifications   {}".format(len(ble.notifications)))
+    print("CPU wake-ups        {}".format(machine.wakeups))
+    print(
+        "OLED flushes        {} ({} bytes in {} I2C transactions)".format(oled.flushes, oled.bytes, oled.transactions)
+    )
+    if args.text:
+        print(oled.to_text())
+    if args.png:
+        oled.to_png(args.png)
+        print("screen saved to", args.png)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Weight profiles for the simulated load cell, functions of the time in seconds returning grams."""
+
+
+def constant(weight=0.0):
+    return lambda t: weight
+
+
+def step(at=2.0, weight=250.0, before=0.0):
+    """A cup (or anything) put on the scale at `at` seconds."""
+    return lambda t: before if t < at else weight
+
+
+def ramp(start=1.0, duration=0.5, weight=18.0):
+    """Beans poured at a constant rate."""
+
+    def profile(t):
+        if t < start:
+            return 0.0
+        return weight * min(1.0, (t - start) / duration)
+
+    return profile
+
+
+def espresso(start=5.0, pour=25.0, target=36.0, drips=5.0, drip_weight=0.4, exponent=1.3):
+    """Idle, then a pour with an increasing flow up to `target`, then slow drips."""
+
+    def profile(t):
+        if t < start:
+            return 0.0
+        if t < start + pour:
+            return target * ((t - start) / pour) ** exponent
+        if t < start + pour + drips:
+            return target + drip_weight * (t - start - pour) / drips
+        return target + drip_weight
+
+    return profile
+
+
+def sequence(*segments):
+    """Chain `(duration, profile)` segments, each profile sees the time since the start of its segment."""
+
+    def profile(t):
+        offset = 0.0
+        for duration, segment in segments:
+            if t < offset + duration:
+                return segment(t - offset)
+            offset += duration
+        duration, segment = segments[-1]
+        return segment(t - offset + duration)
+
+    return profile
+
+
+def shot(cup=250.0, **kwargs):
+    """A cup placed after 1 s, then an espresso shot poured into it (see `espresso` for the timing)."""
+    pour = espresso(**kwargs)
+    return sequence((1.0, constant(0.0)), (1e9, lambda t: cup + pour(t)))
+
+
+PROFILES = {
+    "idle": lambda: constant(0.0),
+    "cup_drop": lambda: step(2.0, 250.0),
+    "small_step": lambda: step(2.0, 1.5),
+    "beans": lambda: ramp(1.0, 0.5, 18.0),
+    "espresso": lambda: espresso(),
+    "shot": lambda: shot(),
+}
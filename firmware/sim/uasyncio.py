@@ -0,0 +1,146 @@
+"""CPython stand-in for MicroPython's `uasyncio`, scheduling coroutines on the simulator clock.
+
+Only what the firmware uses is provided: `run`, `create_task`, `sleep`, `sleep_ms`, `gather` and `Event`. Sleeping
+goes through `time.sleep_us`, so with the virtual clock the simulated devices are polled and time jumps straight to
+the next task that is due.
+"""
+import time
+
+import clock
+
+_ready = []
+_sleeping = []
+_current = None
+
+
+class _Sleep:
+    def __init__(self, us):
+        self.us = us
+
+    def __await__(self):
+        yield self
+
+
+class CancelledError(BaseException):
+    pass
+
+
+class Task:
+    def __init__(self, coro):
+        self.coro = coro
+        self.done = False
+        self.result = None
+        self.waiting = []
+        self.wake_us = 0
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+        if self in _sleeping:
+            _sleeping.remove(self)
+            _ready.append(self)
+
+    def __await__(self):
+        while not self.done:
+            yield _Wait(self.waiting)
+        return self.result
+
+
+class _Wait:
+    def __init__(self, queue):
+        self.queue = queue
+
+    def __await__(self):
+        yield self
+
+
+class Event:
+    def __init__(self):
+        self.state = False
+        self.waiting = []
+
+    def is_set(self):
+        return self.state
+
+    def set(self):
+        self.state = True
+        while self.waiting:
+            _ready.append(self.waiting.pop(0))
+
+    def clear(self):
+        self.state = False
+
+    async def wait(self):
+        while not self.state:
+            await _Wait(self.waiting)
+        return True
+
+
+def _now():
+    return clock.now_us()
+
+
+def sleep_ms(ms):
+    return _Sleep(int(ms * 1000))
+
+
+def sleep(seconds):
+    return _Sleep(int(seconds * 1000000))
+
+
+def create_task(coro):
+    task = Task(coro)
+    _ready.append(task)
+    return task
+
+
+async def gather(*awaitables):
+    results = []
+    for awaitable in awaitables:
+        results.append(await awaitable)
+    return results
+
+
+def _step(task):
+    global _current
+    _current = task
+    try:
+        if task.cancelled:
+            request = task.coro.throw(CancelledError())
+        else:
+            request = task.coro.send(None)
+    except (StopIteration, CancelledError) as stop:
+        task.done = True
+        task.result = getattr(stop, "value", None)
+        while task.waiting:
+            _ready.append(task.waiting.pop(0))
+        return
+    finally:
+        _current = None
+    if isinstance(request, _Sleep):
+        task.wake_us = _now() + request.us
+        _sleeping.append(task)
+    elif isinstance(request, _Wait):
+        request.queue.append(task)
+    else:
+        _ready.append(task)
+
+
+def run(coro):
+    del _ready[:]
+    del _sleeping[:]
+    main = create_task(coro)
+    while not main.done:
+        if _ready:
+            _step(_ready.pop(0))
+            continue
+        if not _sleeping:
+            raise RuntimeError("deadlock: every task waits on an event")
+        _sleeping.sort(key=lambda task: task.wake_us)
+        delay = _sleeping[0].wake_us - _now()
+        if delay > 0:
+            time.sleep_us(delay)
+        now = _now()
+        while _sleeping and _sleeping[0].wake_us <= now:
+            _ready.append(_sleeping.pop(0))
+    return main.result
@@ -37,7 +37,13 @@ class SSD1306(framebuf.FrameBuffer):
         self.external_vcc = external_vcc
         self.pages = self.height // 8
         self.buffer = bytearray(self.pages * self.width)
+        self._mv = memoryview(self.buffer)
+        self._dirty_x0 = self.width
+        self._dirty_x1 = -1
+        self._dirty_p0 = 0
+        self._dirty_p1 = 0
         super().__init__(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
+        self.mark_dirty()
         self.init_display()
 
     def init_display(self):
@@ -90,20 +96,63 @@ class SSD1306(framebuf.FrameBuffer):
     def invert(self, invert):
         self.write_cmd(SET_NORM_INV | (invert & 1))
 
+    def fill(self, c):
+        super().fill(c)
+        self.mark_dirty()
+
+    def mark_dirty(self, x=0, y=0, w=None, h=None):
+        """Add a rectangle to the region sent by the next `show`, defaults to the whole screen.
+
+        Only `fill` marks the screen dirty by itself, other drawing primitives must be followed by a call to this.
+        """
+        if w is None:
+            w = self.width - x
+        if h is None:
+            h = self.height - y
+        x0 = max(x, 0)
+        x1 = min(x + w, self.width) - 1
+        p0 = max(y, 0) >> 3
+        p1 = (min(y + h, self.height) - 1) >> 3
+        if x0 > x1 or p0 > p1:
+            return
+        if self._dirty_x0 > self._dirty_x1:
+            self._dirty_x0, self._dirty_x1, self._dirty_p0, self._dirty_p1 = x0, x1, p0, p1
+            return
+        self._dirty_x0 = min(self._dirty_x0, x0)
+        self._dirty_x1 = max(self._dirty_x1, x1)
+        self._dirty_p0 = min(self._dirty_p0, p0)
+        self._dirty_p1 = max(self._dirty_p1, p1)
+
     def show(self):
-        x0 = 0
-        x1 = self.width - 1
+        x0 = self._dirty_x0
+        x1 = self._dirty_x1
+        if x0 > x1:
+            # nothing changed since the last flush
+            return
+        p0 = self._dirty_p0
+        p1 = self._dirty_p1
+        self._dirty_x0 = self.width
+        self._dirty_x1 = -1
+        shift = 0
         if self.width == 64:
             # displays with width of 64 pixels are shifted by 32
-            x0 += 32
-            x1 += 32
+            shift = 32
         self.write_cmd(SET_COL_ADDR)
-        self.write_cmd(x0)
-        self.write_cmd(x1)
+        self.write_cmd(x0 + shift)
+        self.write_cmd(x1 + shift)
         self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_data(self.buffer)
+        self.write_cmd(p0)
+        self.write_cmd(p1)
+        width = self.width
+        if x0 == 0 and x1 == width - 1:
+            self.write_data(self._mv[p0 * width : (p1 + 1) * width])
+        else:
+            # the GDDRAM pointer wraps inside the column window, so the page slices follow each other
+            self.write_data_vec([self._mv[page * width + x0 : page * width + x1 + 1] for page in range(p0, p1 + 1)])
+
+    def write_data_vec(self, bufs):
+        for buf in bufs:
+            self.write_data(buf)
 
 
 class SSD1306_I2C(SSD1306):
@@ -123,6 +172,11 @@ class SSD1306_I2C(SSD1306):
         self.write_list[1] = buf
         self.i2c.writevto(self.addr, self.write_list)
 
+    def write_data_vec(self, bufs):
+        # a single transaction for all the page slices of a partial window
+        bufs.insert(0, self.write_list[0])
+        self.i2c.writevto(self.addr, bufs)
+
 
 class SSD1306_SPI(SSD1306):
     def __init__(self, width, height, spi, dc, res, cs, external_vcc=False):
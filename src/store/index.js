@@ -5,6 +5,9 @@ import VuexPersist from 'vuex-persist'
 Vue.use(Vuex)
 
 let keepMutations = ['setCoffeeWeight', 'setTargetRatio', 'setPreInfusion', 'setTotalTime']
+// the scale only notifies a weight that changed, or once a second: the chart repeats the last one in between
+const CHART_PERIOD_MS = 100
+let chartTimer = null
 
 const vuexLocalStorage = new VuexPersist({
   key: 'vuex',
@@ -89,6 +92,15 @@ export default new Vuex.Store({
         state.currentData.push({ x: elapsed, y: payload.weight })
       }
     },
+    holdCurrentWeight(state) {
+      if (!state.recording || state.startTimeMs === 0) {
+        return
+      }
+      let elapsed = (new Date().getTime() - state.startTimeMs) / 1000
+      if (elapsed - state.currentData[state.currentData.length - 1].x >= CHART_PERIOD_MS / 1000) {
+        state.currentData.push({ x: elapsed, y: state.currentWeight })
+      }
+    },
     addDataPoint(state, payload) {
       state.currentData.push({ x: payload.time, y: payload.weight })
     },
@@ -142,9 +154,17 @@ export default new Vuex.Store({
     readWeight({ commit, state }) {
       commit({ type: 'setCoffeeWeight', weight: state.currentWeight })
     },
-    startRecording({ commit }) {
+    startRecording({ commit, state }) {
       commit({ type: 'clearCurrentData' })
       commit({ type: 'setRecording', recording: true })
+      clearInterval(chartTimer)
+      chartTimer = setInterval(() => {
+        if (!state.recording) {
+          clearInterval(chartTimer)
+          return
+        }
+        commit({ type: 'holdCurrentWeight' })
+      }, CHART_PERIOD_MS)
     },
     getBatteryLevel({ commit, state }) {
       if (state.btServer === null) {